@@ -7,6 +7,11 @@ logger = logging.getLogger(__name__)
 
 MODEL_NAME = "5CD-AI/Vietnamese-Sentiment-visobert"
 
+# Cắt text giống nhau ở mọi đường chấm (analyze_sentiment, worker, rescore_reviews)
+# để cùng một bình luận luôn ra cùng một nhãn: 512 ký tự rồi tối đa 512 token (giới hạn của model)
+MAX_TEXT_CHARS = 512
+TOKENIZER_KWARGS = {'truncation': True, 'max_length': 512}
+
 # Biến toàn cục để lưu model (tránh load lại nhiều lần)
 sentiment_pipeline = None
 
@@ -55,29 +60,106 @@ def analyze_sentiment(text):
         return 'NEU', 50.0
     
     # Cắt ngắn text nếu quá dài (AI chỉ đọc được tối đa 512 token)
-    if len(text) > 512:
-        text = text[:512]
+    text = text[:MAX_TEXT_CHARS]
 
     try:
         # Gọi AI phân tích
-        result = sentiment_pipeline(text)[0]
-        
-        # Kết quả thô từ model thường là: LABEL_0 (NEG), LABEL_1 (POS), LABEL_2 (NEU)
-        raw_label = result['label']
-        score = round(result['score'] * 100, 2) # Đổi sang phần trăm (98.5%)
-
-        logger.debug(f"AI result - raw_label: {raw_label}, score: {score}")
-
-        # Chuyển đổi sang mã của chúng ta
-        if raw_label in ['LABEL_1', 'POS']:
-            return 'POS', score  # Tích cực
-        elif raw_label in ['LABEL_0', 'NEG']:
-            return 'NEG', score  # Tiêu cực
-        elif raw_label in ['LABEL_2', 'NEU']:
-            return 'NEU', score  # Trung tính
-        else:
-            return 'NEU', score  # Mặc định
+        result = sentiment_pipeline(text, **TOKENIZER_KWARGS)[0]
+        logger.debug(f"AI result - raw_label: {result['label']}, score: {result['score']}")
+        return map_label(result['label'], result['score'])
             
     except Exception as e:
         logger.error(f"Error analyzing sentiment: {e}", exc_info=True)
-        return 'NEU', 50.0
\ No newline at end of file
+        return 'NEU', 50.0
+
+
+def map_label(raw_label, raw_score):
+    """
+    Chuyển nhãn thô của model sang mã của chúng ta
+    Kết quả thô từ model thường là: LABEL_0 (NEG), LABEL_1 (POS), LABEL_2 (NEU)
+    """
+    score = round(raw_score * 100, 2) # Đổi sang phần trăm (98.5%)
+
+    if raw_label in ['LABEL_1', 'POS']:
+        return 'POS', score  # Tích cực
+    elif raw_label in ['LABEL_0', 'NEG']:
+        return 'NEG', score  # Tiêu cực
+    elif raw_label in ['LABEL_2', 'NEU']:
+        return 'NEU', score  # Trung tính
+    return 'NEU', score  # Mặc định
+
+
+def analyze_sentiment_batch(texts):
+    """
+    Phân tích nhiều bình luận trong một lần gọi model (micro-batch)
+    Trả về list (Label, Score) theo đúng thứ tự đầu vào
+    """
+    results = [('NEU', 50.0)] * len(texts)
+
+    # Chỉ đưa vào model những text hợp lệ, text quá ngắn giữ mặc định như analyze_sentiment
+    valid = [
+        (i, text[:MAX_TEXT_CHARS]) for i, text in enumerate(texts)
+        if text and isinstance(text, str) and len(text.strip()) >= 3
+    ]
+    if not valid:
+        return results
+
+    if load_model() is None:
+        logger.error("Model pipeline is None, batch falls back to NEU")
+        return results
+
+    try:
+        outputs = sentiment_pipeline(
+            [text for _, text in valid], batch_size=len(valid), **TOKENIZER_KWARGS
+        )
+    except Exception as e:
+        logger.error(f"Error analyzing sentiment batch: {e}", exc_info=True)
+        return results
+
+    for (i, _), output in zip(valid, outputs):
+        results[i] = map_label(output['label'], output['score'])
+    return results
+
+def load_tokenizer_and_model():
+    """
+    Tải riêng Tokenizer + Model (không qua pipeline) để chấm theo lô lớn
+    Dùng cho lệnh chấm lại review cũ (rescore_reviews)
+    """
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+    model.eval()
+    return tokenizer, model
+
+
+def predict_sentiments(texts, tokenizer, model, batch_size=64):
+    """
+    Tokenize cả lô một lần rồi chạy model trên CPU theo từng batch
+    Cắt text giống worker (TOKENIZER_KWARGS) để chấm lại không đổi nhãn của review đã chấm
+    Trả về list (Label, Score) theo đúng thứ tự đầu vào
+    """
+    results = [('NEU', 50.0)] * len(texts)
+    valid = [
+        i for i, text in enumerate(texts)
+        if text and isinstance(text, str) and len(text.strip()) >= 3
+    ]
+    if not valid:
+        return results
+
+    # Tokenize cả lô một lần, chưa padding
+    encoded = tokenizer([texts[i][:MAX_TEXT_CHARS] for i in valid], **TOKENIZER_KWARGS)
+    # Sắp theo độ dài để mỗi batch chỉ padding tới câu dài nhất của batch đó
+    order = sorted(range(len(valid)), key=lambda k: len(encoded['input_ids'][k]))
+    id2label = model.config.id2label
+
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            batch = tokenizer.pad(
+                {key: [values[k] for k in chunk] for key, values in encoded.items()},
+                return_tensors='pt',
+            )
+            logits = model(**batch).logits
+            scores, label_ids = torch.softmax(logits, dim=-1).max(dim=-1)
+            for k, score, label_id in zip(chunk, scores.tolist(), label_ids.tolist()):
+                results[valid[k]] = map_label(id2label[label_id], score)
+    return results
@@ -11,4 +11,17 @@ class AppConfig(AppConfig):
         # Disable HF model online lookup to avoid network issues
         os.environ['HF_DATASETS_OFFLINE'] = '1'
         # Use local cache only
-        os.environ['TRANSFORMERS_OFFLINE'] = '1'
\ No newline at end of file
+        os.environ['TRANSFORMERS_OFFLINE'] = '1'
+
+        from . import signals  # noqa: F401
+
+        # Khởi động worker AI chạy nền (tải sẵn model) cho tiến trình web
+        from .services.sentiment_worker import is_web_process, should_autostart, start_worker
+        if should_autostart():
+            start_worker()
+
+        # Ghi nốt lượt xem sản phẩm còn trong bộ đệm khi tiến trình web tắt
+        if is_web_process():
+            import atexit
+            from .services import view_counter
+            atexit.register(view_counter.flush)
\ No newline at end of file
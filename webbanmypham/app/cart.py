@@ -1,118 +1,213 @@
 from decimal import Decimal
-from django.conf import settings
-from django.utils import timezone
-from .models import Product, WeekendDeal
+from .models import Product
+from .services import deal_index
+from .services.cart_store import get_cart_store, summarize
+from .services.stock_service import OutOfStockError, StockError
+
+class CartItem:
+    """Một dòng giỏ hàng để hiển thị (không lưu lại), giá đã đổi sẵn sang Decimal"""
+    __slots__ = ('product', 'quantity', 'price', 'total_price', 'deal_id')
+
+    def __init__(self, product, quantity, price, deal_id):
+        self.product = product
+        self.quantity = quantity
+        self.price = price
+        self.total_price = price * quantity
+        self.deal_id = deal_id
+
 
 class Cart:
     def __init__(self, request):
        
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-         
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        # Nơi lưu giỏ hàng (session / DB / cache) theo settings.CART_STORAGE, chỉ đọc khi cần
+        self.store = get_cart_store(request)
+        self._lines = None
+        # Các CartItem đã dựng trong request này, bỏ đi mỗi khi giỏ thay đổi
+        self._items = None
 
    
         if 'shipping_method' not in self.session:
             self.session['shipping_method'] = 'fast'
 
+    @property
+    def cart(self):
+        if self._lines is None:
+            self._lines = self.store.load()
+        return self._lines
+
+    def get_active_deal(self, product):
+        # Đọc từ chỉ mục deal trong tiến trình, không query DB
+        return deal_index.get_active_deal(product.id)
+
     def get_deal_price(self, product):
       
-        now = timezone.now()
-        deal = WeekendDeal.objects.filter(
-            product=product,
-            is_active=True,
-            start_time__lte=now,
-            end_time__gte=now
-        ).first()
-        
+        deal = self.get_active_deal(product)
         if deal:
             return deal.deal_price
         return None
 
+    def resolve_price(self, product, quantity):
+        """
+        Giá một đơn vị khi mua `quantity` sản phẩm, tính một lần cho cả dòng hàng.
+        Deal không còn đủ suất cho cả dòng thì tính giá thường. Trả về (price, deal)
+        """
+        deal = self.get_active_deal(product)
+        if deal and deal.max_quantity and deal.sold_quantity + quantity > deal.max_quantity:
+            deal = None
+        if deal:
+            return deal.deal_price, deal
+        if product.sale_price > 0:
+            return product.sale_price, None
+        return product.price, None
+
+    def _set_line(self, product, quantity, check_stock=True):
+        """Ghi số lượng + giá của một dòng hàng (chưa save session)"""
+        if check_stock:
+            if not product.status:
+                raise StockError(f'"{product.name}" đã ngừng kinh doanh')
+            if quantity > product.stock_quantity:
+                raise OutOfStockError(product.name, quantity, product.stock_quantity)
+
+        price, deal = self.resolve_price(product, quantity)
+        line = {
+            'quantity': quantity,
+            'price': str(price),
+            # Ghi lại deal đã áp giá để trừ suất deal khi đặt hàng
+            'deal_id': deal.id if deal else None,
+        }
+        self.cart[str(product.id)] = line
+        self.store.save_line(str(product.id), line)
+        self._items = None
+
     def add(self, product, quantity=1, override_quantity=False):
-     
-        product_id = str(product.id)
-        
-      
-        deal_price = self.get_deal_price(product)
-        if deal_price:
-            price = deal_price
-        elif product.sale_price > 0:
-            price = product.sale_price
-        else:
-            price = product.price
-        
-       
-        if product_id not in self.cart:
-            self.cart[product_id] = {
-                'quantity': 0,
-                'price': str(price)  
-            }
-        else:
-            self.cart[product_id]['price'] = str(price)
-        
-      
-        if override_quantity:
-            self.cart[product_id]['quantity'] = quantity
-        else:
-            self.cart[product_id]['quantity'] += quantity
-            
+        """
+        Thêm `quantity` sản phẩm vào giỏ (hoặc ghi đè số lượng nếu override_quantity).
+        Raise StockError nếu vượt tồn kho / sản phẩm ngừng kinh doanh, giỏ hàng giữ nguyên.
+        """
+        current = self.cart.get(str(product.id), {}).get('quantity', 0)
+        new_quantity = quantity if override_quantity else current + quantity
+        self._set_line(product, new_quantity)
+        self.save()
+
+    def set_many(self, items):
+        """
+        Ghi đè số lượng nhiều dòng hàng một lần (dùng cho mua lại đơn cũ).
+        items: list (product, quantity). Dòng nào không đủ hàng thì bỏ qua,
+        trả về danh sách StockError của các dòng đó.
+        """
+        errors = []
+        for product, quantity in items:
+            try:
+                self._set_line(product, quantity)
+            except StockError as e:
+                errors.append(e)
+        self.save()
+        return errors
+
+    def reprice_deal(self, deal_id):
+        """Tính lại giá các dòng đang áp deal đã hết suất (về giá thường / deal khác)"""
+        product_ids = [pid for pid, item in self.cart.items() if item.get('deal_id') == deal_id]
+        for product in Product.objects.filter(id__in=product_ids):
+            self._set_line(product, self.cart[str(product.id)]['quantity'], check_stock=False)
         self.save()
 
     def save(self):
-       
-        self.session.modified = True
+        """Cập nhật tóm tắt giỏ hàng sau khi thay đổi"""
+        self._items = None
+        self.store.set_summary(self.cart)
 
     def remove(self, product):
       
         product_id = str(product.id)
         if product_id in self.cart:
             del self.cart[product_id]
+            self.store.delete_line(product_id)
             self.save()
 
     def decrease(self, product):
        
         product_id = str(product.id)
         if product_id in self.cart:
-            self.cart[product_id]['quantity'] -= 1
-            if self.cart[product_id]['quantity'] <= 0:
+            line = self.cart[product_id]
+            line['quantity'] -= 1
+            if line['quantity'] <= 0:
                 del self.cart[product_id]
+                self.store.delete_line(product_id)
+            else:
+                self.store.save_line(product_id, line)
             self.save()
 
+    def merge(self, lines):
+        """Gộp các dòng của giỏ khách (sau khi đăng nhập) vào giỏ hiện tại, giá tính lại"""
+        products = Product.objects.in_bulk([int(pid) for pid in lines])
+        items = []
+        for product in products.values():
+            current = self.cart.get(str(product.id), {}).get('quantity', 0)
+            quantity = min(current + lines[str(product.id)]['quantity'], product.stock_quantity)
+            if quantity > 0:
+                items.append((product, quantity))
+        return self.set_many(items)
+
+    def get_items(self):
+        """
+        Các dòng giỏ hàng kèm Product, chỉ query một lần cho mỗi request.
+        Dòng có sản phẩm đã bị xóa thì bỏ qua.
+        """
+        if self._items is None:
+            products = Product.objects.select_related('category', 'brand').in_bulk(
+                [int(product_id) for product_id in self.cart]
+            )
+            items = []
+            for product_id, line in self.cart.items():
+                product = products.get(int(product_id))
+                if product is None:
+                    continue
+                items.append(CartItem(product, line['quantity'], Decimal(line['price']), line.get('deal_id')))
+            self._items = items
+        return self._items
+
     def __iter__(self):
-       
-        product_ids = self.cart.keys()
-       
-        products = Product.objects.filter(id__in=product_ids)
-        
-        cart = self.cart.copy()
-        
-        for product in products:
-            cart[str(product.id)]['product'] = product
-            
-        for item in cart.values():
-           
-            _price = item.get('price')
-            if _price is None:
-                _price = 0
-            
-            item['price'] = Decimal(str(_price))
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+
+        return iter(self.get_items())
+
+    def _summary(self):
+        # Tóm tắt cache sẵn chỉ dùng cho badge trên header (không phải đọc cả giỏ), không dùng để tính tiền
+        summary = self.store.get_summary()
+        if summary is None:
+            summary = self.store.set_summary(self.cart)
+        return summary
 
     def __len__(self):
         
-        return sum(item['quantity'] for item in self.cart.values())
+        return self._summary()['count']
+
+    def get_order_lines(self):
+        """Các dòng hàng để giữ tồn kho khi đặt hàng (không cần query Product)"""
+        return [
+            {
+                'product_id': int(product_id),
+                'quantity': item['quantity'],
+                'price': Decimal(str(item['price'])),
+                'deal_id': item.get('deal_id'),
+            }
+            for product_id, item in self.cart.items()
+        ]
 
     def get_total_price(self):
-       
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        """
+        Tổng tiền tính từ các dòng hàng, không lấy từ tóm tắt cache: tóm tắt có thể đã cũ
+        (worker khác sửa giỏ, CartLine bị xóa theo sản phẩm...). Lệch thì ghi lại cho badge header.
+        """
+        summary = summarize(self.cart)
+        if self.store.get_summary() != summary:
+            self.store.set_summary(self.cart)
+        return Decimal(summary['total'])
 
     def clear(self):
        
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
+        self.store.clear()
+        self._lines = {}
+        self._items = None
 
     
\ No newline at end of file
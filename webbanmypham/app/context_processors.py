@@ -1,18 +1,17 @@
+from django.utils.functional import SimpleLazyObject
+
 from .cart import Cart
-from .models import Wishlist
+from .services.wishlist_service import get_wishlist_ids
+
+# Các giá trị chỉ được tính khi template thật sự dùng tới (trang admin, redirect... không tốn query)
 
 def cart_context(request):
 
-    return {'cart': Cart(request)}
+    return {'cart': SimpleLazyObject(lambda: Cart(request))}
 
 def wishlist_context(request):
-    if request.user.is_authenticated:
-        wishlist_count = Wishlist.objects.filter(user=request.user).count()
-        wishlist_product_ids = list(Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True))
-    else:
-        wishlist_count = 0
-        wishlist_product_ids = []
+    wishlist_product_ids = SimpleLazyObject(lambda: get_wishlist_ids(request.user))
     return {
-        'wishlist_count': wishlist_count,
+        'wishlist_count': SimpleLazyObject(lambda: len(wishlist_product_ids)),
         'wishlist_product_ids': wishlist_product_ids,
-    }
\ No newline at end of file
+    }
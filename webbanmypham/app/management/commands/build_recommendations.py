@@ -0,0 +1,26 @@
+"""
+Tính lại danh sách gợi ý sản phẩm (sản phẩm liên quan và "Dành cho bạn")
+
+Chạy:
+    python manage.py build_recommendations
+
+Nên đặt cron chạy hằng đêm, ví dụ:
+    30 2 * * * cd /path/to/webbanmypham && python manage.py build_recommendations
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.services import recommender
+
+
+class Command(BaseCommand):
+    help = "Tính lại top-N sản phẩm liên quan cho từng sản phẩm và gợi ý theo loại da / lịch sử mua cho từng khách"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        related, users, user_rows = recommender.build()
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã lưu {related} gợi ý sản phẩm liên quan, {user_rows} gợi ý cho {users} khách hàng "
+            f"trong {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,23 @@
+"""
+Dựng lại file snapshot gợi ý tìm kiếm (autocomplete)
+
+Chạy: python manage.py rebuild_autocomplete
+Nên chạy định kỳ (cron, vài phút một lần): gộp delta log các sản phẩm đã lưu vào snapshot,
+cập nhật điểm sold_quantity/views và tên thương hiệu/danh mục.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.services.autocomplete import rebuild_snapshot, snapshot_path
+
+
+class Command(BaseCommand):
+    help = "Ghi lại file snapshot autocomplete từ toàn bộ sản phẩm, thương hiệu, danh mục"
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã ghi {count} khóa vào {snapshot_path()} trong {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,44 @@
+"""
+Dựng lại bảng tổng hợp doanh số theo ngày
+
+Chạy: python manage.py rebuild_sales_rollup --start 2025-01-01 --end 2025-12-31
+Không truyền --start/--end thì dựng lại từ ngày có đơn đầu tiên tới hôm nay.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from app.models import Order
+from app.services.sales_rollup import rebuild_range
+
+
+class Command(BaseCommand):
+    help = "Tính lại DailySalesRollup cho một khoảng ngày"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="Ngày bắt đầu (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Ngày kết thúc, tính cả ngày này (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        try:
+            start_day = date.fromisoformat(options['start']) if options['start'] else None
+            end_day = date.fromisoformat(options['end']) if options['end'] else timezone.localdate()
+        except ValueError as e:
+            raise CommandError(f"Ngày không hợp lệ: {e}")
+
+        if start_day is None:
+            first_order = Order.objects.aggregate(first=Min('created_at'))['first']
+            if first_order is None:
+                self.stdout.write("Chưa có đơn hàng nào")
+                return
+            start_day = timezone.localtime(first_order).date()
+
+        if start_day > end_day:
+            raise CommandError("--start phải nhỏ hơn hoặc bằng --end")
+
+        rows = rebuild_range(start_day, end_day)
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã dựng lại {rows} dòng tổng hợp từ {start_day} tới {end_day}"
+        ))
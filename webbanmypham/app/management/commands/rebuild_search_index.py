@@ -0,0 +1,31 @@
+"""
+Dựng lại chỉ mục tìm kiếm sản phẩm
+
+Chạy: python manage.py rebuild_search_index --chunk-size 1000
+Cần chạy lại sau khi sửa sản phẩm bằng update()/bulk_update() hoặc nhập sản phẩm trực tiếp vào DB
+(lưu qua model, đổi tên danh mục / thương hiệu đã được signals đánh chỉ mục lại).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.services.search_index import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Dựng lại SearchPosting/SearchDocument cho toàn bộ sản phẩm đang kinh doanh"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Số sản phẩm mỗi lô")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(indexed):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  {indexed} sản phẩm ({indexed / max(elapsed, 1e-6):.0f} sp/s)")
+
+        indexed = rebuild_index(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã đánh chỉ mục {indexed} sản phẩm trong {time.monotonic() - started:.1f}s"
+        ))
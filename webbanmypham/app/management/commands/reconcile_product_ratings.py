@@ -0,0 +1,21 @@
+"""
+Tính lại điểm đánh giá lưu sẵn trên Product từ bảng Review
+
+Chạy: python manage.py reconcile_product_ratings
+Nên chạy định kỳ (cron hằng đêm) và sau khi sửa / import review bằng tay.
+"""
+from django.core.management.base import BaseCommand
+
+from app.services.product_rating import reconcile
+
+
+class Command(BaseCommand):
+    help = "Tính lại rating_sum, rating_count, approved_review_count, positive_ratio của sản phẩm"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', help="Chỉ tính lại sản phẩm này (lặp lại được)")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        fixed = reconcile(options['product'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật {fixed} sản phẩm bị lệch"))
@@ -0,0 +1,154 @@
+"""
+Chấm lại sentiment cho toàn bộ review cũ (dùng sau khi đổi model)
+
+Chạy: python manage.py rescore_reviews --workers 4 --chunk-size 1000
+Dừng giữa chừng thì chạy lại cùng lệnh sẽ tiếp tục từ checkpoint. Chạy hết thì checkpoint
+bị xóa, lần chấm lại sau (đổi model) bắt đầu từ đầu.
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+
+from django.core.management.base import BaseCommand
+
+# Tokenizer/Model riêng của từng tiến trình worker
+_tokenizer = None
+_model = None
+_batch_size = 64
+
+
+def _init_worker(threads, batch_size):
+    global _tokenizer, _model, _batch_size
+    import django
+    import torch
+    from app.ai_utils import load_tokenizer_and_model
+
+    django.setup()
+    # Mỗi tiến trình dùng ít thread để các tiến trình không tranh CPU
+    torch.set_num_threads(threads)
+    _tokenizer, _model = load_tokenizer_and_model()
+    _batch_size = batch_size
+
+
+def _score_chunk(rows):
+    from app.ai_utils import predict_sentiments
+
+    results = predict_sentiments([comment for _, comment in rows], _tokenizer, _model, batch_size=_batch_size)
+    return [(pk, label, score) for (pk, _), (label, score) in zip(rows, results)]
+
+
+class Command(BaseCommand):
+    help = "Chấm lại sentiment/confidence_score cho các review đã có theo từng lô khóa chính"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Số review mỗi lô đọc từ DB")
+        parser.add_argument('--batch-size', type=int, default=64, help="Số câu mỗi lần chạy model")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Số tiến trình chạy model (0 = chạy ngay trong tiến trình chính)")
+        parser.add_argument('--checkpoint', default='rescore_reviews.checkpoint.json',
+                            help="File lưu tiến độ để chạy tiếp khi bị dừng")
+        parser.add_argument('--restart', action='store_true', help="Bỏ qua checkpoint, chấm lại từ đầu")
+
+    def handle(self, *args, **options):
+        from app.models import Review
+
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        checkpoint_path = options['checkpoint']
+
+        state = {'last_pk': 0, 'processed': 0}
+        if not options['restart'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                state = json.load(f)
+            self.stdout.write(f"Tiếp tục từ checkpoint: pk > {state['last_pk']} ({state['processed']} review đã chấm)")
+
+        if workers > 0:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            pool = multiprocessing.get_context('spawn').Pool(
+                workers, initializer=_init_worker, initargs=(threads, options['batch_size'])
+            )
+        else:
+            pool = None
+            _init_worker(os.cpu_count() or 1, options['batch_size'])
+
+        started = time.monotonic()
+        processed_this_run = 0
+        in_flight = deque()
+        last_read_pk = state['last_pk']
+
+        try:
+            while True:
+                # Giữ tối đa 2 lô/worker đang chạy, đọc lô tiếp theo trong lúc chờ
+                while len(in_flight) < max(1, workers) * 2:
+                    rows = list(
+                        Review.objects.filter(pk__gt=last_read_pk, is_spam=False)
+                        .order_by('pk')
+                        .values_list('pk', 'comment')[:chunk_size]
+                    )
+                    if not rows:
+                        break
+                    last_read_pk = rows[-1][0]
+                    if pool:
+                        in_flight.append(pool.apply_async(_score_chunk, (rows,)))
+                    else:
+                        in_flight.append(_score_chunk(rows))
+
+                if not in_flight:
+                    break
+
+                # Ghi kết quả theo đúng thứ tự lô để checkpoint luôn tăng dần
+                result = in_flight.popleft()
+                scored = result.get() if pool else result
+                self._write_back(scored)
+
+                processed_this_run += len(scored)
+                state['last_pk'] = scored[-1][0]
+                state['processed'] += len(scored)
+                self._save_checkpoint(checkpoint_path, state)
+
+                elapsed = time.monotonic() - started
+                rate = processed_this_run / elapsed if elapsed else 0
+                self.stdout.write(
+                    f"{state['processed']} review | {rate:.0f} rows/s | pk cuối {state['last_pk']}"
+                )
+        finally:
+            if pool:
+                pool.terminate()
+
+        # Đã chấm hết: xóa checkpoint để lần chạy sau không bị bỏ qua toàn bộ
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        if processed_this_run:
+            # Nhãn cảm xúc đổi hàng loạt -> tính lại positive_ratio của sản phẩm
+            from app.services import product_rating
+
+            fixed = product_rating.reconcile()
+            self.stdout.write(f"Cập nhật tỉ lệ đánh giá tích cực cho {fixed} sản phẩm")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Hoàn tất: chấm {processed_this_run} review trong {elapsed:.1f}s"
+        ))
+
+    def _write_back(self, scored):
+        from app.models import Review
+        from app.services import review_feed
+
+        pks = [pk for pk, _, _ in scored]
+        # Review bị đánh dấu spam trong lúc chấm thì giữ nguyên nhãn SPAM
+        spam_pks = set(Review.objects.filter(pk__in=pks, is_spam=True).values_list('pk', flat=True))
+        reviews = [
+            Review(pk=pk, sentiment=label, confidence_score=score)
+            for pk, label, score in scored if pk not in spam_pks
+        ]
+        Review.objects.bulk_update(reviews, ['sentiment', 'confidence_score'], batch_size=500)
+        review_feed.invalidate_all_rating_summaries()
+
+    def _save_checkpoint(self, path, state):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,31 @@
+"""
+Quét spam review chạy nền
+
+Chạy một lần:   python manage.py scan_spam_reviews
+Chạy liên tục:  python manage.py scan_spam_reviews --loop --interval 60
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app.services.spam_scanner import scan_reviews
+
+
+class Command(BaseCommand):
+    help = "Kiểm tra spam cho review mới (hoặc toàn bộ khi spam keyword thay đổi) kể từ mốc lần trước"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Số review mỗi lô")
+        parser.add_argument('--loop', action='store_true', help="Chạy lặp lại liên tục")
+        parser.add_argument('--interval', type=int, default=60, help="Số giây nghỉ giữa 2 lần quét khi --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            scanned, flagged = scan_reviews(chunk_size=options['chunk_size'])
+            self.stdout.write(f"Đã quét {scanned} review, đánh dấu {flagged} spam")
+
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,44 @@
+"""
+Cập nhật điểm sản phẩm xu hướng từ đơn hàng / yêu thích mới
+
+Chạy một lần:   python manage.py update_trending
+Chạy liên tục:  python manage.py update_trending --loop --interval 60
+Tính lại từ đầu (đổi trọng số / chu kỳ bán rã): python manage.py update_trending --rebuild
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app.services import trending
+
+
+class Command(BaseCommand):
+    help = "Cộng điểm xu hướng cho đơn hàng / lượt yêu thích mới kể từ mốc lần trước và tính lại top-K"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Số dòng mỗi lô")
+        parser.add_argument('--rebuild', action='store_true', help="Xóa điểm cũ, tính lại từ toàn bộ lịch sử")
+        parser.add_argument('--loop', action='store_true', help="Chạy lặp lại liên tục")
+        parser.add_argument('--interval', type=int, default=60, help="Số giây nghỉ giữa 2 lần chạy khi --loop")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            consumed = trending.rebuild(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Đã tính lại từ {consumed[trending.ORDER_JOB]} dòng đơn hàng, "
+                f"{consumed[trending.WISHLIST_JOB]} lượt yêu thích"
+            ))
+            return
+
+        while True:
+            consumed = trending.update(chunk_size=options['chunk_size'])
+            self.stdout.write(
+                f"Đã cộng {consumed[trending.ORDER_JOB]} dòng đơn hàng, "
+                f"{consumed[trending.WISHLIST_JOB]} lượt yêu thích"
+            )
+
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
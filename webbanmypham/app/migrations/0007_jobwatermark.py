@@ -0,0 +1,27 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_wishlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Tên job')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='ID cuối đã xử lý')),
+                ('signature', models.CharField(blank=True, max_length=64, verbose_name='Dấu vân tay dữ liệu phụ thuộc')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật lần cuối')),
+            ],
+            options={
+                'verbose_name': 'Mốc job chạy nền',
+                'verbose_name_plural': 'Mốc job chạy nền',
+            },
+        ),
+    ]
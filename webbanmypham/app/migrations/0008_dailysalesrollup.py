@@ -0,0 +1,47 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_rollup(apps, schema_editor):
+    """Dựng bảng tổng hợp cho các đơn đã có, dashboard quý/năm không hiện 0 sau khi triển khai"""
+    from app.services import sales_rollup
+
+    sales_rollup.rebuild_all(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_jobwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Ngày')),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=15, verbose_name='Doanh thu (đơn đã thanh toán)')),
+                ('order_count', models.IntegerField(default=0, verbose_name='Số đơn')),
+                ('paid_order_count', models.IntegerField(default=0, verbose_name='Số đơn đã thanh toán')),
+                ('units_sold', models.IntegerField(default=0, verbose_name='Số lượng bán (đơn đã thanh toán)')),
+                ('pending_count', models.IntegerField(default=0, verbose_name='Chờ xử lý')),
+                ('confirmed_count', models.IntegerField(default=0, verbose_name='Đã xác nhận')),
+                ('shipping_count', models.IntegerField(default=0, verbose_name='Đang giao')),
+                ('completed_count', models.IntegerField(default=0, verbose_name='Hoàn thành')),
+                ('cancelled_count', models.IntegerField(default=0, verbose_name='Đã hủy')),
+                ('returned_count', models.IntegerField(default=0, verbose_name='Trả hàng')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='app.product', verbose_name='Sản phẩm')),
+            ],
+            options={
+                'verbose_name': 'Doanh số theo ngày',
+                'verbose_name_plural': 'Doanh số theo ngày',
+                'ordering': ['day'],
+                'unique_together': {('day', 'product')},
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='deal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.weekenddeal', verbose_name='Giá theo deal'),
+        ),
+    ]
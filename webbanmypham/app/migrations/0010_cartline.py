@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0009_orderitem_deal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(blank=True, db_index=True, max_length=40, null=True, verbose_name='Session khách')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Số lượng')),
+                ('price', models.DecimalField(decimal_places=0, max_digits=15, verbose_name='Đơn giá')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cart_lines', to='app.weekenddeal', verbose_name='Deal áp dụng')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_lines', to='app.product', verbose_name='Sản phẩm')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cart_lines', to=settings.AUTH_USER_MODEL, verbose_name='Người dùng')),
+            ],
+            options={
+                'verbose_name': 'Dòng giỏ hàng',
+                'verbose_name_plural': 'Giỏ hàng',
+                'unique_together': {('session_key', 'product'), ('user', 'product')},
+            },
+        ),
+    ]
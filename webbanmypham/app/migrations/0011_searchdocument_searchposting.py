@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_cartline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='app.product', verbose_name='Sản phẩm')),
+                ('length', models.PositiveIntegerField(default=0, verbose_name='Độ dài văn bản')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Tài liệu tìm kiếm',
+                'verbose_name_plural': 'Tài liệu tìm kiếm',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Từ khóa (không dấu)')),
+                ('tf', models.PositiveIntegerField(default=1, verbose_name='Tần suất (có trọng số)')),
+                ('doc_len', models.PositiveIntegerField(default=0, verbose_name='Độ dài văn bản')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='app.product', verbose_name='Sản phẩm')),
+            ],
+            options={
+                'verbose_name': 'Chỉ mục tìm kiếm',
+                'verbose_name_plural': 'Chỉ mục tìm kiếm',
+                'unique_together': {('term', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_order_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'order_status', 'created_at'], name='order_user_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_status', 'created_at'], name='order_paid_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'stock_quantity'], name='product_status_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sale_price'], name='product_sale_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'is_approved', 'created_at'], name='review_product_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['is_spam'], name='review_spam_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weekenddeal',
+            index=models.Index(fields=['is_active', 'end_time', 'start_time'], name='deal_active_window_idx'),
+        ),
+    ]
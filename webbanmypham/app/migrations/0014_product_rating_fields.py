@@ -0,0 +1,55 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+def backfill_ratings(apps, schema_editor):
+    """Tính điểm đánh giá cho các sản phẩm đã có review, trang chủ / shop không hiện 0 sao sau khi triển khai"""
+    from app.services import product_rating
+
+    product_rating.reconcile(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='approved_review_count',
+            field=models.IntegerField(default=0, verbose_name='Số đánh giá hiển thị'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='positive_count',
+            field=models.IntegerField(default=0, verbose_name='Số đánh giá tích cực'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='positive_ratio',
+            field=models.FloatField(default=0, verbose_name='Tỉ lệ tích cực'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0, verbose_name='Điểm trung bình'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.IntegerField(default=0, verbose_name='Số lượt chấm sao'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0, verbose_name='Tổng số sao'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_avg', 'rating_count'], name='product_rating_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_product_rating_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['views'], name='product_views_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_product_views_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTrendScore',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend_score', serialize=False, to='app.product')),
+                ('score', models.FloatField(default=0, verbose_name='Điểm xu hướng (đã nhân hệ số mốc)')),
+            ],
+            options={
+                'verbose_name': 'Điểm xu hướng',
+                'verbose_name_plural': 'Điểm xu hướng',
+                'indexes': [models.Index(fields=['-score'], name='trend_score_idx')],
+            },
+        ),
+    ]
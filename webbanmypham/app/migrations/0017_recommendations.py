@@ -0,0 +1,52 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0016_product_trend_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Thứ hạng')),
+                ('score', models.FloatField(verbose_name='Điểm')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_to', to='app.product', verbose_name='Sản phẩm gợi ý')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL, verbose_name='Khách hàng')),
+            ],
+            options={
+                'verbose_name': 'Gợi ý cho khách hàng',
+                'verbose_name_plural': 'Gợi ý cho khách hàng',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Thứ hạng')),
+                ('score', models.FloatField(verbose_name='Điểm')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_in', to='app.product', verbose_name='Sản phẩm gợi ý')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='app.product', verbose_name='Sản phẩm gốc')),
+            ],
+            options={
+                'verbose_name': 'Sản phẩm liên quan',
+                'verbose_name_plural': 'Sản phẩm liên quan',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='userrecommendation',
+            constraint=models.UniqueConstraint(fields=('user', 'rank'), name='user_rec_user_rank_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='productrecommendation',
+            constraint=models.UniqueConstraint(fields=('source', 'rank'), name='product_rec_source_rank_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_state',
+            field=models.CharField(blank=True, choices=[('', 'Không theo dõi'), ('reserved', 'Đã giữ hàng'), ('released', 'Đã hoàn kho')], default='', max_length=10, verbose_name='Tồn kho'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 13:48
+
+from django.db import migrations, models
+
+
+def backfill_weight(apps, schema_editor):
+    """Tính weight cho chỉ mục đã dựng, tìm kiếm không xếp mọi posting cũ bằng 0"""
+    from app.services import search_index
+
+    search_index.reweight(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_order_stock_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchposting',
+            name='weight',
+            field=models.FloatField(default=0, verbose_name='Điểm BM25 (chưa nhân idf)'),
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', '-weight'], name='searchposting_term_weight'),
+        ),
+        migrations.RunPython(backfill_weight, migrations.RunPython.noop),
+    ]
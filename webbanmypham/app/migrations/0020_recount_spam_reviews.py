@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 15:02
+
+from django.db import migrations
+
+
+def recount_ratings(apps, schema_editor):
+    """approved_review_count không còn tính review spam: tính lại cho dữ liệu đã backfill ở 0014"""
+    from app.services import product_rating
+
+    product_rating.reconcile(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_searchposting_weight'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_ratings, migrations.RunPython.noop),
+    ]
@@ -94,13 +94,47 @@ class Product(models.Model):
     # Thông số kho & hiển thị
     stock_quantity = models.IntegerField(default=0, verbose_name="Tổng tồn kho")
     sold_quantity = models.IntegerField(default=0, verbose_name="Đã bán")
-    views = models.IntegerField(default=0, verbose_name="Lượt xem")
+    views = models.IntegerField(default=0, verbose_name="Lượt xem")  # services/view_counter ghi dồn
     status = models.BooleanField(default=True, verbose_name="Đang kinh doanh")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Tổng hợp đánh giá lưu sẵn (services/product_rating cập nhật, lệnh reconcile_product_ratings tính lại)
+    # rating_* chỉ tính review đã duyệt và không phải spam
+    rating_sum = models.IntegerField(default=0, verbose_name="Tổng số sao")
+    rating_count = models.IntegerField(default=0, verbose_name="Số lượt chấm sao")
+    rating_avg = models.FloatField(default=0, verbose_name="Điểm trung bình")
+    approved_review_count = models.IntegerField(default=0, verbose_name="Số đánh giá hiển thị")
+    positive_count = models.IntegerField(default=0, verbose_name="Số đánh giá tích cực")
+    positive_ratio = models.FloatField(default=0, verbose_name="Tỉ lệ tích cực")
+
+    class Meta:
+        indexes = [
+            # Sắp xếp / lọc theo điểm đánh giá (trang /shop/, khối đánh giá cao trang chủ)
+            models.Index(fields=['rating_avg', 'rating_count'], name='product_rating_idx'),
+            # Xếp hạng xem nhiều nhất (trang chủ)
+            models.Index(fields=['views'], name='product_views_idx'),
+            # Sản phẩm đang bán theo tồn kho (cảnh báo kho, danh sách còn hàng)
+            models.Index(fields=['status', 'stock_quantity'], name='product_status_stock_idx'),
+            # Sản phẩm đang giảm giá (trang chủ)
+            models.Index(fields=['sale_price'], name='product_sale_price_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @property
+    def rating_stars(self):
+        """Biểu tượng 5 sao theo điểm trung bình: 'full', 'half' hoặc 'empty'"""
+        stars = []
+        for i in range(1, 6):
+            if self.rating_avg >= i - 0.25:
+                stars.append('full')
+            elif self.rating_avg >= i - 0.75:
+                stars.append('half')
+            else:
+                stars.append('empty')
+        return stars
+
 class ProductBatch(models.Model):
     
     # Quản lý Date
@@ -145,9 +179,27 @@ class Order(models.Model):
         ('returned', 'Trả hàng'),
     ]
     order_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Trạng thái")
+    
+    # Đơn tạo trước khi có giữ hàng (stock_service) để trống: không hoàn kho / giữ lại khi đổi trạng thái
+    STOCK_STATE_CHOICES = [
+        ('', 'Không theo dõi'),
+        ('reserved', 'Đã giữ hàng'),
+        ('released', 'Đã hoàn kho'),
+    ]
+    stock_state = models.CharField(max_length=10, choices=STOCK_STATE_CHOICES, default='', blank=True, verbose_name="Tồn kho")
     note = models.TextField(blank=True, verbose_name="Ghi chú")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Khóa phân trang con trỏ (created_at, id) của danh sách đơn hàng
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            # Đơn của tôi: lọc theo user + trạng thái, sắp theo ngày
+            models.Index(fields=['user', 'order_status', 'created_at'], name='order_user_status_created_idx'),
+            # Doanh thu: đơn đã thanh toán trong khoảng thời gian
+            models.Index(fields=['payment_status', 'created_at'], name='order_paid_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.order_code} - {self.fullname}"
 
@@ -155,6 +207,7 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     batch = models.ForeignKey(ProductBatch, on_delete=models.SET_NULL, null=True, verbose_name="Xuất từ Lô")
+    deal = models.ForeignKey('WeekendDeal', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Giá theo deal")
     product_name = models.CharField(max_length=255, verbose_name="Tên SP (Lưu cứng)")
     quantity = models.IntegerField(default=1, verbose_name="Số lượng")
     price = models.DecimalField(max_digits=15, decimal_places=0, verbose_name="Giá bán lúc mua")
@@ -202,6 +255,13 @@ class Review(models.Model):
     is_approved = models.BooleanField(default=True, verbose_name="Đã duyệt")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Đánh giá đã duyệt của một sản phẩm, mới nhất trước
+            models.Index(fields=['product', 'is_approved', 'created_at'], name='review_product_approved_idx'),
+            models.Index(fields=['is_spam'], name='review_spam_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
 
@@ -274,6 +334,11 @@ class WeekendDeal(models.Model):
         verbose_name = "Ưu đãi cuối tuần"
         verbose_name_plural = "Danh sách ưu đãi"
         ordering = ['-priority', '-created_at']
+        indexes = [
+            # Deal đang chạy / sắp chạy: end_time >= now chọn lọc hơn nhiều so với start_time <= now
+            # (deal đã kết thúc tích lũy dần), nên end_time đứng trước start_time
+            models.Index(fields=['is_active', 'end_time', 'start_time'], name='deal_active_window_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.product.name}"
@@ -328,4 +393,173 @@ class Wishlist(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.user.username} - {self.product.name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.product.name}"
+
+class ProductTrendScore(models.Model):
+    """Điểm xu hướng (forward decay) của sản phẩm, services/trending cập nhật dồn"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='trend_score')
+    score = models.FloatField(default=0, verbose_name="Điểm xu hướng (đã nhân hệ số mốc)")
+
+    class Meta:
+        verbose_name = "Điểm xu hướng"
+        verbose_name_plural = "Điểm xu hướng"
+        indexes = [
+            # Top-K: quét index theo điểm giảm dần
+            models.Index(fields=['-score'], name='trend_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.score}"
+
+class ProductRecommendation(models.Model):
+    """Danh sách sản phẩm liên quan tính sẵn cho từng sản phẩm (lệnh build_recommendations)"""
+    source = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations', verbose_name="Sản phẩm gốc")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_in', verbose_name="Sản phẩm gợi ý")
+    rank = models.PositiveSmallIntegerField(verbose_name="Thứ hạng")
+    score = models.FloatField(verbose_name="Điểm")
+
+    class Meta:
+        verbose_name = "Sản phẩm liên quan"
+        verbose_name_plural = "Sản phẩm liên quan"
+        constraints = [
+            # Đọc danh sách: WHERE source_id = ? ORDER BY rank
+            models.UniqueConstraint(fields=['source', 'rank'], name='product_rec_source_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.source_id} -> {self.product_id} (#{self.rank})"
+
+
+class UserRecommendation(models.Model):
+    """Danh sách "Dành cho bạn" tính sẵn cho từng khách hàng (lệnh build_recommendations)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations', verbose_name="Khách hàng")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_to', verbose_name="Sản phẩm gợi ý")
+    rank = models.PositiveSmallIntegerField(verbose_name="Thứ hạng")
+    score = models.FloatField(verbose_name="Điểm")
+
+    class Meta:
+        verbose_name = "Gợi ý cho khách hàng"
+        verbose_name_plural = "Gợi ý cho khách hàng"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'rank'], name='user_rec_user_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.product_id} (#{self.rank})"
+
+# ==================== MỐC TIẾN ĐỘ JOB CHẠY NỀN ====================
+
+class JobWatermark(models.Model):
+    """Lưu mốc đã xử lý của các job chạy nền (quét spam...) để lần sau chỉ xử lý phần mới"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="Tên job")
+    last_id = models.BigIntegerField(default=0, verbose_name="ID cuối đã xử lý")
+    signature = models.CharField(max_length=64, blank=True, verbose_name="Dấu vân tay dữ liệu phụ thuộc")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật lần cuối")
+
+    class Meta:
+        verbose_name = "Mốc job chạy nền"
+        verbose_name_plural = "Mốc job chạy nền"
+
+    def __str__(self):
+        return f"{self.name} - {self.last_id}"
+
+
+# ==================== TỔNG HỢP DOANH SỐ THEO NGÀY ====================
+
+class DailySalesRollup(models.Model):
+    """
+    Số liệu bán hàng đã tổng hợp sẵn theo ngày để dashboard không phải quét Order/OrderItem.
+    product = NULL là dòng tổng của cả shop, ngược lại là số liệu riêng của sản phẩm đó.
+    """
+    day = models.DateField(verbose_name="Ngày")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='daily_sales', verbose_name="Sản phẩm")
+
+    revenue = models.DecimalField(max_digits=15, decimal_places=0, default=0, verbose_name="Doanh thu (đơn đã thanh toán)")
+    order_count = models.IntegerField(default=0, verbose_name="Số đơn")
+    paid_order_count = models.IntegerField(default=0, verbose_name="Số đơn đã thanh toán")
+    units_sold = models.IntegerField(default=0, verbose_name="Số lượng bán (đơn đã thanh toán)")
+
+    # Phân bổ theo trạng thái đơn
+    pending_count = models.IntegerField(default=0, verbose_name="Chờ xử lý")
+    confirmed_count = models.IntegerField(default=0, verbose_name="Đã xác nhận")
+    shipping_count = models.IntegerField(default=0, verbose_name="Đang giao")
+    completed_count = models.IntegerField(default=0, verbose_name="Hoàn thành")
+    cancelled_count = models.IntegerField(default=0, verbose_name="Đã hủy")
+    returned_count = models.IntegerField(default=0, verbose_name="Trả hàng")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Doanh số theo ngày"
+        verbose_name_plural = "Doanh số theo ngày"
+        unique_together = ('day', 'product')
+        ordering = ['day']
+
+    def __str__(self):
+        return f"{self.day} - {self.product or 'Toàn shop'}"
+
+
+# ==================== GIỎ HÀNG LƯU PHÍA SERVER ====================
+
+class CartLine(models.Model):
+    """
+    Một dòng giỏ hàng khi dùng DatabaseCartStore (settings.CART_STORAGE).
+    Khách chưa đăng nhập gắn theo session_key, đã đăng nhập gắn theo user.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='cart_lines', verbose_name="Người dùng")
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True, verbose_name="Session khách")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_lines', verbose_name="Sản phẩm")
+    quantity = models.PositiveIntegerField(default=1, verbose_name="Số lượng")
+    price = models.DecimalField(max_digits=15, decimal_places=0, verbose_name="Đơn giá")
+    deal = models.ForeignKey(WeekendDeal, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='cart_lines', verbose_name="Deal áp dụng")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Dòng giỏ hàng"
+        verbose_name_plural = "Giỏ hàng"
+        unique_together = [('user', 'product'), ('session_key', 'product')]
+
+    def __str__(self):
+        return f"{self.user or self.session_key} - {self.product_id} x {self.quantity}"
+
+
+# ==================== CHỈ MỤC TÌM KIẾM SẢN PHẨM ====================
+
+class SearchDocument(models.Model):
+    """Độ dài (số từ có trọng số) của mỗi sản phẩm trong chỉ mục tìm kiếm, dùng cho BM25"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='search_document', verbose_name="Sản phẩm")
+    length = models.PositiveIntegerField(default=0, verbose_name="Độ dài văn bản")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tài liệu tìm kiếm"
+        verbose_name_plural = "Tài liệu tìm kiếm"
+
+    def __str__(self):
+        return f"{self.product_id} ({self.length})"
+
+
+class SearchPosting(models.Model):
+    """Chỉ mục ngược: từ (đã bỏ dấu) -> sản phẩm chứa từ đó"""
+    term = models.CharField(max_length=64, verbose_name="Từ khóa (không dấu)")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_postings',
+                                verbose_name="Sản phẩm")
+    tf = models.PositiveIntegerField(default=1, verbose_name="Tần suất (có trọng số)")
+    doc_len = models.PositiveIntegerField(default=0, verbose_name="Độ dài văn bản")
+    weight = models.FloatField(default=0, verbose_name="Điểm BM25 (chưa nhân idf)")
+
+    class Meta:
+        verbose_name = "Chỉ mục tìm kiếm"
+        verbose_name_plural = "Chỉ mục tìm kiếm"
+        unique_together = ('term', 'product')
+        indexes = [
+            # Đọc các posting điểm cao nhất của một từ (search_index.MAX_POSTINGS_PER_TERM)
+            models.Index(fields=['term', '-weight'], name='searchposting_term_weight'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
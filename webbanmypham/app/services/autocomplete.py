@@ -0,0 +1,498 @@
+"""
+Gợi ý tìm kiếm khi gõ (autocomplete) từ một mảng khóa đã sắp xếp, tìm bằng bisect
+
+Khóa là tên đã bỏ dấu của sản phẩm / thương hiệu / danh mục, thêm một khóa cho mỗi vị trí
+bắt đầu từ ("son kem li", "kem li", "li") để gõ giữa tên vẫn ra. Điểm xếp hạng lấy từ
+sold_quantity và views.
+
+Tiền tố ngắn ("s", "kem") khớp hàng chục nghìn khóa, không duyệt hết được trong request: tiền tố nào
+khớp quá MAX_SCAN khóa thì lúc ghi snapshot đã tính sẵn TOP_K mục điểm cao nhất; các tiền tố còn lại
+khớp không quá MAX_SCAN khóa nên duyệt hết rồi mới xếp hạng.
+
+Dữ liệu được ghi ra một file snapshot nhị phân và đọc bằng mmap, các worker dùng chung
+file (page cache của hệ điều hành) và tự mở lại khi file đổi mtime.
+
+Lưu sản phẩm không ghi lại snapshot: signals nối một dòng JSON vào delta log (<snapshot>.delta,
+khóa file bằng flock), suggest đọc delta đè lên snapshot. Lệnh rebuild_autocomplete (chạy định kỳ)
+dựng lại snapshot từ DB rồi bỏ phần delta đã nằm trong snapshot mới.
+
+Định dạng file:
+    header   : magic(4s) version(H) count(I) prefix_count(I) top_count(I)
+    entries  : count x [key_off(I) key_len(H) kind(B) obj_id(I) weight(I) label_off(I) label_len(H)]
+               sắp theo khóa tăng dần
+    prefixes : prefix_count x [key_off(I) key_len(H) top_start(I) top_len(H)] các tiền tố khớp quá
+               MAX_SCAN khóa, sắp tăng dần; tiền tố là key_len byte đầu của một khóa trong blob
+    tops     : top_count x [entry_index(I)], mỗi tiền tố một đoạn, điểm giảm dần, mỗi mục một lần
+    blob     : chuỗi UTF-8 của khóa và nhãn hiển thị, offset tính từ đầu blob
+"""
+import bisect
+import heapq
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .search_index import fold
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa được giữa các thread trong tiến trình
+    fcntl = None
+
+MAGIC = b'ACP1'
+VERSION = 2
+HEADER = struct.Struct('<4sHIII')
+ENTRY = struct.Struct('<IHBIIIH')
+PREFIX = struct.Struct('<IHIH')
+TOP = struct.Struct('<I')
+
+KIND_PRODUCT = 1
+KIND_BRAND = 2
+KIND_CATEGORY = 3
+KIND_NAMES = {KIND_PRODUCT: 'product', KIND_BRAND: 'brand', KIND_CATEGORY: 'category'}
+
+# Tiền tố khớp quá MAX_SCAN khóa thì dùng danh sách TOP_K tính sẵn, còn lại duyệt hết lúc gợi ý.
+# TOP_K lớn hơn số gợi ý để vẫn đủ mục sau khi bỏ các sản phẩm đã đổi trong delta log
+MAX_SCAN = 400
+TOP_K = 32
+MAX_WEIGHT = 2 ** 32 - 1
+
+# Các trường của Product ảnh hưởng tới gợi ý (lưu với update_fields khác thì không ghi delta)
+INDEXED_FIELDS = frozenset(('name', 'status', 'sold_quantity', 'views'))
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+_lock = threading.Lock()
+_file_locks_guard = threading.Lock()
+_file_locks = {}
+_snapshot = None
+_delta = None  # (chữ ký file, product_id đã đổi, [(key, kind, id, weight, label)] đã sắp)
+
+
+def snapshot_path():
+    return getattr(settings, 'AUTOCOMPLETE_SNAPSHOT', os.path.join(settings.BASE_DIR, 'autocomplete.snapshot'))
+
+
+def product_weight(sold_quantity, views):
+    return min(MAX_WEIGHT, max(0, sold_quantity) * 5 + max(0, views) + 1)
+
+
+def words(text):
+    return _WORD_RE.findall(fold(text))
+
+
+def item_keys(name):
+    """Các khóa của một tên: chuỗi bỏ dấu bắt đầu từ mỗi từ"""
+    tokens = words(name)
+    return [' '.join(tokens[i:]) for i in range(len(tokens))]
+
+
+class _Prefixes:
+    """Bảng tiền tố tính sẵn của snapshot, dùng như một dãy đã sắp xếp cho bisect"""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return self.snapshot.prefix_count
+
+    def __getitem__(self, j):
+        return self.snapshot.key_bytes(*self.snapshot.prefix(j)[:2])
+
+
+class Snapshot:
+    """File snapshot đã mmap, dùng như một dãy khóa đã sắp xếp cho bisect"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime_ns
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.prefix_count, top_count = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.buf.close()
+            raise ValueError("File snapshot autocomplete không hợp lệ")
+        self.prefix_start = HEADER.size + ENTRY.size * self.count
+        self.top_start = self.prefix_start + PREFIX.size * self.prefix_count
+        self.blob_start = self.top_start + TOP.size * top_count
+        self.prefixes = _Prefixes(self)
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, i):
+        return ENTRY.unpack_from(self.buf, HEADER.size + ENTRY.size * i)
+
+    def key_bytes(self, offset, length):
+        start = self.blob_start + offset
+        return self.buf[start:start + length]
+
+    def __getitem__(self, i):
+        return self.key_bytes(*self.entry(i)[:2])
+
+    def label(self, entry):
+        return self.key_bytes(entry[5], entry[6]).decode('utf-8')
+
+    def prefix(self, j):
+        return PREFIX.unpack_from(self.buf, self.prefix_start + PREFIX.size * j)
+
+    def top_entries(self, prefix):
+        """Các entry điểm cao nhất tính sẵn cho tiền tố, None nếu tiền tố khớp không quá MAX_SCAN khóa"""
+        j = bisect.bisect_left(self.prefixes, prefix)
+        if j == self.prefix_count or self.prefixes[j] != prefix:
+            return None
+        top_start, top_len = self.prefix(j)[2:]
+        return [
+            self.entry(TOP.unpack_from(self.buf, self.top_start + TOP.size * (top_start + k))[0])
+            for k in range(top_len)
+        ]
+
+    def close(self):
+        self.buf.close()
+
+
+def _common_length(a, b):
+    """Độ dài tiền tố chung của hai chuỗi (tìm nhị phân, so sánh lát cắt chạy trong C)"""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _heavy_prefixes(keys):
+    """
+    {tiền tố: (vị trí khóa đầu, vị trí sau khóa cuối)} của các tiền tố khớp quá MAX_SCAN khóa (keys đã sắp).
+    Khóa i và khóa i + MAX_SCAN chung tiền tố nào thì tiền tố đó khớp ít nhất MAX_SCAN + 1 khóa;
+    tiền tố đã chung với khóa trước thì đã được ghi ở khóa trước.
+    """
+    heavy = {}
+    previous = ''
+    for i in range(len(keys) - MAX_SCAN):
+        key, other = keys[i], keys[i + MAX_SCAN]
+        shared = _common_length(previous, key)
+        previous = key
+        if key[:shared + 1] != other[:shared + 1] or len(key) <= shared:
+            continue
+        for length in range(shared + 1, _common_length(key, other) + 1):
+            prefix = key[:length]
+            heavy[prefix] = (i, bisect.bisect_left(keys, prefix + '\x7f', i))
+    return heavy
+
+
+def _top_entries(records, heavy):
+    """
+    {tiền tố: [vị trí entry]} TOP_K mục điểm cao nhất, mỗi sản phẩm / thương hiệu / danh mục một lần.
+    Tính từ tiền tố dài tới ngắn: danh sách của một tiền tố gộp từ danh sách của các tiền tố con
+    (thêm một ký tự) đã tính, tiền tố con khớp ít khóa thì duyệt thẳng các khóa đó.
+    """
+    def rank(i):
+        return -records[i][3], records[i][1], records[i][2]
+
+    tops = {}
+    for prefix in sorted(heavy, key=len, reverse=True):
+        lo, hi = heavy[prefix]
+        depth = len(prefix) + 1
+        candidates = []
+        i = lo
+        while i < hi:
+            key = records[i][0]
+            child = key[:depth]
+            if child in tops:
+                candidates.extend(tops[child])
+                i = heavy[child][1]
+                continue
+            # Khóa đúng bằng tiền tố, hoặc tiền tố con khớp không quá MAX_SCAN khóa
+            end = i + 1
+            if len(key) >= depth:
+                while end < hi and records[end][0].startswith(child):
+                    end += 1
+            candidates.extend(range(i, end))
+            i = end
+
+        top = []
+        seen = set()
+        for i in sorted(candidates, key=rank):
+            item = records[i][1], records[i][2]
+            if item not in seen:
+                seen.add(item)
+                top.append(i)
+                if len(top) == TOP_K:
+                    break
+        tops[prefix] = top
+    return tops
+
+
+def write_snapshot(records, path=None):
+    """records: iterable (key, kind, obj_id, weight, label). Ghi file tạm rồi os.replace cho nguyên tử"""
+    path = path or snapshot_path()
+    records = sorted(records, key=lambda r: (r[0], r[1], r[2]))
+
+    blob = bytearray()
+    label_offsets = {}
+    key_offsets = []
+    entries = bytearray()
+    for key, kind, obj_id, weight, label in records:
+        key_bytes = key.encode('ascii')
+        key_off = len(blob)
+        key_offsets.append(key_off)
+        blob += key_bytes
+        if label not in label_offsets:
+            label_offsets[label] = len(blob)
+            blob += label.encode('utf-8')
+        label_off = label_offsets[label]
+        entries += ENTRY.pack(key_off, len(key_bytes), kind, obj_id, weight, label_off,
+                              len(label.encode('utf-8')))
+
+    heavy = _heavy_prefixes([r[0] for r in records])
+    tops = _top_entries(records, heavy)
+    prefixes = bytearray()
+    top_entries = bytearray()
+    top_count = 0
+    for prefix in sorted(heavy):
+        top = tops[prefix]
+        prefixes += PREFIX.pack(key_offsets[heavy[prefix][0]], len(prefix), top_count, len(top))
+        for i in top:
+            top_entries += TOP.pack(i)
+        top_count += len(top)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.autocomplete-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records), len(heavy), top_count))
+        f.write(entries)
+        f.write(prefixes)
+        f.write(top_entries)
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def _product_records(product_id, name, sold_quantity, views):
+    weight = product_weight(sold_quantity, views)
+    return [(key, KIND_PRODUCT, product_id, weight, name) for key in item_keys(name)]
+
+
+def build_records():
+    """Đọc toàn bộ sản phẩm / thương hiệu / danh mục đang bán từ DB"""
+    from django.db.models import Sum
+    from app.models import Brand, Category, Product
+
+    records = []
+    for product_id, name, sold, views in Product.objects.filter(status=True).values_list(
+        'id', 'name', 'sold_quantity', 'views'
+    ):
+        records.extend(_product_records(product_id, name, sold, views))
+
+    for model, kind in ((Brand, KIND_BRAND), (Category, KIND_CATEGORY)):
+        for obj_id, name, sold, views in model.objects.annotate(
+            sold=Sum('product__sold_quantity'), total_views=Sum('product__views')
+        ).values_list('id', 'name', 'sold', 'total_views'):
+            weight = product_weight(sold or 0, views or 0)
+            records.extend((key, kind, obj_id, weight, name) for key in item_keys(name))
+    return records
+
+
+def delta_path(path=None):
+    return (path or snapshot_path()) + '.delta'
+
+
+def _pending_path(path):
+    # Delta đang được lệnh rebuild gộp vào snapshot mới
+    return path + '.delta.pending'
+
+
+@contextmanager
+def _file_lock(lock_path):
+    """Khóa giữa các thread (threading.Lock) và giữa các tiến trình trên cùng máy (flock trên lock_path)"""
+    with _file_locks_guard:
+        thread_lock = _file_locks.setdefault(lock_path, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _rotate_delta(path):
+    """Chuyển delta hiện tại sang .pending (gộp vào .pending cũ nếu lần dựng trước dừng giữa chừng)"""
+    delta, pending = delta_path(path), _pending_path(path)
+    with _file_lock(delta + '.lock'):
+        if not os.path.exists(delta):
+            return
+        if os.path.exists(pending):
+            with open(delta, 'rb') as src, open(pending, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(delta)
+        else:
+            os.replace(delta, pending)
+
+
+def rebuild_snapshot(path=None):
+    """
+    Dựng lại snapshot từ DB. Delta log được chuyển sang .pending trước khi đọc DB: các thay đổi trong đó
+    đã có trong DB nên xóa được sau khi ghi snapshot; thay đổi ghi trong lúc dựng nằm ở delta mới
+    và vẫn được đè lên snapshot mới. Hai lần dựng cùng lúc (cron chồng nhau) chạy lần lượt.
+    """
+    path = path or snapshot_path()
+    with _file_lock(path + '.build.lock'):
+        _rotate_delta(path)
+        count = write_snapshot(build_records(), path)
+        try:
+            os.remove(_pending_path(path))
+        except FileNotFoundError:
+            pass
+    return count
+
+
+def get_snapshot():
+    """Snapshot đang dùng trong tiến trình, mở lại khi file được ghi mới (mtime đổi)"""
+    global _snapshot
+
+    path = snapshot_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        with _lock:
+            if not os.path.exists(path):
+                rebuild_snapshot(path)
+        mtime = os.stat(path).st_mtime_ns
+
+    snapshot = _snapshot
+    if snapshot is None or snapshot.mtime != mtime or snapshot.path != path:
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.mtime != mtime or snapshot.path != path:
+                # Bản cũ không close ở đây: request khác có thể vẫn đang đọc, GC sẽ giải phóng
+                try:
+                    snapshot = Snapshot(path)
+                except ValueError:
+                    # File định dạng cũ (trước khi có bảng tiền tố)
+                    rebuild_snapshot(path)
+                    snapshot = Snapshot(path)
+                _snapshot = snapshot
+    return snapshot
+
+
+def _append_delta(items):
+    path = delta_path()
+    lines = ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in items)
+    with _file_lock(path + '.lock'):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+def update_product(product):
+    """Ghi thay đổi của một sản phẩm vào delta log (signals gọi sau khi lưu), không ghi lại snapshot"""
+    _append_delta([{
+        'id': product.id,
+        'name': product.name,
+        'weight': product_weight(product.sold_quantity, product.views),
+        'active': bool(product.status),
+    }])
+
+
+def remove_product(product_id):
+    _append_delta([{'id': product_id, 'active': False}])
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_delta():
+    """Các sản phẩm đổi sau lần dựng snapshot gần nhất (.pending rồi delta hiện tại), đọc lại khi file đổi"""
+    global _delta
+
+    path = snapshot_path()
+    files = (_pending_path(path), delta_path(path))
+    signature = tuple(_file_signature(f) for f in files)
+    delta = _delta
+    if delta is not None and delta[0] == signature:
+        return delta
+
+    products = {}
+    for file_path in files:
+        try:
+            with open(file_path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        # Dòng đang được ghi dở
+                        break
+                    item = json.loads(line)
+                    products[item['id']] = item if item['active'] else None
+        except FileNotFoundError:
+            continue
+    records = sorted(
+        (key.encode('ascii'), KIND_PRODUCT, product_id, item['weight'], item['name'])
+        for product_id, item in products.items() if item is not None
+        for key in item_keys(item['name'])
+    )
+    delta = _delta = (signature, frozenset(products), records)
+    return delta
+
+
+def suggest(query, limit=8):
+    """Gợi ý theo tiền tố, xếp theo điểm giảm dần. Trả về list dict {'type', 'id', 'label'}"""
+    prefix = ' '.join(words(query)).encode('ascii')
+    if not prefix:
+        return []
+
+    snapshot = get_snapshot()
+    _, changed, delta_records = get_delta()
+
+    entries = snapshot.top_entries(prefix)
+    if entries is None:
+        # Tiền tố khớp không quá MAX_SCAN khóa: duyệt hết
+        entries = []
+        start = bisect.bisect_left(snapshot, prefix)
+        for i in range(start, min(start + MAX_SCAN, len(snapshot))):
+            if not snapshot[i].startswith(prefix):
+                break
+            entries.append(snapshot.entry(i))
+
+    best = {}
+    for entry in entries:
+        if entry[2] == KIND_PRODUCT and entry[3] in changed:
+            continue
+        item = (entry[2], entry[3])
+        if item not in best or best[item][0] < entry[4]:
+            best[item] = (entry[4], entry)
+
+    for i in range(bisect.bisect_left(delta_records, (prefix,)), len(delta_records)):
+        key, kind, product_id, weight, label = delta_records[i]
+        if not key.startswith(prefix):
+            break
+        item = (kind, product_id)
+        if item not in best or best[item][0] < weight:
+            best[item] = (weight, label)
+
+    top = heapq.nlargest(limit, best.items(), key=lambda item: (item[1][0], -item[0][0], -item[0][1]))
+    return [
+        {
+            'type': KIND_NAMES[kind],
+            'id': obj_id,
+            'label': label if isinstance(label, str) else snapshot.label(label),
+        }
+        for (kind, obj_id), (_, label) in top
+    ]
@@ -0,0 +1,227 @@
+"""
+Nơi lưu giỏ hàng, chọn bằng settings.CART_STORAGE:
+- SessionCartStore: lưu trong request.session như trước (mặc định)
+- DatabaseCartStore: bảng CartLine, mỗi thao tác chỉ ghi đúng một dòng
+- CacheCartStore: cache riêng settings.CART_CACHE_ALIAS, mỗi dòng là một key riêng
+
+Một dòng hàng là dict {'quantity', 'price' (chuỗi), 'deal_id'}, khóa là product_id dạng chuỗi.
+Tóm tắt giỏ (tổng số lượng, tổng tiền) được cache riêng để badge trên header không phải đọc giỏ;
+tiền của đơn hàng luôn tính lại từ các dòng hàng (Cart.get_total_price), không lấy từ tóm tắt.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+SUMMARY_TIMEOUT = 60 * 60 * 24
+CACHE_CART_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def summarize(lines):
+    return {
+        'count': sum(line['quantity'] for line in lines.values()),
+        'total': str(sum(Decimal(str(line['price'])) * line['quantity'] for line in lines.values())),
+    }
+
+
+class BaseCartStore:
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def owner(self):
+        """Khóa chủ giỏ hàng: user nếu đã đăng nhập, ngược lại là session (None nếu chưa có session)"""
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.id}'
+        if self.request.session.session_key:
+            return f'session:{self.request.session.session_key}'
+        return None
+
+    def _ensure_owner(self):
+        if self.owner is None:
+            self.request.session.save()
+        return self.owner
+
+    def _summary_key(self, owner):
+        return f'cart_summary:{owner}'
+
+    def load(self):
+        raise NotImplementedError
+
+    def save_line(self, product_id, line):
+        raise NotImplementedError
+
+    def delete_line(self, product_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get_summary(self):
+        owner = self.owner
+        if owner is None:
+            return {'count': 0, 'total': '0'}
+        return cache.get(self._summary_key(owner))
+
+    def set_summary(self, lines):
+        summary = summarize(lines)
+        owner = self.owner
+        if owner is not None:
+            cache.set(self._summary_key(owner), summary, SUMMARY_TIMEOUT)
+        return summary
+
+    def delete_summary(self):
+        owner = self.owner
+        if owner is not None:
+            cache.delete(self._summary_key(owner))
+
+
+class SessionCartStore(BaseCartStore):
+    """Giỏ hàng trong session, tóm tắt tính thẳng từ session (không cần cache)"""
+
+    def _lines(self):
+        lines = self.request.session.get(settings.CART_SESSION_ID)
+        if lines is None:
+            lines = self.request.session[settings.CART_SESSION_ID] = {}
+        return lines
+
+    def load(self):
+        return self._lines()
+
+    def save_line(self, product_id, line):
+        self._lines()[product_id] = line
+        self.request.session.modified = True
+
+    def delete_line(self, product_id):
+        self._lines().pop(product_id, None)
+        self.request.session.modified = True
+
+    def clear(self):
+        self.request.session.pop(settings.CART_SESSION_ID, None)
+        self.request.session.modified = True
+
+    def get_summary(self):
+        return summarize(self._lines())
+
+    def set_summary(self, lines):
+        return summarize(lines)
+
+    def delete_summary(self):
+        pass
+
+
+class DatabaseCartStore(BaseCartStore):
+    """Giỏ hàng trong bảng CartLine"""
+
+    def _queryset(self):
+        from app.models import CartLine
+
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return CartLine.objects.filter(user=user)
+        return CartLine.objects.filter(user__isnull=True, session_key=self.request.session.session_key)
+
+    def _owner_fields(self):
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return {'user': user}
+        self._ensure_owner()
+        return {'user': None, 'session_key': self.request.session.session_key}
+
+    def load(self):
+        if self.owner is None:
+            return {}
+        return {
+            str(product_id): {'quantity': quantity, 'price': str(price), 'deal_id': deal_id}
+            for product_id, quantity, price, deal_id in self._queryset().values_list(
+                'product_id', 'quantity', 'price', 'deal_id'
+            )
+        }
+
+    def save_line(self, product_id, line):
+        from app.models import CartLine
+
+        CartLine.objects.update_or_create(
+            product_id=int(product_id),
+            defaults={
+                'quantity': line['quantity'],
+                'price': Decimal(str(line['price'])),
+                'deal_id': line.get('deal_id'),
+            },
+            **self._owner_fields(),
+        )
+
+    def delete_line(self, product_id):
+        if self.owner is not None:
+            self._queryset().filter(product_id=int(product_id)).delete()
+
+    def clear(self):
+        if self.owner is not None:
+            self._queryset().delete()
+            self.delete_summary()
+
+
+class CacheCartStore(BaseCartStore):
+    """
+    Giỏ hàng trong cache: một key chứa danh sách product_id, mỗi dòng một key riêng.
+    Dùng alias riêng settings.CART_CACHE_ALIAS (mặc định 'carts'), dùng chung giữa các tiến trình và
+    không tự xóa key khi đầy (Redis noeviction...). Cache 'default' dạng file bị cull theo MAX_ENTRIES
+    nên giỏ hàng có thể mất bất kỳ lúc nào, vì vậy không dùng nó làm chỗ lưu giỏ.
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        alias = getattr(settings, 'CART_CACHE_ALIAS', 'carts')
+        if alias not in settings.CACHES:
+            raise ImproperlyConfigured(f"CacheCartStore cần cache riêng CACHES['{alias}'] (xem CART_CACHE_ALIAS)")
+        self.cache = caches[alias]
+
+    def _ids_key(self, owner):
+        return f'cart:{owner}:ids'
+
+    def _line_key(self, owner, product_id):
+        return f'cart:{owner}:line:{product_id}'
+
+    def load(self):
+        owner = self.owner
+        if owner is None:
+            return {}
+        ids = self.cache.get(self._ids_key(owner)) or []
+        found = self.cache.get_many([self._line_key(owner, pid) for pid in ids])
+        return {
+            pid: found[self._line_key(owner, pid)]
+            for pid in ids
+            if self._line_key(owner, pid) in found
+        }
+
+    def save_line(self, product_id, line):
+        owner = self._ensure_owner()
+        self.cache.set(self._line_key(owner, product_id), dict(line), CACHE_CART_TIMEOUT)
+        ids = self.cache.get(self._ids_key(owner)) or []
+        if product_id not in ids:
+            self.cache.set(self._ids_key(owner), ids + [product_id], CACHE_CART_TIMEOUT)
+
+    def delete_line(self, product_id):
+        owner = self.owner
+        if owner is None:
+            return
+        self.cache.delete(self._line_key(owner, product_id))
+        ids = self.cache.get(self._ids_key(owner)) or []
+        if product_id in ids:
+            self.cache.set(self._ids_key(owner), [pid for pid in ids if pid != product_id], CACHE_CART_TIMEOUT)
+
+    def clear(self):
+        owner = self.owner
+        if owner is None:
+            return
+        ids = self.cache.get(self._ids_key(owner)) or []
+        self.cache.delete_many([self._line_key(owner, pid) for pid in ids] + [self._ids_key(owner)])
+        self.delete_summary()
+
+
+def get_cart_store(request):
+    store_class = import_string(getattr(settings, 'CART_STORAGE', 'app.services.cart_store.SessionCartStore'))
+    return store_class(request)
@@ -0,0 +1,87 @@
+"""
+Cache HTML các khối danh mục sản phẩm (trang chủ, lưới sản phẩm trang /shop/)
+
+- Khóa cache gồm "thế hệ danh mục" (đổi khi lưu / xóa Product, Category, Brand, WeekendDeal,
+  xem app/signals.py) và version chỉ mục deal (đổi khi admin sửa deal / deal hết suất),
+  nên không cần xóa từng khóa: dữ liệu đổi là khóa đổi, bản cũ tự hết hạn.
+- Thời gian sống không vượt quá mốc deal gần nhất (deal bắt đầu / kết thúc) và FRAGMENT_TIMEOUT.
+- Khối cache dùng chung cho mọi người dùng: nút yêu thích được render thành chỗ trống
+  <!--wishlist:ID--> rồi điền theo từng user bằng stitch_wishlist.
+"""
+import hashlib
+import re
+import uuid
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import deal_index
+
+CATALOG_GENERATION_KEY = 'catalog_generation'
+CATALOG_GENERATION_TIMEOUT = None
+FRAGMENT_TIMEOUT = 600
+
+WISHLIST_SLOT_RE = re.compile(r'<!--wishlist:(\d+)-->')
+
+_wishlist_buttons = None
+
+
+def get_generation():
+    generation = cache.get(CATALOG_GENERATION_KEY)
+    if generation is None:
+        cache.add(CATALOG_GENERATION_KEY, uuid.uuid4().hex, CATALOG_GENERATION_TIMEOUT)
+        generation = cache.get(CATALOG_GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    """Gọi khi dữ liệu hiển thị trên thẻ sản phẩm đổi (signals đã gọi sẵn khi lưu model)"""
+    cache.set(CATALOG_GENERATION_KEY, uuid.uuid4().hex, CATALOG_GENERATION_TIMEOUT)
+
+
+def fragment_key(name, *parts):
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'fragment:{name}:{get_generation()}:{deal_index.get_version()}:{digest}'
+
+
+def fragment_timeout():
+    """Số giây tới mốc deal gần nhất, tối đa FRAGMENT_TIMEOUT"""
+    boundary = deal_index.next_boundary()
+    if boundary is None:
+        return FRAGMENT_TIMEOUT
+    seconds = int((boundary - timezone.now()).total_seconds())
+    return max(1, min(FRAGMENT_TIMEOUT, seconds))
+
+
+def cached_fragment(name, parts, render):
+    """HTML của khối name (render() chỉ chạy khi chưa có trong cache)"""
+    key = fragment_key(name, *parts)
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html, fragment_timeout())
+    return html
+
+
+def _button_templates():
+    global _wishlist_buttons
+
+    if _wishlist_buttons is None:
+        _wishlist_buttons = {
+            wishlisted: render_to_string(
+                'app/includes/wishlist_button.html', {'product_id': '__ID__', 'wishlisted': wishlisted}
+            ).strip()
+            for wishlisted in (False, True)
+        }
+    return _wishlist_buttons
+
+
+def stitch_wishlist(html, wishlist_ids):
+    """Điền nút yêu thích (đã thích / chưa thích) vào các chỗ trống của khối cache"""
+    buttons = _button_templates()
+
+    def replace(match):
+        return buttons[int(match.group(1)) in wishlist_ids].replace('__ID__', match.group(1))
+
+    return WISHLIST_SLOT_RE.sub(replace, html)
@@ -0,0 +1,204 @@
+"""
+Phân trang theo con trỏ (keyset) thay cho Paginator / OFFSET
+
+Trang sau được lấy bằng điều kiện "đứng sau dòng cuối của trang trước" theo đúng thứ tự sắp xếp,
+ví dụ ordering ('-created_at', '-id'):
+    WHERE created_at < x OR (created_at = x AND id < y) ORDER BY created_at DESC, id DESC LIMIT n
+nên trang 5000 nhanh như trang 1 (dùng index) và không phải COUNT(*) mỗi trang.
+
+Con trỏ là chuỗi đã ký (django.core.signing), người dùng không sửa / đoán được. Con trỏ hỏng
+thì quay về trang đầu. Cột cuối của ordering phải là khóa duy nhất (thường là id).
+
+Tổng số dòng (nếu cần hiển thị) dùng approximate_count: đếm tối đa APPROX_COUNT_CAP dòng,
+vượt ngưỡng thì lấy ước lượng từ thống kê bảng (MySQL / PostgreSQL) hoặc hiển thị "N+".
+"""
+import datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+CURSOR_SALT = 'app.cursor_pagination'
+APPROX_COUNT_CAP = 10000
+
+
+def _field_name(order):
+    return order.lstrip('-')
+
+
+def _encode_value(value):
+    if isinstance(value, bool) or value is None:
+        raise ValueError("Cột dùng làm con trỏ không được là NULL / bool")
+    if isinstance(value, int):
+        return ['i', value]
+    if isinstance(value, float):
+        return ['f', repr(value)]
+    if isinstance(value, Decimal):
+        return ['d', str(value)]
+    if isinstance(value, datetime.datetime):
+        return ['t', value.isoformat()]
+    if isinstance(value, datetime.date):
+        return ['D', value.isoformat()]
+    return ['s', str(value)]
+
+
+def _decode_value(item):
+    kind, value = item
+    if kind == 'i':
+        return int(value)
+    if kind == 'f':
+        return float(value)
+    if kind == 'd':
+        return Decimal(value)
+    if kind == 't':
+        return datetime.datetime.fromisoformat(value)
+    if kind == 'D':
+        return datetime.date.fromisoformat(value)
+    return str(value)
+
+
+def encode_cursor(values, direction):
+    return signing.dumps([direction, [_encode_value(v) for v in values]], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, ordering):
+    """Trả về (direction, values) hoặc None nếu con trỏ không hợp lệ"""
+    if not token:
+        return None
+    try:
+        direction, values = signing.loads(token, salt=CURSOR_SALT)
+        values = [_decode_value(item) for item in values]
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if direction not in ('next', 'prev') or len(values) != len(ordering):
+        return None
+    return direction, values
+
+
+def _keyset_q(ordering, values, reverse=False):
+    """Điều kiện "đứng sau values" theo ordering (reverse=True: "đứng trước")"""
+    q = Q()
+    for i, order in enumerate(ordering):
+        descending = order.startswith('-') != reverse
+        lookup = 'lt' if descending else 'gt'
+        step = Q(**{f'{_field_name(order)}__{lookup}': values[i]})
+        for prev_order, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{_field_name(prev_order): prev_value})
+        q |= step
+    if len(ordering) > 1:
+        # Thêm cận cho cột đầu để DB quét theo khoảng trên index thay vì duyệt cả nhánh OR
+        descending = ordering[0].startswith('-') != reverse
+        q &= Q(**{f"{_field_name(ordering[0])}__{'lte' if descending else 'gte'}": values[0]})
+    return q
+
+
+def _reversed(ordering):
+    return [order[1:] if order.startswith('-') else f'-{order}' for order in ordering]
+
+
+def _row_values(obj, ordering):
+    return [getattr(obj, _field_name(order)) for order in ordering]
+
+
+class CursorPage:
+    """Một trang kết quả, duyệt như list. next_cursor / previous_cursor là None nếu không còn trang"""
+
+    def __init__(self, object_list, ordering, has_next, has_previous):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.count = None
+        self.count_exact = True
+
+    @property
+    def count_label(self):
+        """Tổng số để hiển thị: "1.234", "~1.200.000" (ước lượng) hoặc "10.000+" (chưa đếm hết)"""
+        if self.count is None:
+            return ''
+        text = f'{self.count:,}'.replace(',', '.')
+        if self.count_exact:
+            return text
+        return f'{text}+' if self.count == APPROX_COUNT_CAP else f'~{text}'
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.object_list:
+            return None
+        return encode_cursor(_row_values(self.object_list[-1], self.ordering), 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        return encode_cursor(_row_values(self.object_list[0], self.ordering), 'prev')
+
+
+def paginate(queryset, cursor=None, per_page=20, ordering=('-id',), with_count=False):
+    """
+    Lấy một trang của queryset theo con trỏ. ordering là tuple tên cột như order_by,
+    cột cuối phải duy nhất. with_count=True thì gắn thêm page.count (ước lượng).
+    """
+    ordering = list(ordering)
+    decoded = decode_cursor(cursor, ordering)
+
+    if decoded is None:
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        page = CursorPage(rows[:per_page], ordering, has_next=len(rows) > per_page, has_previous=False)
+    elif decoded[0] == 'next':
+        rows = list(queryset.filter(_keyset_q(ordering, decoded[1])).order_by(*ordering)[:per_page + 1])
+        page = CursorPage(rows[:per_page], ordering, has_next=len(rows) > per_page, has_previous=True)
+    else:
+        rows = list(
+            queryset.filter(_keyset_q(ordering, decoded[1], reverse=True))
+            .order_by(*_reversed(ordering))[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        page = CursorPage(rows[:per_page][::-1], ordering, has_next=True, has_previous=has_previous)
+
+    if with_count:
+        page.count, page.count_exact = approximate_count(queryset)
+    return page
+
+
+def _table_estimate(model, using):
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] > 0 else None
+
+
+def approximate_count(queryset, cap=APPROX_COUNT_CAP):
+    """
+    (số dòng, chính_xác). Đếm thật tối đa cap dòng; nhiều hơn thì dùng thống kê bảng nếu
+    queryset không lọc gì, còn không thì trả về (cap, False) để hiển thị "cap+".
+    """
+    counted = queryset.order_by().values('pk')[:cap + 1].count()
+    if counted <= cap:
+        return counted, True
+    if not queryset.query.where:
+        estimate = _table_estimate(queryset.model, queryset.db)
+        if estimate:
+            return max(estimate, counted), False
+    return cap, False
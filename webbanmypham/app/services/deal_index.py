@@ -0,0 +1,112 @@
+"""
+Chỉ mục deal đang chạy trong tiến trình: product_id -> deal tốt nhất (priority cao nhất, mới nhất)
+
+Dựng bằng một query, giữ tới mốc start_time/end_time gần nhất rồi tự dựng lại.
+Admin sửa deal hoặc deal hết suất thì đổi version trong cache (settings.CACHES, dùng chung giữa
+các worker) để mọi tiến trình dựng lại. Snapshot cũng không được giữ quá SNAPSHOT_MAX_AGE giây,
+phòng khi cache không dùng chung (nhiều máy chưa có Redis...) hoặc thay đổi không qua invalidate.
+"""
+import threading
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+
+from .deal_quota import has_quota_left
+
+DEAL_INDEX_VERSION_KEY = 'deal_index_version'
+DEAL_INDEX_VERSION_TIMEOUT = 3600
+SNAPSHOT_MAX_AGE = 30
+
+_lock = threading.Lock()
+_snapshot = None  # (version, expires_at, next_change, deals, best_by_product)
+
+
+def _current_version():
+    version = cache.get(DEAL_INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(DEAL_INDEX_VERSION_KEY, uuid.uuid4().hex, DEAL_INDEX_VERSION_TIMEOUT)
+        version = cache.get(DEAL_INDEX_VERSION_KEY)
+    return version
+
+
+def _build(version):
+    from app.models import WeekendDeal
+
+    now = timezone.now()
+    deals = list(
+        WeekendDeal.objects.filter(
+            is_active=True,
+            start_time__lte=now,
+            end_time__gte=now,
+        ).filter(has_quota_left()).select_related('product').order_by('-priority', '-created_at')
+    )
+
+    best_by_product = {}
+    for deal in deals:
+        best_by_product.setdefault(deal.product_id, deal)
+
+    # Mốc gần nhất làm tập deal thay đổi: deal đang chạy kết thúc hoặc deal sắp tới bắt đầu
+    boundaries = [deal.end_time for deal in deals]
+    refresh_at = now + timedelta(seconds=SNAPSHOT_MAX_AGE)
+    next_start = WeekendDeal.objects.filter(
+        is_active=True, end_time__gt=now, start_time__gt=now
+    ).aggregate(next_start=Min('start_time'))['next_start']
+    if next_start:
+        boundaries.append(next_start)
+    next_change = min(boundaries) if boundaries else None
+
+    return version, min(filter(None, (next_change, refresh_at))), next_change, deals, best_by_product
+
+
+def _get_snapshot():
+    global _snapshot
+
+    version = _current_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot[0] == version and timezone.now() <= snapshot[1]:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot[0] != version or timezone.now() > snapshot[1]:
+            snapshot = _snapshot = _build(version)
+    return snapshot
+
+
+def get_active_deals():
+    """Các deal đang chạy, sắp theo priority giảm dần rồi mới nhất"""
+    return _get_snapshot()[3]
+
+
+def get_active_deal(product_id):
+    """Deal tốt nhất đang chạy của sản phẩm (None nếu không có)"""
+    return _get_snapshot()[4].get(product_id)
+
+
+def get_version():
+    """Version của snapshot đang dùng, đổi mỗi khi chỉ mục được dựng lại do admin sửa deal / deal hết suất"""
+    return _get_snapshot()[0]
+
+
+def next_boundary():
+    """Mốc start_time/end_time gần nhất làm tập deal đang chạy thay đổi (None nếu không có)"""
+    return _get_snapshot()[2]
+
+
+def attach_deals(products):
+    """Gắn product.active_deal cho danh sách sản phẩm"""
+    best_by_product = _get_snapshot()[4]
+    for product in products:
+        product.active_deal = best_by_product.get(product.id)
+    return products
+
+
+def invalidate_deal_index():
+    """Gọi sau khi tạo/sửa/bật-tắt/xóa deal hoặc deal hết suất"""
+    global _snapshot
+
+    cache.set(DEAL_INDEX_VERSION_KEY, uuid.uuid4().hex, DEAL_INDEX_VERSION_TIMEOUT)
+    _snapshot = None
@@ -0,0 +1,91 @@
+"""
+Giới hạn số suất của WeekendDeal (max_quantity / sold_quantity)
+
+Giữ suất bằng một câu UPDATE có điều kiện, chạy autocommit nên khóa dòng deal chỉ trong
+thời gian của chính câu UPDATE, người mua không phải xếp hàng chờ cả transaction đặt hàng.
+"""
+from contextlib import contextmanager
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+def has_quota_left():
+    """Điều kiện lọc deal còn suất (max_quantity = 0 là không giới hạn)"""
+    return Q(max_quantity=0) | Q(sold_quantity__lt=F('max_quantity'))
+
+
+def claim_deal_units(deal_id, quantity):
+    """
+    UPDATE ... SET sold_quantity = sold_quantity + n
+    WHERE id = ... AND (max_quantity = 0 OR sold_quantity + n <= max_quantity)
+    Trả về True nếu giữ được đủ n suất. n <= 0 raise ValueError (n âm sẽ trả suất thay vì giữ)
+    """
+    from app.models import WeekendDeal
+
+    if quantity <= 0:
+        raise ValueError(f"Số suất deal không hợp lệ: {quantity}")
+    now = timezone.now()
+    return WeekendDeal.objects.filter(
+        id=deal_id,
+        is_active=True,
+        start_time__lte=now,
+        end_time__gte=now,
+    ).filter(
+        Q(max_quantity=0) | Q(sold_quantity__lte=F('max_quantity') - quantity)
+    ).update(sold_quantity=F('sold_quantity') + quantity) == 1
+
+
+def release_deal_units(deal_id, quantity):
+    from app.models import WeekendDeal
+    from .deal_index import invalidate_deal_index
+
+    if quantity <= 0:
+        raise ValueError(f"Số suất deal không hợp lệ: {quantity}")
+
+    released = WeekendDeal.objects.filter(id=deal_id, sold_quantity__gte=quantity).update(
+        sold_quantity=F('sold_quantity') - quantity
+    )
+    if released:
+        # Deal có thể đang bị ẩn khỏi chỉ mục vì hết suất
+        invalidate_deal_index()
+
+
+def _is_exhausted(deal_id):
+    from app.models import WeekendDeal
+
+    return WeekendDeal.objects.filter(
+        id=deal_id, max_quantity__gt=0, sold_quantity__gte=F('max_quantity')
+    ).exists()
+
+
+@contextmanager
+def claimed_deal_units(lines):
+    """
+    Giữ suất deal cho các dòng hàng trước khi tạo đơn.
+    Khối lệnh bên trong lỗi (thiếu hàng, lỗi DB...) thì trả lại các suất đã giữ.
+    """
+    from app.models import WeekendDeal
+    from .deal_index import invalidate_deal_index
+    from .stock_service import DealSoldOutError
+
+    needed = {}
+    for line in lines:
+        if line.get('deal_id'):
+            needed[line['deal_id']] = needed.get(line['deal_id'], 0) + line['quantity']
+
+    claimed = []
+    try:
+        for deal_id, quantity in sorted(needed.items()):
+            if not claim_deal_units(deal_id, quantity):
+                invalidate_deal_index()
+                raise DealSoldOutError(WeekendDeal.objects.filter(id=deal_id).first(), deal_id)
+            claimed.append((deal_id, quantity))
+            if _is_exhausted(deal_id):
+                # Vừa bán hết suất: các trang khác phải về giá thường ngay
+                invalidate_deal_index()
+        yield
+    except BaseException:
+        for deal_id, quantity in claimed:
+            release_deal_units(deal_id, quantity)
+        raise
@@ -0,0 +1,75 @@
+"""
+Cảnh báo tồn kho: sắp hết hàng / tồn nhiều nhưng không bán được
+Tính bằng một câu query có subquery, kết quả được cache làm snapshot dùng chung
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+LOW_STOCK_THRESHOLD = 5
+DEAD_STOCK_DAYS = 30
+HIGH_STOCK_THRESHOLD = 20
+
+SNAPSHOT_CACHE_KEY = 'inventory_alert_snapshot'
+SNAPSHOT_TIMEOUT = 300  # Làm mới snapshot sau 5 phút
+
+
+def compute_inventory_alerts():
+    from app.models import OrderItem, Product
+
+    time_threshold = timezone.now() - timedelta(days=DEAD_STOCK_DAYS)
+
+    # Tổng số lượng bán trong 30 ngày của từng sản phẩm
+    recent_sales = OrderItem.objects.filter(
+        product=OuterRef('pk'),
+        order__created_at__gte=time_threshold
+    ).values('product').annotate(total_sold=Sum('quantity')).values('total_sold')
+
+    products = Product.objects.filter(status=True).annotate(
+        recent_sales=Coalesce(Subquery(recent_sales, output_field=IntegerField()), 0)
+    ).filter(
+        Q(stock_quantity__lte=LOW_STOCK_THRESHOLD) |
+        Q(stock_quantity__gt=HIGH_STOCK_THRESHOLD, recent_sales=0)
+    ).order_by('id')
+
+    alerts = []
+    for p in products:
+        if p.stock_quantity <= LOW_STOCK_THRESHOLD:
+            alerts.append({
+                'product': p,
+                'type': 'LOW_STOCK',
+                'level': 'critical',
+                'message': 'Sắp hết hàng',
+                'suggestion': 'Nhập thêm hàng ngay',
+                'icon': 'bx-import',
+                'css_class': 'restock'
+            })
+        else:
+            alerts.append({
+                'product': p,
+                'type': 'DEAD_STOCK',
+                'level': 'warning',
+                'message': f'Tồn {p.stock_quantity} nhưng không bán được trong {DEAD_STOCK_DAYS} ngày',
+                'suggestion': 'Giảm giá / Flash Sale',
+                'icon': 'bxs-offer',
+                'css_class': 'discount'
+            })
+
+    return {
+        'alerts': alerts,
+        'total_low': sum(1 for a in alerts if a['type'] == 'LOW_STOCK'),
+        'total_dead': sum(1 for a in alerts if a['type'] == 'DEAD_STOCK'),
+        'generated_at': timezone.now(),
+    }
+
+
+def get_inventory_snapshot(refresh=False):
+    """Snapshot cảnh báo tồn kho dùng chung cho dashboard và trang cảnh báo"""
+    snapshot = None if refresh else cache.get(SNAPSHOT_CACHE_KEY)
+    if snapshot is None:
+        snapshot = compute_inventory_alerts()
+        cache.set(SNAPSHOT_CACHE_KEY, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
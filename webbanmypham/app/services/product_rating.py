@@ -0,0 +1,176 @@
+"""
+Điểm đánh giá lưu sẵn trên Product (rating_sum, rating_count, rating_avg, approved_review_count,
+positive_count, positive_ratio) để trang chủ / shop hiển thị sao và sắp xếp theo điểm không cần
+aggregate bảng Review.
+
+Mỗi lần review được tạo / đổi trạng thái (spam, duyệt, nhãn cảm xúc) thì cộng trừ phần đóng góp
+của review đó bằng một câu UPDATE dùng F() cho mỗi sản phẩm, không đọc rồi ghi lại nên không mất
+cập nhật khi nhiều request chạy song song:
+
+    deltas = RatingDeltas()
+    deltas.remove(review)      # trạng thái cũ
+    review.is_spam = True
+    deltas.add(review)         # trạng thái mới
+    deltas.apply()
+
+Trường hợp sửa hàng loạt không theo dõi từng review (rescore, sửa tay trong Django admin)
+thì chạy reconcile() / lệnh reconcile_product_ratings để tính lại từ bảng Review.
+Dữ liệu cũ được dựng trong migration 0014 (reconcile(apps=apps)).
+"""
+from collections import defaultdict
+
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+
+from .catalog_cache import bump_generation
+
+# Thứ tự phần tử trong bộ đếm của mỗi sản phẩm
+FIELDS = ('rating_sum', 'rating_count', 'approved_review_count', 'positive_count')
+
+
+def contribution(review):
+    """Phần review đóng góp vào (rating_sum, rating_count, approved_review_count, positive_count)"""
+    # Review spam không hiển thị (review_feed.visible_reviews) nên không tính vào số đánh giá
+    if not review.is_approved or review.is_spam:
+        return 0, 0, 0, 0
+    return int(review.rating), 1, 1, 1 if review.sentiment == 'POS' else 0
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator dạng số thực, 0 nếu denominator = 0"""
+    return Case(
+        When(GreaterThan(denominator, 0), then=Cast(numerator, FloatField()) / denominator),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+class RatingDeltas:
+    """Gom thay đổi theo sản phẩm rồi ghi một lần (mỗi sản phẩm một UPDATE)"""
+
+    def __init__(self):
+        self.by_product = defaultdict(lambda: [0, 0, 0, 0])
+
+    def add(self, review, sign=1):
+        totals = self.by_product[review.product_id]
+        for i, value in enumerate(contribution(review)):
+            totals[i] += sign * value
+
+    def remove(self, review):
+        self.add(review, sign=-1)
+
+    def apply(self):
+        from app.models import Product
+
+        changed = 0
+        for product_id, (rating_sum, rating_count, approved, positive) in self.by_product.items():
+            if not any((rating_sum, rating_count, approved, positive)):
+                continue
+            new_sum = F('rating_sum') + rating_sum
+            new_count = F('rating_count') + rating_count
+            new_positive = F('positive_count') + positive
+            # Vế phải của UPDATE đọc giá trị cũ của dòng nên rating_avg / positive_ratio
+            # tính lại từ giá trị cũ + delta, không phụ thuộc thứ tự gán
+            changed += Product.objects.filter(pk=product_id).update(
+                rating_sum=new_sum,
+                rating_count=new_count,
+                rating_avg=_ratio(new_sum, new_count),
+                approved_review_count=F('approved_review_count') + approved,
+                positive_count=new_positive,
+                positive_ratio=_ratio(new_positive, new_count),
+            )
+        self.by_product.clear()
+        if changed:
+            # Thẻ sản phẩm trong khối cache hiển thị sao / số đánh giá
+            bump_generation()
+        return changed
+
+
+def review_created(review):
+    deltas = RatingDeltas()
+    deltas.add(review)
+    deltas.apply()
+
+
+def review_deleted(review):
+    deltas = RatingDeltas()
+    deltas.remove(review)
+    deltas.apply()
+
+
+def _models(apps=None):
+    """(Product, Review); apps: model lịch sử khi chạy trong migration"""
+    if apps is not None:
+        return apps.get_model('app', 'Product'), apps.get_model('app', 'Review')
+    from app.models import Product, Review
+
+    return Product, Review
+
+
+def compute_ratings(product_ids=None, apps=None):
+    """{product_id: (rating_sum, rating_count, approved_review_count, positive_count)} từ bảng Review"""
+    _, Review = _models(apps)
+
+    reviews = Review.objects.filter(is_approved=True)
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+    counted = Q(is_spam=False)
+    rows = (
+        reviews.values_list('product_id')
+        .annotate(
+            rating_sum=Sum('rating', filter=counted),
+            rating_count=Count('id', filter=counted),
+            approved=Count('id', filter=counted),
+            positive=Count('id', filter=counted & Q(sentiment='POS')),
+        )
+        .order_by()
+    )
+    return {
+        product_id: (rating_sum or 0, rating_count, approved, positive)
+        for product_id, rating_sum, rating_count, approved, positive in rows
+    }
+
+
+def reconcile(product_ids=None, batch_size=500, apps=None):
+    """Tính lại các trường đánh giá của sản phẩm, chỉ ghi những sản phẩm bị lệch. Trả về số sản phẩm đã sửa"""
+    Product, _ = _models(apps)
+
+    products = Product.objects.order_by('id').only('id', *FIELDS, 'rating_avg', 'positive_ratio')
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+
+    fixed = 0
+    last_id = 0
+    while True:
+        chunk = list(products.filter(id__gt=last_id)[:batch_size])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        actual = compute_ratings([product.id for product in chunk], apps=apps)
+
+        stale = []
+        for product in chunk:
+            rating_sum, rating_count, approved, positive = actual.get(product.id, (0, 0, 0, 0))
+            values = {
+                'rating_sum': rating_sum,
+                'rating_count': rating_count,
+                'rating_avg': rating_sum / rating_count if rating_count else 0.0,
+                'approved_review_count': approved,
+                'positive_count': positive,
+                'positive_ratio': positive / rating_count if rating_count else 0.0,
+            }
+            if any(
+                abs(getattr(product, name) - value) > 1e-9 for name, value in values.items()
+            ):
+                for name, value in values.items():
+                    setattr(product, name, value)
+                stale.append(product)
+
+        if stale:
+            Product.objects.bulk_update(stale, [*FIELDS, 'rating_avg', 'positive_ratio'])
+            fixed += len(stale)
+
+    if fixed:
+        bump_generation()
+    return fixed
@@ -0,0 +1,291 @@
+"""
+Gợi ý sản phẩm theo loại da, thành phần và hành vi mua chung
+
+Tính offline (lệnh build_recommendations, chạy hằng đêm), lưu top-N vào ProductRecommendation /
+UserRecommendation. Trang web chỉ đọc: "Sản phẩm liên quan" và "Dành cho bạn" là một query
+theo index (source/user, rank) JOIN bảng Product.
+
+Điểm sản phẩm liên quan (nguồn -> ứng viên), trọng số trong settings.RECOMMENDER:
+    COPURCHASE_WEIGHT * cosine mua chung
+  + INGREDIENT_WEIGHT * độ trùng thành phần (Jaccard)
+  + SKIN_WEIGHT       * hợp loại da (cùng loại 1, một bên "mọi loại da" 0.5)
+  + CATEGORY_WEIGHT   * cùng danh mục
+Ứng viên lấy từ sản phẩm mua chung, có chung thành phần hoặc cùng danh mục (không so mọi cặp).
+
+Điểm "Dành cho bạn" (khách hàng -> ứng viên):
+    COPURCHASE_WEIGHT * tổng cosine mua chung với các sản phẩm khách đã mua
+  + SKIN_WEIGHT       * hợp loại da của khách (CustomerProfile.skin_type)
+  + CONCERN_WEIGHT    * tỉ lệ vấn đề da (skin_concerns) được nhắc tới trong tên / thành phần / mô tả
+  + POPULARITY_WEIGHT * độ bán chạy (log, chuẩn hóa)
+Bỏ các sản phẩm khách đã mua.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+DEFAULT_CONFIG = {
+    'TOP_N': 12,               # Số gợi ý lưu cho mỗi sản phẩm / khách hàng
+    'USER_POPULAR_POOL': 200,  # Số sản phẩm bán chạy (hợp loại da) xét thêm cho mỗi khách
+    'MAX_BASKET_SIZE': 50,     # Đơn nhiều dòng hơn (khách sỉ...) chỉ lấy chừng này sản phẩm khi đếm mua chung
+    'COPURCHASE_WEIGHT': 1.0,
+    'INGREDIENT_WEIGHT': 0.6,
+    'SKIN_WEIGHT': 0.3,
+    'CATEGORY_WEIGHT': 0.2,
+    'CONCERN_WEIGHT': 0.4,
+    'POPULARITY_WEIGHT': 0.1,
+}
+
+EXCLUDED_ORDER_STATUSES = ('cancelled', 'returned')
+
+UNIVERSAL_SKIN = 'mọi loại da'
+INGREDIENT_SPLIT_RE = re.compile(r'[,;/\n]+')
+
+
+def get_config():
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'RECOMMENDER', {}))
+    return config
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def ingredient_set(text):
+    return frozenset(part for part in (normalize(p) for p in INGREDIENT_SPLIT_RE.split(text or '')) if part)
+
+
+def skin_match(target, skin):
+    """Mức hợp loại da: target là Product.target_skin_type, skin là tên loại da (đã chuẩn hóa)"""
+    if not target or not skin:
+        return 0.0
+    if skin in target:
+        return 1.0
+    if UNIVERSAL_SKIN in target or UNIVERSAL_SKIN in skin:
+        return 0.5
+    return 0.0
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class Catalog:
+    """Dữ liệu sản phẩm và lịch sử mua cần cho việc chấm điểm, đọc một lần"""
+
+    def __init__(self, config=None):
+        from app.models import OrderItem, Product
+
+        self.config = config or get_config()
+        self.products = {}
+        for product_id, category_id, target, ingredients, name, description, sold in (
+            Product.objects.filter(status=True).values_list(
+                'id', 'category_id', 'target_skin_type', 'main_ingredients', 'name', 'description', 'sold_quantity'
+            )
+        ):
+            self.products[product_id] = {
+                'category': category_id,
+                'skin': normalize(target),
+                'ingredients': ingredient_set(ingredients),
+                'text': normalize(f'{name} {ingredients} {description}'),
+                'sold': sold,
+            }
+
+        self.by_category = defaultdict(set)
+        self.by_ingredient = defaultdict(set)
+        for product_id, info in self.products.items():
+            self.by_category[info['category']].add(product_id)
+            for ingredient in info['ingredients']:
+                self.by_ingredient[ingredient].add(product_id)
+
+        baskets = defaultdict(set)
+        self.purchases = defaultdict(set)
+        rows = (
+            OrderItem.objects.exclude(order__order_status__in=EXCLUDED_ORDER_STATUSES)
+            .filter(product__isnull=False)
+            .values_list('order_id', 'order__user_id', 'product_id')
+            .iterator(chunk_size=10000)
+        )
+        for order_id, user_id, product_id in rows:
+            baskets[order_id].add(product_id)
+            if user_id is not None:
+                self.purchases[user_id].add(product_id)
+
+        # Số đơn chứa từng sản phẩm và từng cặp sản phẩm
+        self.order_count = Counter()
+        self.pair_count = defaultdict(Counter)
+        for items in baskets.values():
+            items = sorted(items)[:self.config['MAX_BASKET_SIZE']]
+            self.order_count.update(items)
+            for i, a in enumerate(items):
+                for b in items[i + 1:]:
+                    self.pair_count[a][b] += 1
+                    self.pair_count[b][a] += 1
+
+        max_sold = max((info['sold'] for info in self.products.values()), default=0)
+        self.popularity_scale = math.log1p(max_sold) or 1.0
+        self._popular = {}
+
+    def copurchase(self, a, b):
+        """Cosine: số đơn mua chung / sqrt(số đơn có a * số đơn có b)"""
+        together = self.pair_count[a].get(b, 0)
+        if not together:
+            return 0.0
+        return together / math.sqrt(self.order_count[a] * self.order_count[b])
+
+    def popular(self, skin):
+        """USER_POPULAR_POOL sản phẩm bán chạy nhất hợp loại da skin (mọi sản phẩm nếu skin rỗng), tính một lần mỗi loại da"""
+        if skin not in self._popular:
+            pool = [
+                product_id for product_id, info in self.products.items()
+                if not skin or skin_match(info['skin'], skin)
+            ]
+            self._popular[skin] = frozenset(heapq.nlargest(
+                self.config['USER_POPULAR_POOL'], pool, key=lambda product_id: self.products[product_id]['sold']
+            ))
+        return self._popular[skin]
+
+    def popularity(self, product_id):
+        return math.log1p(max(self.products[product_id]['sold'], 0)) / self.popularity_scale
+
+
+def related_scores(catalog, source_id):
+    """[(score, product_id)] top-N sản phẩm liên quan tới source_id"""
+    config = catalog.config
+    source = catalog.products[source_id]
+    candidates = set(catalog.pair_count[source_id]) | catalog.by_category[source['category']]
+    for ingredient in source['ingredients']:
+        candidates |= catalog.by_ingredient[ingredient]
+    candidates.discard(source_id)
+
+    scored = []
+    for product_id in candidates:
+        info = catalog.products.get(product_id)
+        if info is None:
+            continue
+        score = (
+            config['COPURCHASE_WEIGHT'] * catalog.copurchase(source_id, product_id)
+            + config['INGREDIENT_WEIGHT'] * jaccard(source['ingredients'], info['ingredients'])
+            + config['SKIN_WEIGHT'] * skin_match(info['skin'], source['skin'])
+            + config['CATEGORY_WEIGHT'] * (info['category'] == source['category'])
+        )
+        if score > 0:
+            scored.append((score, -product_id))
+    return [(score, -negative_id) for score, negative_id in heapq.nlargest(config['TOP_N'], scored)]
+
+
+def user_scores(catalog, user_id, skin_label, concerns):
+    """[(score, product_id)] top-N sản phẩm gợi ý cho khách hàng"""
+    config = catalog.config
+    bought = catalog.purchases.get(user_id, set())
+    skin = normalize(skin_label)
+    concerns = [normalize(concern) for concern in concerns or [] if normalize(concern)]
+
+    cf = defaultdict(float)
+    for bought_id in bought:
+        for product_id in catalog.pair_count[bought_id]:
+            cf[product_id] += catalog.copurchase(bought_id, product_id)
+
+    # Ứng viên: sản phẩm mua chung + nhóm bán chạy (hợp loại da nếu khách đã khai báo)
+    candidates = (set(cf) | catalog.popular(skin)) - bought
+
+    scored = []
+    for product_id in candidates:
+        info = catalog.products.get(product_id)
+        if info is None:
+            continue
+        concern_hits = sum(1 for concern in concerns if concern in info['text'])
+        score = (
+            config['COPURCHASE_WEIGHT'] * cf.get(product_id, 0.0)
+            + config['SKIN_WEIGHT'] * skin_match(info['skin'], skin)
+            + config['CONCERN_WEIGHT'] * (concern_hits / len(concerns) if concerns else 0.0)
+            + config['POPULARITY_WEIGHT'] * catalog.popularity(product_id)
+        )
+        if score > 0:
+            scored.append((score, -product_id))
+    return [(score, -negative_id) for score, negative_id in heapq.nlargest(config['TOP_N'], scored)]
+
+
+def _replace_rows(model, rows, batch_size=5000):
+    with transaction.atomic():
+        model.objects.all().delete()
+        model.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def build_related(catalog):
+    from app.models import ProductRecommendation
+
+    rows = [
+        ProductRecommendation(source_id=source_id, product_id=product_id, rank=rank, score=score)
+        for source_id in catalog.products
+        for rank, (score, product_id) in enumerate(related_scores(catalog, source_id), start=1)
+    ]
+    _replace_rows(ProductRecommendation, rows)
+    return len(rows)
+
+
+def build_for_users(catalog):
+    """Tính cho khách đã mua hàng hoặc đã khai báo loại da"""
+    from app.models import CustomerProfile, UserRecommendation
+
+    skin_labels = dict(CustomerProfile.SKIN_TYPE_CHOICES)
+    profiles = {
+        user_id: (skin_labels.get(skin_type, '') if skin_type != 'unknown' else '', concerns)
+        for user_id, skin_type, concerns in CustomerProfile.objects.values_list('user_id', 'skin_type', 'skin_concerns')
+    }
+    user_ids = set(catalog.purchases) | {user_id for user_id, (skin, _) in profiles.items() if skin}
+
+    rows = []
+    for user_id in user_ids:
+        skin_label, concerns = profiles.get(user_id, ('', []))
+        for rank, (score, product_id) in enumerate(
+            user_scores(catalog, user_id, skin_label, concerns if isinstance(concerns, list) else []), start=1
+        ):
+            rows.append(UserRecommendation(user_id=user_id, product_id=product_id, rank=rank, score=score))
+    _replace_rows(UserRecommendation, rows)
+    return len(user_ids), len(rows)
+
+
+def build():
+    """Tính lại toàn bộ danh sách gợi ý. Trả về (số dòng liên quan, số khách, số dòng cho khách)"""
+    catalog = Catalog()
+    related = build_related(catalog)
+    users, user_rows = build_for_users(catalog)
+    return related, users, user_rows
+
+
+def related_products(product, limit=4):
+    """Sản phẩm liên quan tính sẵn; sản phẩm mới chưa có danh sách thì lấy cùng danh mục"""
+    from app.models import Product
+
+    products = list(
+        Product.objects.select_related('category')
+        .filter(recommended_in__source_id=product.id, status=True)
+        .order_by('recommended_in__rank')[:limit]
+    )
+    if not products:
+        products = list(
+            Product.objects.select_related('category')
+            .filter(category_id=product.category_id, status=True)
+            .exclude(id=product.id)[:limit]
+        )
+    return products
+
+
+def for_user(user, limit=8):
+    """Danh sách "Dành cho bạn" tính sẵn (rỗng nếu chưa đăng nhập / chưa có dữ liệu)"""
+    from app.models import Product
+
+    if not user.is_authenticated:
+        return []
+    return list(
+        Product.objects.select_related('category')
+        .filter(recommended_to__user_id=user.id, status=True)
+        .order_by('recommended_to__rank')[:limit]
+    )
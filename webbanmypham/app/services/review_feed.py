@@ -0,0 +1,123 @@
+"""
+Danh sách đánh giá trên trang chi tiết sản phẩm
+
+- Phân trang theo con trỏ (created_at, id), trang đầu render sẵn, các trang sau
+  tải bằng nút "Xem thêm" qua endpoint JSON (views.product_reviews).
+- select_related('user__profile') nên tên / avatar người viết không tốn thêm query.
+- Tổng hợp điểm (trung bình, số lượng từng mức sao, tỉ lệ cảm xúc AI) cache theo sản phẩm,
+  xóa khi có review mới / worker AI chấm xong / job spam đánh dấu; job chấm lại hàng loạt
+  thì đổi version để bỏ toàn bộ.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+
+from . import cursor_pagination
+
+FEED_PAGE_SIZE = 10
+FEED_ORDERING = ('-created_at', '-id')
+
+SUMMARY_VERSION_KEY = 'review_summary_version'
+SUMMARY_TIMEOUT = 60 * 60
+
+SENTIMENTS = (('POS', 'Tích cực'), ('NEU', 'Trung tính'), ('NEG', 'Tiêu cực'))
+
+
+def visible_reviews(product_id):
+    """Review hiển thị và được tính điểm: đã duyệt, không phải spam (giống Product.rating_avg)"""
+    from app.models import Review
+
+    return Review.objects.filter(product_id=product_id, is_approved=True, is_spam=False)
+
+
+def get_feed_page(product_id, cursor=None):
+    return cursor_pagination.paginate(
+        visible_reviews(product_id).select_related('user__profile'),
+        cursor, per_page=FEED_PAGE_SIZE, ordering=FEED_ORDERING,
+    )
+
+
+def avatar_url(user):
+    """Ảnh đại diện của người viết, không có hồ sơ / ảnh thì dùng ảnh tạo từ tên"""
+    try:
+        avatar = user.profile.avatar
+    except user._meta.model.profile.RelatedObjectDoesNotExist:
+        avatar = None
+    if avatar:
+        return avatar.url
+    return f'https://ui-avatars.com/api/?name={user.username}&background=random'
+
+
+def serialize_review(review):
+    return {
+        'id': review.id,
+        'author': review.user.username,
+        'avatar': avatar_url(review.user),
+        'rating': review.rating,
+        'comment': review.comment,
+        'created_at': review.created_at.isoformat(),
+    }
+
+
+def _summary_version():
+    version = cache.get(SUMMARY_VERSION_KEY)
+    if version is None:
+        cache.add(SUMMARY_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SUMMARY_VERSION_KEY)
+    return version
+
+
+def _summary_key(product_id, version=None):
+    return f'review_summary:{version or _summary_version()}:{product_id}'
+
+
+def _percent(part, total):
+    return round(part * 100 / total) if total else 0
+
+
+def compute_rating_summary(product_id):
+    """Một câu aggregate cho cả điểm trung bình, số lượng từng mức sao và cảm xúc"""
+    stats = visible_reviews(product_id).aggregate(
+        count=Count('id'),
+        average=Avg('rating'),
+        **{f'star_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+        **{f'sentiment_{code}': Count('id', filter=Q(sentiment=code)) for code, _ in SENTIMENTS},
+    )
+    count = stats['count']
+    average = round(stats['average'] or 0, 1)
+    scored = sum(stats[f'sentiment_{code}'] for code, _ in SENTIMENTS)
+    return {
+        'count': count,
+        'average': average,
+        'stars': int(average + 0.5) if count else 5,
+        'histogram': [
+            {'star': star, 'count': stats[f'star_{star}'], 'percent': _percent(stats[f'star_{star}'], count)}
+            for star in range(5, 0, -1)
+        ],
+        'sentiments': [
+            {'code': code, 'label': label, 'count': stats[f'sentiment_{code}'],
+             'percent': _percent(stats[f'sentiment_{code}'], scored)}
+            for code, label in SENTIMENTS
+        ],
+    }
+
+
+def get_rating_summary(product_id):
+    key = _summary_key(product_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_rating_summary(product_id)
+        cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_rating_summary(*product_ids):
+    """Gọi sau khi review của các sản phẩm này được thêm / đổi nhãn / đánh dấu spam"""
+    version = _summary_version()
+    cache.delete_many([_summary_key(product_id, version) for product_id in set(product_ids)])
+
+
+def invalidate_all_rating_summaries():
+    """Dùng cho job cập nhật review hàng loạt không theo dõi từng sản phẩm"""
+    cache.set(SUMMARY_VERSION_KEY, uuid.uuid4().hex, None)
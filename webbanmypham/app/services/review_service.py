@@ -2,16 +2,28 @@
 Service xử lý reviews: spam detection, sentiment analysis
 """
 import re
+import threading
+import uuid
 from django.core.cache import cache
 
+from .spam_matcher import KeywordAutomaton
+
+SPAM_KEYWORDS_CACHE_KEY = 'spam_keywords_active'
+SPAM_KEYWORDS_VERSION_KEY = 'spam_keywords_version'
+
+# Automaton dựng sẵn trong tiến trình, đánh dấu bằng version lưu trong cache.
+# Không sửa tại chỗ (thread khác có thể đang find_best): dựng bản mới rồi thay tham chiếu
+_spam_matcher = None
+_spam_matcher_version = None
+_refresh_lock = threading.Lock()
+
 
 def get_spam_keywords():
     """
     Lấy danh sách spam keywords từ database với caching
     Cache trong 5 phút để giảm query
     """
-    cache_key = 'spam_keywords_active'
-    keywords = cache.get(cache_key)
+    keywords = cache.get(SPAM_KEYWORDS_CACHE_KEY)
     
     if keywords is None:
         from app.models import SpamKeyword
@@ -20,11 +32,58 @@ def get_spam_keywords():
             .values('keyword', 'severity', 'category')
             .order_by('-severity')
         )
-        cache.set(cache_key, keywords, 300)  # Cache 5 phút
+        cache.set(SPAM_KEYWORDS_CACHE_KEY, keywords, 300)  # Cache 5 phút
     
     return keywords
 
 
+def get_spam_matcher():
+    """
+    Lấy automaton dò spam keyword, chỉ dựng lại khi version trong cache thay đổi
+    (keyword bị sửa ở tiến trình khác hoặc hết hạn cache 5 phút)
+    """
+    global _spam_matcher, _spam_matcher_version
+
+    version = cache.get(SPAM_KEYWORDS_VERSION_KEY)
+    if version is None:
+        cache.add(SPAM_KEYWORDS_VERSION_KEY, uuid.uuid4().hex, 300)
+        version = cache.get(SPAM_KEYWORDS_VERSION_KEY)
+
+    if _spam_matcher is None or version != _spam_matcher_version:
+        _spam_matcher = KeywordAutomaton(get_spam_keywords()).build()
+        _spam_matcher_version = version
+    return _spam_matcher
+
+
+def refresh_spam_keyword(old_keyword=None, keyword=None):
+    """
+    Cập nhật automaton sau khi admin thêm/sửa/bật-tắt/xóa keyword.
+    old_keyword: chuỗi keyword cũ cần gỡ; keyword: SpamKeyword sau khi lưu (thêm lại nếu đang bật)
+    Tiến trình hiện tại vá trie trên bản sao copy() (chỉ chép các node bị sửa), build() tính lại liên kết
+    fail bằng một lượt BFS rồi thay tham chiếu; tiến trình khác thấy version mới sẽ dựng lại từ DB.
+    """
+    global _spam_matcher, _spam_matcher_version
+
+    with _refresh_lock:
+        matcher = get_spam_matcher().copy()
+        if old_keyword:
+            matcher.remove(old_keyword)
+        if keyword is not None:
+            matcher.remove(keyword.keyword)
+            if keyword.is_active:
+                matcher.add({
+                    'keyword': keyword.keyword,
+                    'severity': keyword.severity,
+                    'category': keyword.category,
+                })
+
+        cache.delete(SPAM_KEYWORDS_CACHE_KEY)
+        # Gán một lần (nguyên tử với GIL): thread đang find_best vẫn dùng trọn automaton cũ
+        _spam_matcher = matcher.build()
+        _spam_matcher_version = uuid.uuid4().hex
+        cache.set(SPAM_KEYWORDS_VERSION_KEY, _spam_matcher_version, 300)
+
+
 def detect_spam_keywords(comment):
     """
     Kiểm tra comment có chứa spam keywords không
@@ -32,14 +91,10 @@ def detect_spam_keywords(comment):
     """
     comment_lower = comment.lower().strip()
     
-    # Lấy keywords từ database
-    spam_keywords = get_spam_keywords()
-    
-    # Kiểm tra từng keyword
-    for item in spam_keywords:
-        keyword = item['keyword'].lower()
-        if keyword in comment_lower:
-            return True, item['keyword'], item['severity'], item['category']
+    # Dò tất cả keywords trong một lần duyệt, lấy keyword có severity cao nhất
+    item = get_spam_matcher().find_best(comment_lower)
+    if item:
+        return True, item['keyword'], item['severity'], item['category']
     
     # Kiểm tra lặp lại từ (VD: "tuyệt vời tuyệt vời tuyệt vời")
     words = comment_lower.split()
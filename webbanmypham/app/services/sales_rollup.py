@@ -0,0 +1,187 @@
+"""
+Bảng tổng hợp doanh số theo ngày (DailySalesRollup): cập nhật khi đơn hàng thay đổi,
+dashboard xem theo quý/năm chỉ đọc vài trăm dòng thay vì quét toàn bộ đơn
+
+- Đơn thay đổi: sau khi commit chỉ tính lại dòng tổng shop + dòng của các sản phẩm trong đơn.
+  Lỗi ở bước này chỉ được ghi log (đơn đã commit), số liệu được sửa lại bằng rebuild_sales_rollup.
+- Mọi lần ghi giữ khóa dòng JobWatermark LOCK_NAME: hai đơn cùng ngày ghi lần lượt, không
+  đụng unique (day, product) hay deadlock khóa khoảng trên MySQL. Dòng tổng shop có product = NULL
+  nên unique (day, product) không chặn được bản trùng, khóa này là thứ giữ nó duy nhất.
+- Doanh thu sản phẩm = Σ price * quantity của đơn đã thanh toán (giống dashboard theo tháng).
+- Dữ liệu cũ được dựng trong migration 0008 (rebuild_range(..., apps=apps)).
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Min, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+STATUSES = ['pending', 'confirmed', 'shipping', 'completed', 'cancelled', 'returned']
+LOCK_NAME = 'sales_rollup'
+
+
+def _models(apps=None):
+    """(DailySalesRollup, JobWatermark, Order, OrderItem); apps: model lịch sử khi chạy trong migration"""
+    if apps is not None:
+        return tuple(apps.get_model('app', name) for name in ('DailySalesRollup', 'JobWatermark', 'Order', 'OrderItem'))
+    from app.models import DailySalesRollup, JobWatermark, Order, OrderItem
+
+    return DailySalesRollup, JobWatermark, Order, OrderItem
+
+
+def item_revenue(filter=None):
+    """Doanh thu của dòng đơn hàng, dùng chung cho bảng tổng hợp và dashboard theo tháng"""
+    return Sum(F('price') * F('quantity'), filter=filter, output_field=DecimalField())
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _status_counts(from_items=False):
+    """Đếm số đơn theo từng trạng thái, tính từ Order hoặc từ OrderItem (from_items=True)"""
+    if from_items:
+        return {
+            f'{status}_count': Count('order', filter=Q(order__order_status=status), distinct=True)
+            for status in STATUSES
+        }
+    return {
+        f'{status}_count': Count('id', filter=Q(order_status=status))
+        for status in STATUSES
+    }
+
+
+def _day_rows(DailySalesRollup, Order, OrderItem, day, product_ids):
+    start, end = _day_range(day)
+    orders = Order.objects.filter(created_at__gte=start, created_at__lt=end)
+    paid = Q(payment_status=True)
+
+    store = orders.aggregate(
+        revenue=Sum('final_money', filter=paid),
+        order_count=Count('id'),
+        paid_order_count=Count('id', filter=paid),
+        **_status_counts(),
+    )
+    if not store['order_count']:
+        return []
+    store['revenue'] = store['revenue'] or 0
+    store['units_sold'] = OrderItem.objects.filter(
+        order__created_at__gte=start, order__created_at__lt=end, order__payment_status=True
+    ).aggregate(units=Sum('quantity'))['units'] or 0
+    rows = [DailySalesRollup(day=day, product=None, **store)]
+
+    items = OrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end, product__isnull=False)
+    if product_ids is not None:
+        items = items.filter(product_id__in=product_ids)
+    item_paid = Q(order__payment_status=True)
+    per_product = items.values('product_id').annotate(
+        revenue=item_revenue(filter=item_paid),
+        order_count=Count('order', distinct=True),
+        paid_order_count=Count('order', filter=item_paid, distinct=True),
+        units_sold=Sum('quantity', filter=item_paid),
+        **_status_counts(from_items=True),
+    ).order_by()
+    for row in per_product:
+        row['revenue'] = row['revenue'] or 0
+        row['units_sold'] = row['units_sold'] or 0
+        rows.append(DailySalesRollup(day=day, **row))
+    return rows
+
+
+def refresh_day(day, product_ids=None, apps=None):
+    """
+    Tính lại dòng tổng hợp của một ngày: dòng tổng shop và từng sản phẩm
+    (chỉ các sản phẩm trong product_ids nếu truyền vào). Trả về số dòng đã ghi
+    """
+    DailySalesRollup, JobWatermark, Order, OrderItem = _models(apps)
+
+    # Tạo dòng khóa ngoài transaction: câu đầu tiên trong transaction là câu khóa, nên số liệu
+    # đọc sau đó (snapshot MySQL) đã gồm mọi đơn mà lần ghi trước vừa commit
+    JobWatermark.objects.get_or_create(name=LOCK_NAME)
+    with transaction.atomic():
+        JobWatermark.objects.select_for_update().get(name=LOCK_NAME)
+        rows = _day_rows(DailySalesRollup, Order, OrderItem, day, product_ids)
+
+        stale = DailySalesRollup.objects.filter(day=day)
+        if product_ids is not None:
+            stale = stale.filter(Q(product__isnull=True) | Q(product_id__in=product_ids))
+        stale.delete()
+        DailySalesRollup.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_range(start_day, end_day, apps=None):
+    """Dựng lại các ngày trong khoảng [start_day, end_day]"""
+    day = start_day
+    total = 0
+    while day <= end_day:
+        total += refresh_day(day, apps=apps)
+        day += timedelta(days=1)
+    return total
+
+
+def rebuild_all(apps=None):
+    """Dựng lại từ ngày có đơn đầu tiên tới hôm nay. Trả về (ngày đầu, số dòng)"""
+    Order = _models(apps)[2]
+
+    first_order = Order.objects.aggregate(first=Min('created_at'))['first']
+    if first_order is None:
+        return None, 0
+    start_day = timezone.localtime(first_order).date()
+    return start_day, rebuild_range(start_day, timezone.localdate(), apps=apps)
+
+
+def refresh_order_rollup(order):
+    """
+    Gọi sau khi đơn được tạo / thanh toán / đổi trạng thái: sau khi commit tính lại dòng tổng
+    shop và dòng của các sản phẩm trong đơn. robust: lỗi chỉ ghi log, không làm hỏng request
+    """
+    day = timezone.localtime(order.created_at).date()
+
+    def refresh():
+        _, _, _, OrderItem = _models()
+        product_ids = set(OrderItem.objects.filter(order_id=order.id).values_list('product_id', flat=True)) - {None}
+        refresh_day(day, product_ids=product_ids)
+
+    transaction.on_commit(refresh, robust=True)
+
+
+# ----- Đọc số liệu cho dashboard -----
+
+def _rollup_rows(start_day, end_day):
+    from app.models import DailySalesRollup
+
+    return DailySalesRollup.objects.filter(day__gte=start_day, day__lt=end_day)
+
+
+def period_summary(start_day, end_day):
+    """Doanh thu + bộ đếm trạng thái của cả shop trong khoảng [start_day, end_day)"""
+    summary = _rollup_rows(start_day, end_day).filter(product__isnull=True).aggregate(
+        total_revenue=Sum('revenue'),
+        period_order_count=Sum('order_count'),
+        completed_orders=Sum('completed_count'),
+        pending_orders=Sum('pending_count'),
+        cancelled_orders=Sum('cancelled_count'),
+    )
+    return {key: value or 0 for key, value in summary.items()}
+
+
+def monthly_series(start_day, end_day):
+    """{(năm, tháng): {'revenue', 'count'}} của các đơn đã thanh toán"""
+    rows = _rollup_rows(start_day, end_day).filter(product__isnull=True).annotate(
+        bucket=TruncMonth('day')
+    ).values('bucket').annotate(
+        revenue=Sum('revenue'), count=Sum('paid_order_count')
+    ).order_by()
+    return {(row['bucket'].year, row['bucket'].month): row for row in rows}
+
+
+def top_products(start_day, end_day, limit=5):
+    return _rollup_rows(start_day, end_day).filter(
+        product__isnull=False, units_sold__gt=0
+    ).values('product__name').annotate(
+        total_sold=Sum('units_sold'),
+        total_revenue=Sum('revenue'),  # Σ price * quantity, xem item_revenue
+    ).order_by('-total_sold')[:limit]
@@ -0,0 +1,333 @@
+"""
+Tìm kiếm sản phẩm bằng chỉ mục ngược (SearchPosting) và xếp hạng BM25
+
+- Văn bản được bỏ dấu tiếng Việt ("Son Kem Lì" -> "son kem li") rồi tách từ,
+  nên gõ không dấu vẫn tìm được.
+- Mỗi trường có trọng số riêng (tên sản phẩm quan trọng nhất).
+- Mỗi posting lưu sẵn phần điểm BM25 không phụ thuộc câu tìm kiếm (weight), tìm kiếm chỉ đọc
+  MAX_POSTINGS_PER_TERM posting điểm cao nhất của mỗi từ theo index (term, -weight) thay vì cả danh sách.
+- Lưu sản phẩm (trang quản trị, Django admin...), đổi tên / xóa danh mục, thương hiệu thì signals
+  đánh chỉ mục lại đúng các sản phẩm đó. QuerySet.update()/bulk_update() không phát signal:
+  gọi index_products() sau khi sửa hàng loạt, hoặc dựng lại toàn bộ bằng: python manage.py rebuild_search_index
+"""
+import math
+import re
+import time
+import unicodedata
+import uuid
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum
+
+# Trọng số từng trường khi tính tần suất từ
+FIELD_WEIGHTS = (
+    ('name', 3),
+    ('brand', 2),
+    ('category', 2),
+    ('main_ingredients', 1),
+    ('description', 1),
+)
+
+# Các trường của Product có mặt trong chỉ mục (lưu với update_fields khác thì không cần đánh lại)
+INDEXED_FIELDS = frozenset(('name', 'brand', 'category', 'main_ingredients', 'description', 'status'))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Số posting tối đa đọc cho mỗi từ (điểm cao nhất trước). Từ phổ biến hơn thế ("kem", "da"...)
+# chỉ xếp hạng trong nhóm đầu này; khi tìm nhiều từ, các từ còn lại được tra đúng trên nhóm ứng viên.
+MAX_POSTINGS_PER_TERM = 500
+
+MAX_TERM_LENGTH = 64
+STATS_CACHE_KEY = 'search_index_stats'
+DF_CACHE_PREFIX = 'search_df:'
+STATS_TIMEOUT = 300
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    """Bỏ dấu tiếng Việt + chữ thường: 'Sữa Rửa Mặt' -> 'sua rua mat'"""
+    if not text:
+        return ''
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn').lower()
+
+
+def tokenize(text):
+    """Tách từ sau khi bỏ dấu, bỏ các ký tự đơn lẻ (trừ số)"""
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in _TOKEN_RE.findall(fold(text))
+        if len(token) > 1 or token.isdigit()
+    ]
+
+
+def product_fields(product):
+    return {
+        'name': product.name,
+        'brand': product.brand.name if product.brand_id else '',
+        'category': product.category.name if product.category_id else '',
+        'main_ingredients': product.main_ingredients,
+        'description': product.description,
+    }
+
+
+def build_terms(product):
+    """Trả về (Counter từ -> tần suất có trọng số, độ dài văn bản)"""
+    fields = product_fields(product)
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for token in tokenize(fields[field]):
+            terms[token] += weight
+    return terms, sum(terms.values())
+
+
+def term_weight(tf, doc_len, avgdl):
+    """Phần điểm BM25 của một posting không phụ thuộc câu tìm kiếm (điểm = idf * weight)"""
+    return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avgdl))
+
+
+def _models(apps=None):
+    if apps is None:
+        from app.models import SearchDocument, SearchPosting
+        return SearchDocument, SearchPosting
+    return apps.get_model('app', 'SearchDocument'), apps.get_model('app', 'SearchPosting')
+
+
+def _postings_for(product, avgdl=None):
+    from app.models import SearchDocument, SearchPosting
+
+    terms, length = build_terms(product)
+    avgdl = avgdl or length or 1
+    postings = [
+        SearchPosting(term=term, product_id=product.id, tf=tf, doc_len=length, weight=term_weight(tf, length, avgdl))
+        for term, tf in terms.items()
+    ]
+    return SearchDocument(product_id=product.id, length=length), postings
+
+
+def index_product(product):
+    """
+    Đánh chỉ mục lại một sản phẩm (signals gọi sau khi lưu). Sản phẩm ngừng kinh doanh thì gỡ khỏi chỉ mục.
+    weight tính theo avgdl hiện tại; avgdl trôi dần theo thời gian, rebuild_index / reweight tính lại cho đều.
+    """
+    from app.models import SearchDocument, SearchPosting
+
+    with transaction.atomic():
+        old_lengths = list(SearchDocument.objects.filter(product_id=product.id).values_list('length', flat=True))
+        SearchPosting.objects.filter(product_id=product.id).delete()
+        SearchDocument.objects.filter(product_id=product.id).delete()
+        new_lengths = []
+        if product.status:
+            document, postings = _postings_for(product, get_index_stats()['avgdl'])
+            document.save()
+            SearchPosting.objects.bulk_create(postings)
+            new_lengths.append(document.length)
+        transaction.on_commit(lambda: _adjust_stats(
+            len(new_lengths) - len(old_lengths), sum(new_lengths) - sum(old_lengths)
+        ))
+
+
+def index_products(product_ids, chunk_size=500):
+    """Đánh chỉ mục lại nhiều sản phẩm (sau khi sửa hàng loạt, đổi tên danh mục / thương hiệu)"""
+    from app.models import Product
+
+    product_ids = sorted(set(product_ids))
+    for start in range(0, len(product_ids), chunk_size):
+        chunk = product_ids[start:start + chunk_size]
+        found = Product.objects.select_related('brand', 'category').in_bulk(chunk)
+        for product_id in chunk:
+            product = found.get(product_id)
+            if product is None:
+                # Sản phẩm đã bị xóa: posting đã xóa theo CASCADE
+                continue
+            index_product(product)
+    return len(product_ids)
+
+
+def reweight(apps=None):
+    """Tính lại SearchPosting.weight theo avgdl hiện tại bằng một câu UPDATE, trả về số posting"""
+    SearchDocument, SearchPosting = _models(apps)
+
+    avgdl = SearchDocument.objects.aggregate(avgdl=Avg('length'))['avgdl']
+    if not avgdl:
+        return 0
+    # tf * (k1 + 1) / (tf + k1 * (1 - b) + k1 * b / avgdl * doc_len), cùng công thức với term_weight
+    weight = ExpressionWrapper(
+        F('tf') * (BM25_K1 + 1) / (F('tf') + BM25_K1 * (1 - BM25_B) + BM25_K1 * BM25_B / float(avgdl) * F('doc_len')),
+        output_field=FloatField(),
+    )
+    return SearchPosting.objects.update(weight=weight)
+
+
+def rebuild_index(chunk_size=1000, progress=None):
+    """Dựng lại toàn bộ chỉ mục theo từng khối sản phẩm, trả về số sản phẩm đã đánh chỉ mục"""
+    from app.models import Product, SearchDocument, SearchPosting
+
+    SearchPosting.objects.all().delete()
+    SearchDocument.objects.all().delete()
+
+    indexed = 0
+    last_id = 0
+    while True:
+        products = list(
+            Product.objects.select_related('brand', 'category')
+            .filter(status=True, id__gt=last_id)
+            .order_by('id')[:chunk_size]
+        )
+        if not products:
+            break
+        documents = []
+        postings = []
+        for product in products:
+            document, product_postings = _postings_for(product)
+            documents.append(document)
+            postings.extend(product_postings)
+        with transaction.atomic():
+            SearchDocument.objects.bulk_create(documents)
+            SearchPosting.objects.bulk_create(postings, batch_size=5000)
+        indexed += len(products)
+        last_id = products[-1].id
+        if progress:
+            progress(indexed)
+
+    # avgdl chỉ biết sau khi dựng xong
+    reweight()
+    cache.delete(STATS_CACHE_KEY)
+    return indexed
+
+
+def get_index_stats():
+    """
+    Số tài liệu và độ dài trung bình. Tính bằng một câu aggregate rồi cache STATS_TIMEOUT giây;
+    trong thời gian đó index_product cộng trừ thẳng vào bản cache (_adjust_stats).
+    """
+    from app.models import SearchDocument
+
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        row = SearchDocument.objects.aggregate(n=Count('pk'), total=Sum('length'))
+        # generation: khóa cache df theo lần tính stats, tính lại (hết hạn / dựng lại chỉ mục) thì df cũng đếm lại
+        stats = _stats(row['n'], row['total'] or 0, time.time(), uuid.uuid4().hex)
+        cache.set(STATS_CACHE_KEY, stats, STATS_TIMEOUT)
+    return stats
+
+
+def _stats(n, total, computed_at, generation):
+    return {
+        'n': n,
+        'total': total,
+        'avgdl': total / n if n else 0.0,
+        'computed_at': computed_at,
+        'generation': generation,
+    }
+
+
+def _adjust_stats(documents, length):
+    """
+    Cộng thay đổi của một lần đánh chỉ mục vào stats đang cache, giữ nguyên thời điểm hết hạn.
+    Hai tiến trình ghi cùng lúc có thể làm mất một lần cộng: lệch nhỏ, hết hạn thì tính lại từ DB.
+    """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None or not (documents or length):
+        return
+    remaining = stats['computed_at'] + STATS_TIMEOUT - time.time()
+    if remaining <= 0:
+        return
+    n = max(stats['n'] + documents, 0)
+    total = max(stats['total'] + length, 0)
+    cache.set(STATS_CACHE_KEY, _stats(n, total, stats['computed_at'], stats['generation']), remaining)
+
+
+def _idf(n, df):
+    return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+
+def _document_frequency(terms, generation):
+    """
+    {từ: số sản phẩm chứa từ}, bỏ các từ không có trong chỉ mục.
+    Cache cùng thế hệ với get_index_stats: đếm từ phổ biến phải duyệt cả danh sách posting của nó.
+    Sản phẩm được đánh lại trong thế hệ đó không cập nhật df (lệch vài đơn vị, tối đa STATS_TIMEOUT giây).
+    """
+    from app.models import SearchPosting
+
+    keys = {term: f'{DF_CACHE_PREFIX}{generation}:{term}' for term in terms}
+    cached = cache.get_many(list(keys.values()))
+    df = {term: cached[key] for term, key in keys.items() if key in cached}
+    missing = [term for term in terms if term not in df]
+    if missing:
+        counted = dict(
+            SearchPosting.objects.filter(term__in=missing).values('term').annotate(df=Count('pk')).values_list('term', 'df')
+        )
+        df.update({term: counted.get(term, 0) for term in missing})
+        cache.set_many({keys[term]: df[term] for term in missing}, STATS_TIMEOUT)
+    return {term: count for term, count in df.items() if count}
+
+
+def _top_postings(term):
+    """[(product_id, weight)] MAX_POSTINGS_PER_TERM posting điểm cao nhất của từ"""
+    from app.models import SearchPosting
+
+    return list(
+        SearchPosting.objects.filter(term=term).order_by('-weight', 'product_id')
+        .values_list('product_id', 'weight')[:MAX_POSTINGS_PER_TERM]
+    )
+
+
+def _score_all_terms(terms, df, idf):
+    """
+    Điểm các sản phẩm chứa đủ mọi từ, trong một query: duyệt posting của từ hiếm nhất theo weight giảm dần,
+    tra weight các từ còn lại theo index (term, product), dừng khi đủ MAX_POSTINGS_PER_TERM sản phẩm.
+    Từ hiếm nhất có không quá MAX_POSTINGS_PER_TERM sản phẩm thì kết quả là chính xác.
+    """
+    from app.models import SearchPosting
+
+    rarest = min(terms, key=df.get)
+    # Từ ít sản phẩm nhất được tra trước, loại ứng viên sớm
+    others = sorted((term for term in terms if term != rarest), key=df.get)
+    rows = SearchPosting.objects.filter(term=rarest)
+    for i, term in enumerate(others):
+        weight = SearchPosting.objects.filter(term=term, product_id=OuterRef('product_id')).values('weight')[:1]
+        rows = rows.annotate(**{f'w{i}': Subquery(weight)}).filter(**{f'w{i}__isnull': False})
+    rows = rows.order_by('-weight', 'product_id').values_list(
+        'product_id', 'weight', *(f'w{i}' for i in range(len(others)))
+    )[:MAX_POSTINGS_PER_TERM]
+    return {
+        product_id: idf[rarest] * weight + sum(idf[term] * w for term, w in zip(others, weights))
+        for product_id, weight, *weights in rows
+    }
+
+
+def search_product_ids(query):
+    """
+    Danh sách product_id khớp với câu tìm kiếm, xếp theo điểm BM25 giảm dần.
+    Ưu tiên sản phẩm chứa đủ mọi từ; không có thì lấy sản phẩm chứa ít nhất một từ.
+    Mỗi từ chỉ xét tối đa MAX_POSTINGS_PER_TERM sản phẩm điểm cao nhất.
+    Trả về None nếu chỉ mục chưa được dựng (view sẽ dùng cách tìm cũ).
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    stats = get_index_stats()
+    if stats['n'] == 0:
+        return None
+
+    df = _document_frequency(terms, stats['generation'])
+    if not df:
+        return []
+    idf = {term: _idf(stats['n'], count) for term, count in df.items()}
+
+    scores = _score_all_terms(terms, df, idf) if len(df) == len(terms) else None
+    if not scores:
+        # Không sản phẩm nào chứa đủ mọi từ: lấy sản phẩm chứa ít nhất một từ
+        scores = {}
+        for term in df:
+            for product_id, weight in _top_postings(term):
+                scores[product_id] = scores.get(product_id, 0.0) + idf[term] * weight
+
+    return [product_id for product_id, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
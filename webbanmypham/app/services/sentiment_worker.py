@@ -0,0 +1,285 @@
+"""
+Worker phân tích cảm xúc chạy nền: gom review vào hàng đợi, chạy model theo micro-batch
+rồi ghi sentiment/confidence_score ngược lại DB
+
+Hàng đợi nằm trong bộ nhớ, review đang chờ khi tiến trình tắt vẫn còn confidence_score = 0
+(model luôn trả về độ tin cậy > 0). Worker khởi động sẽ chấm bù các review này trước, và chỉ
+ghi review còn confidence_score = 0 nên hai tiến trình cùng chấm một review cũng không cộng trùng.
+"""
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import product_rating, review_feed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'AUTOSTART': True,
+    'MAX_BATCH_SIZE': 16,
+    'MAX_WAIT_MS': 50,
+    'QUEUE_SIZE': 1000,
+    'STATS_LOG_EVERY': 100,  # Log histogram sau mỗi N batch
+}
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+def get_config():
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'SENTIMENT_WORKER', {}))
+    return config
+
+
+class Histogram:
+    """Histogram đơn giản theo các mốc cố định (giá trị <= mốc thì rơi vào bucket đó)"""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Bucket cuối = '+Inf'
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={b}" for b in self.buckets] + ['+Inf']
+            return {
+                'count': self.count,
+                'avg': round(self.total / self.count, 2) if self.count else 0,
+                'buckets': dict(zip(labels, self.counts)),
+            }
+
+
+class SentimentWorker:
+
+    def __init__(self, max_batch_size, max_wait_ms, queue_size, stats_log_every):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats_log_every = stats_log_every
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.inference_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.end_to_end_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.batches = 0
+        self._thread = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._thread = threading.Thread(target=self._run, name='sentiment-worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, review_id, text):
+        """Đưa review vào hàng đợi. Trả về False nếu hàng đợi đầy"""
+        try:
+            self.queue.put_nowait((review_id, text, time.monotonic()))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        from app.ai_utils import load_model
+
+        # Tải model ngay khi khởi động để request đầu tiên không phải chờ
+        load_model()
+        logger.info(
+            f"Sentiment worker started (max_batch_size={self.max_batch_size}, "
+            f"max_wait={int(self.max_wait * 1000)}ms)"
+        )
+        try:
+            self.recover_unscored()
+        except Exception as e:
+            logger.error(f"Sentiment worker recovery failed: {e}", exc_info=True)
+        finally:
+            close_old_connections()
+
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.error(f"Sentiment worker batch failed: {e}", exc_info=True)
+            finally:
+                close_old_connections()
+
+    def recover_unscored(self):
+        """Chấm các review chưa có kết quả (còn trong hàng đợi khi tiến trình trước tắt)"""
+        from app.models import Review
+
+        last_id = 0
+        recovered = 0
+        while True:
+            rows = list(
+                Review.objects.filter(id__gt=last_id, confidence_score=0, is_spam=False)
+                .order_by('id')
+                .values_list('id', 'comment')[:self.max_batch_size]
+            )
+            if not rows:
+                break
+            enqueued_at = time.monotonic()
+            recovered += self._process([(review_id, comment, enqueued_at) for review_id, comment in rows], observe=False)
+            last_id = rows[-1][0]
+        if recovered:
+            logger.info(f"Sentiment worker recovered {recovered} unscored reviews")
+        return recovered
+
+    def _process(self, batch, observe=True):
+        from app.ai_utils import analyze_sentiment_batch
+        from app.models import Review
+
+        started = time.monotonic()
+        results = analyze_sentiment_batch([text for _, text, _ in batch])
+        finished = time.monotonic()
+
+        labels = {review_id: result for (review_id, _, _), result in zip(batch, results)}
+        with transaction.atomic():
+            # Review bị đánh dấu spam trong lúc chờ thì giữ nguyên nhãn SPAM; review đã được
+            # tiến trình khác chấm (confidence_score > 0) hoặc đang chấm (đang khóa) thì bỏ qua
+            reviews = list(
+                Review.objects.select_for_update(skip_locked=True)
+                .filter(id__in=labels.keys(), is_spam=False, confidence_score=0)
+                .only('id', 'product_id', 'rating', 'sentiment', 'is_approved', 'is_spam')
+            )
+            deltas = product_rating.RatingDeltas()
+            for review in reviews:
+                deltas.remove(review)
+                review.sentiment, review.confidence_score = labels[review.id]
+                deltas.add(review)
+            Review.objects.bulk_update(reviews, ['sentiment', 'confidence_score'])
+            deltas.apply()
+        review_feed.invalidate_rating_summary(*(review.product_id for review in reviews))
+
+        if not observe:
+            return len(reviews)
+        self.batch_sizes.observe(len(batch))
+        self.inference_ms.observe((finished - started) * 1000)
+        for _, _, enqueued_at in batch:
+            self.end_to_end_ms.observe((time.monotonic() - enqueued_at) * 1000)
+
+        self.batches += 1
+        if self.stats_log_every and self.batches % self.stats_log_every == 0:
+            logger.info(f"Sentiment worker stats: {self.stats()}")
+        return len(reviews)
+
+    def stats(self):
+        return {
+            'running': self.is_running,
+            'queue_size': self.queue.qsize(),
+            'batches': self.batches,
+            'batch_size': self.batch_sizes.snapshot(),
+            'inference_ms': self.inference_ms.snapshot(),
+            'end_to_end_ms': self.end_to_end_ms.snapshot(),
+        }
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+WEB_PROCESS_ENV = 'WEBBANMYPHAM_WEB_PROCESS'
+
+
+def get_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                config = get_config()
+                _worker = SentimentWorker(
+                    max_batch_size=config['MAX_BATCH_SIZE'],
+                    max_wait_ms=config['MAX_WAIT_MS'],
+                    queue_size=config['QUEUE_SIZE'],
+                    stats_log_every=config['STATS_LOG_EVERY'],
+                )
+    return _worker
+
+
+def start_worker():
+    worker = get_worker()
+    worker.start()
+    return worker
+
+
+def should_autostart():
+    """
+    Chỉ tự khởi động worker trong tiến trình phục vụ web
+    (runserver hoặc wsgi/asgi), không chạy khi migrate, shell, test, script, celery...
+    """
+    config = get_config()
+    if not (config['ENABLED'] and config['AUTOSTART']):
+        return False
+    return is_web_process()
+
+
+def is_web_process():
+    """
+    Tiến trình hiện tại có phục vụ request không: runserver, hoặc tiến trình nạp
+    webbanmypham/wsgi.py / asgi.py (hai file này đặt biến môi trường WEB_PROCESS_ENV)
+    """
+    if os.environ.get(WEB_PROCESS_ENV) == '1':
+        return True
+    if os.path.basename(sys.argv[0]) != 'manage.py' or 'runserver' not in sys.argv:
+        return False
+    # Với autoreloader, chỉ tiến trình con (RUN_MAIN) mới phục vụ request
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+
+
+def enqueue_review(review):
+    """
+    Gửi review sang worker để chấm cảm xúc, trả về ngay.
+    Nếu worker bị tắt hoặc hàng đợi đầy thì chấm đồng bộ như cũ.
+    """
+    config = get_config()
+    if config['ENABLED']:
+        worker = start_worker()
+        if worker.submit(review.id, review.comment):
+            return True
+        logger.warning(f"Sentiment queue full, scoring review {review.id} synchronously")
+
+    from app.ai_utils import analyze_sentiment
+    from app.models import Review
+
+    label, score = analyze_sentiment(review.comment)
+    if Review.objects.filter(id=review.id, is_spam=False, confidence_score=0).update(
+        sentiment=label, confidence_score=score
+    ):
+        deltas = product_rating.RatingDeltas()
+        deltas.remove(review)
+        review.sentiment = label
+        deltas.add(review)
+        deltas.apply()
+    review_feed.invalidate_rating_summary(review.product_id)
+    return False
+
+
+def get_stats():
+    return get_worker().stats()
@@ -0,0 +1,271 @@
+"""
+Lọc nhiều tiêu chí (faceted navigation) cho trang /shop/
+
+Tham số trên URL:
+    category : id danh mục, lấy cả các danh mục con (Category.parent)
+    brand    : id thương hiệu, chọn được nhiều (?brand=1&brand=3)
+    price    : khóa khoảng giá trong PRICE_RANGES, chọn được nhiều
+    skin     : giá trị target_skin_type, chọn được nhiều
+    rating   : số sao tối thiểu trong RATING_FILTERS (điểm trung bình lưu sẵn trên Product)
+    deal     : 1 = chỉ sản phẩm đang có deal
+
+Số lượng ở mỗi nhóm tính với mọi bộ lọc trừ bộ lọc của chính nhóm đó (chọn một thương hiệu
+vẫn thấy số lượng của các thương hiệu khác để chọn thêm). Mỗi nhóm là một query GROUP BY
+hoặc một aggregate, nên số query của sidebar cố định, không tăng theo số danh mục.
+"""
+from django.db.models import Case, Count, F, Q, When
+
+from app.models import Category
+
+from . import deal_index
+
+# (khóa trên URL, nhãn, giá từ, giá dưới) - giá tính theo giá đang bán (sale_price nếu có)
+PRICE_RANGES = (
+    ('duoi-200k', 'Dưới 200.000đ', None, 200000),
+    ('200k-500k', '200.000đ - 500.000đ', 200000, 500000),
+    ('500k-1tr', '500.000đ - 1.000.000đ', 500000, 1000000),
+    ('tren-1tr', 'Trên 1.000.000đ', 1000000, None),
+)
+PRICE_RANGE_KEYS = {key for key, *_ in PRICE_RANGES}
+
+# (số sao tối thiểu, nhãn) - chọn một
+RATING_FILTERS = (
+    (4, 'Từ 4 sao'),
+    (3, 'Từ 3 sao'),
+)
+
+
+def with_effective_price(queryset):
+    return queryset.annotate(
+        effective_price=Case(When(sale_price__gt=0, then=F('sale_price')), default=F('price'))
+    )
+
+
+def _price_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(effective_price__gte=low)
+    if high is not None:
+        q &= Q(effective_price__lt=high)
+    return q
+
+
+def _rating_q(stars):
+    return Q(rating_count__gt=0, rating_avg__gte=stars)
+
+
+def _int_list(values):
+    result = []
+    for value in values:
+        try:
+            result.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return result
+
+
+class CategoryTree:
+    """Cây danh mục dựng từ một query (id, parent_id, name)"""
+
+    def __init__(self):
+        rows = list(Category.objects.order_by('name').values_list('id', 'parent_id', 'name'))
+        self.names = {category_id: name for category_id, _, name in rows}
+        self.children = {}
+        for category_id, parent_id, _ in rows:
+            if parent_id not in self.names:
+                parent_id = None
+            self.children.setdefault(parent_id, []).append(category_id)
+
+    def subtree(self, category_id):
+        """category_id và mọi danh mục con cháu"""
+        ids = []
+        stack = [category_id]
+        while stack:
+            current = stack.pop()
+            if current in ids:
+                continue
+            ids.append(current)
+            stack.extend(self.children.get(current, ()))
+        return ids
+
+    def walk(self, parent_id=None, depth=0, seen=None):
+        """Duyệt cây theo thứ tự trước, trả về (category_id, depth)"""
+        seen = set() if seen is None else seen
+        for category_id in self.children.get(parent_id, ()):
+            if category_id in seen:
+                continue
+            seen.add(category_id)
+            yield category_id, depth
+            yield from self.walk(category_id, depth + 1, seen)
+
+
+class ShopFilters:
+    """Bộ lọc đọc từ request.GET"""
+
+    def __init__(self, params):
+        self.params = params
+        self.tree = CategoryTree()
+
+        category_ids = _int_list([params.get('category')])
+        self.category = category_ids[0] if category_ids and category_ids[0] in self.tree.names else None
+        self.brands = _int_list(params.getlist('brand'))
+        self.prices = [key for key in params.getlist('price') if key in PRICE_RANGE_KEYS]
+        self.skins = [value for value in params.getlist('skin') if value]
+        ratings = _int_list([params.get('rating')])
+        self.rating = ratings[0] if ratings and ratings[0] in dict(RATING_FILTERS) else None
+        self.deal = params.get('deal') == '1'
+
+    @property
+    def is_active(self):
+        return bool(self.category or self.brands or self.prices or self.skins or self.rating or self.deal)
+
+    def conditions(self, exclude=None):
+        """Q của mọi bộ lọc đang chọn, bỏ qua nhóm exclude (dùng khi đếm nhóm đó)"""
+        q = Q()
+        if self.category and exclude != 'category':
+            q &= Q(category_id__in=self.tree.subtree(self.category))
+        if self.brands and exclude != 'brand':
+            q &= Q(brand_id__in=self.brands)
+        if self.prices and exclude != 'price':
+            price_q = Q()
+            for key, _, low, high in PRICE_RANGES:
+                if key in self.prices:
+                    price_q |= _price_q(low, high)
+            q &= price_q
+        if self.skins and exclude != 'skin':
+            q &= Q(target_skin_type__in=self.skins)
+        if self.rating and exclude != 'rating':
+            q &= _rating_q(self.rating)
+        if self.deal and exclude != 'deal':
+            q &= Q(id__in=deal_product_ids())
+        return q
+
+    def apply(self, queryset, exclude=None):
+        return with_effective_price(queryset).filter(self.conditions(exclude))
+
+    def url(self, **changes):
+        """Query string sau khi đổi tham số (luôn bỏ page), value None = xóa tham số"""
+        params = self.params.copy()
+        params.pop('page', None)
+        for key, value in changes.items():
+            params.pop(key, None)
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                params.setlist(key, [str(v) for v in value])
+            else:
+                params[key] = str(value)
+        query = params.urlencode()
+        return f'?{query}' if query else '?'
+
+    def toggle_url(self, key, value):
+        """Bật/tắt một giá trị của nhóm chọn nhiều (brand, price, skin)"""
+        value = str(value)
+        values = self.params.getlist(key)
+        values = [v for v in values if v != value] if value in values else values + [value]
+        return self.url(**{key: values or None})
+
+
+def deal_product_ids():
+    return [deal.product_id for deal in deal_index.get_active_deals()]
+
+
+def build_facets(filters, base_queryset):
+    """Dữ liệu sidebar: mỗi nhóm một query GROUP BY / aggregate, không phụ thuộc số danh mục"""
+    tree = filters.tree
+
+    # Danh mục: đếm theo category_id rồi cộng dồn lên danh mục cha
+    direct = dict(
+        filters.apply(base_queryset, exclude='category')
+        .values_list('category_id').annotate(n=Count('id')).order_by()
+    )
+    totals = {}
+    for category_id in tree.names:
+        totals[category_id] = sum(direct.get(child, 0) for child in tree.subtree(category_id))
+    categories = [
+        {
+            'id': category_id,
+            'name': tree.names[category_id],
+            'depth': depth,
+            'count': totals[category_id],
+            'selected': category_id == filters.category,
+            'url': filters.url(category=category_id),
+        }
+        for category_id, depth in tree.walk()
+        if totals[category_id] or category_id == filters.category
+    ]
+
+    brands = [
+        {
+            'id': brand_id,
+            'name': name,
+            'count': n,
+            'selected': brand_id in filters.brands,
+            'url': filters.toggle_url('brand', brand_id),
+        }
+        for brand_id, name, n in (
+            filters.apply(base_queryset, exclude='brand')
+            .filter(brand__isnull=False)
+            .values_list('brand_id', 'brand__name').annotate(n=Count('id'))
+            .order_by('brand__name')
+        )
+    ]
+
+    price_counts = filters.apply(base_queryset, exclude='price').aggregate(**{
+        f'price_{i}': Count('id', filter=_price_q(low, high)) for i, (_, _, low, high) in enumerate(PRICE_RANGES)
+    })
+    prices = [
+        {
+            'key': key,
+            'label': label,
+            'count': price_counts[f'price_{i}'],
+            'selected': key in filters.prices,
+            'url': filters.toggle_url('price', key),
+        }
+        for i, (key, label, _, _) in enumerate(PRICE_RANGES)
+    ]
+
+    skins = [
+        {
+            'value': value,
+            'count': n,
+            'selected': value in filters.skins,
+            'url': filters.toggle_url('skin', value),
+        }
+        for value, n in (
+            filters.apply(base_queryset, exclude='skin')
+            .exclude(target_skin_type='')
+            .values_list('target_skin_type').annotate(n=Count('id'))
+            .order_by('target_skin_type')
+        )
+    ]
+
+    rating_counts = filters.apply(base_queryset, exclude='rating').aggregate(**{
+        f'rating_{stars}': Count('id', filter=_rating_q(stars)) for stars, _ in RATING_FILTERS
+    })
+    ratings = [
+        {
+            'stars': stars,
+            'label': label,
+            'count': rating_counts[f'rating_{stars}'],
+            'selected': stars == filters.rating,
+            'url': filters.url(rating=None if stars == filters.rating else stars),
+        }
+        for stars, label in RATING_FILTERS
+    ]
+
+    deal_ids = deal_product_ids()
+    deal_count = filters.apply(base_queryset, exclude='deal').filter(id__in=deal_ids).count() if deal_ids else 0
+
+    return {
+        'categories': categories,
+        'brands': brands,
+        'prices': prices,
+        'skins': skins,
+        'ratings': ratings,
+        'deal': {
+            'count': deal_count,
+            'selected': filters.deal,
+            'url': filters.url(deal=None if filters.deal else 1),
+        },
+    }
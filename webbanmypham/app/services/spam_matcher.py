@@ -0,0 +1,144 @@
+"""
+Automaton Aho–Corasick để dò nhiều spam keyword trong một lần duyệt comment
+"""
+from collections import deque
+
+
+class KeywordAutomaton:
+    """
+    Trie các keyword (đã lower) + liên kết fail.
+    Thêm/xóa keyword chỉ sửa các node trên đường đi của keyword đó; liên kết fail được dựng lại
+    bằng một lượt BFS khi build() / match lần kế tiếp (không chèn lại toàn bộ keyword).
+    Automaton đang được nhiều thread dùng chung thì không sửa tại chỗ: sửa trên copy(),
+    build() rồi mới thay tham chiếu (xem review_service.refresh_spam_keyword).
+    """
+
+    def __init__(self, keywords=()):
+        self._goto = [{}]       # node -> {ký tự: node con}
+        self._fail = [0]
+        self._output = [None]   # keyword kết thúc đúng tại node
+        self._best = [None]     # keyword nặng nhất kết thúc tại node hoặc chuỗi fail của nó
+        self._patterns = {}     # keyword lower -> (node, item)
+        self._seq = 0
+        self._dead_nodes = 0
+        self._dirty = False
+        self._owned = None      # Bản copy(): các node có bảng con riêng (None: mọi node)
+        for item in keywords:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def add(self, item):
+        """item: dict có 'keyword', 'severity', 'category' (giống get_spam_keywords)"""
+        key = item['keyword'].lower()
+        if not key:
+            return
+        node = 0
+        for ch in key:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._own(node)[ch] = child
+                if self._owned is not None:
+                    self._owned.add(child)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._best.append(None)
+            node = child
+
+        # seq giúp keyword thêm trước thắng khi cùng severity (giữ thứ tự -severity của DB)
+        self._seq += 1
+        self._output[node] = (item['severity'], -self._seq, item)
+        self._patterns[key] = node
+        self._dirty = True
+
+    def _own(self, node):
+        """Bảng con của node, chép riêng trước khi sửa nếu đang dùng chung với bản gốc"""
+        if self._owned is not None and node not in self._owned:
+            self._goto[node] = dict(self._goto[node])
+            self._owned.add(node)
+        return self._goto[node]
+
+    def copy(self):
+        """
+        Bản sao để sửa: chỉ chép các danh sách tham chiếu, bảng con của từng node dùng chung với
+        bản gốc cho tới khi add() phải sửa node đó (copy-on-write), bản gốc không bị đổi
+        """
+        other = KeywordAutomaton.__new__(KeywordAutomaton)
+        other._goto = list(self._goto)
+        other._fail = list(self._fail)
+        other._output = list(self._output)
+        other._best = list(self._best)
+        other._patterns = dict(self._patterns)
+        other._seq = self._seq
+        other._dead_nodes = self._dead_nodes
+        other._dirty = self._dirty
+        other._owned = set()
+        return other
+
+    def _items(self):
+        entries = sorted((self._output[n] for n in self._patterns.values()), key=lambda entry: -entry[1])
+        return [entry[2] for entry in entries]
+
+    def remove(self, keyword):
+        node = self._patterns.pop(keyword.lower(), None)
+        if node is None:
+            return
+        self._output[node] = None
+        self._dead_nodes += len(keyword)
+        self._dirty = True
+
+        # Xóa nhiều thì dựng lại trie cho gọn
+        if self._dead_nodes > len(self._goto) // 2:
+            self.__init__(self._items())
+
+    def build(self):
+        """Dựng liên kết fail ngay (trước khi chia sẻ automaton cho các thread khác)"""
+        if self._dirty:
+            self._build_links()
+        return self
+
+    def _build_links(self):
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._best[child] = self._output[child]
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                state = self._fail[node]
+                while state and ch not in self._goto[state]:
+                    state = self._fail[state]
+                fail = self._goto[state].get(ch, 0)
+                self._fail[child] = fail if fail != child else 0
+                self._best[child] = max(
+                    (entry for entry in (self._output[child], self._best[self._fail[child]]) if entry),
+                    key=lambda entry: entry[:2],
+                    default=None,
+                )
+                queue.append(child)
+        self._dirty = False
+
+    def find_best(self, text):
+        """
+        Duyệt text một lần, trả về item của keyword có severity cao nhất xuất hiện trong text
+        (None nếu không có). text cần được lower() trước.
+        """
+        if self._dirty:
+            self._build_links()
+
+        goto, fail, best_at = self._goto, self._fail, self._best
+        node = 0
+        best = None
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            entry = best_at[node]
+            if entry and (best is None or entry[:2] > best[:2]):
+                best = entry
+        return best[2] if best else None
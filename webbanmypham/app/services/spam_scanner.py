@@ -0,0 +1,79 @@
+"""
+Job quét spam chạy nền: chỉ kiểm tra lại review mới từ mốc lần trước,
+quét lại toàn bộ khi danh sách spam keyword thay đổi
+"""
+import hashlib
+import json
+import logging
+
+from . import product_rating, review_feed
+from .review_service import get_spam_keywords, is_review_spam
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'spam_scanner'
+
+
+def keywords_signature():
+    """Dấu vân tay của danh sách keyword đang bật, đổi khi keyword được thêm/sửa/tắt/xóa"""
+    keywords = sorted(
+        (item['keyword'].lower(), item['severity'], item['category'])
+        for item in get_spam_keywords()
+    )
+    return hashlib.sha256(json.dumps(keywords).encode('utf-8')).hexdigest()
+
+
+def scan_reviews(chunk_size=1000):
+    """
+    Quét các review chưa bị đánh dấu spam theo lô khóa chính, ghi cờ spam bằng bulk_update.
+    Trả về (số review đã quét, số review bị đánh dấu spam)
+    """
+    from app.models import JobWatermark, Review
+
+    watermark, _ = JobWatermark.objects.get_or_create(name=JOB_NAME)
+    signature = keywords_signature()
+    if watermark.signature != signature:
+        # Keyword thay đổi -> quét lại từ đầu; lưu ngay để nếu bị dừng thì chạy tiếp từ giữa chừng
+        logger.info("Spam keywords changed, rescanning all reviews")
+        watermark.signature = signature
+        watermark.last_id = 0
+        watermark.save(update_fields=['signature', 'last_id', 'updated_at'])
+
+    scanned = flagged = 0
+    last_id = watermark.last_id
+    while True:
+        reviews = list(
+            Review.objects.filter(id__gt=last_id, is_spam=False)
+            .order_by('id')
+            .only('id', 'product_id', 'comment', 'rating', 'sentiment', 'is_approved', 'is_spam')[:chunk_size]
+        )
+        if not reviews:
+            break
+
+        spam_reviews = []
+        deltas = product_rating.RatingDeltas()
+        for review in reviews:
+            if not review.comment:
+                continue
+            spam_result = is_review_spam(review.comment, review.rating)
+            if spam_result['is_spam']:
+                deltas.remove(review)
+                review.is_spam = True
+                review.spam_reason = spam_result['reason']
+                review.sentiment = 'SPAM'
+                deltas.add(review)
+                spam_reviews.append(review)
+
+        if spam_reviews:
+            Review.objects.bulk_update(spam_reviews, ['is_spam', 'spam_reason', 'sentiment'])
+            deltas.apply()
+            review_feed.invalidate_rating_summary(*(review.product_id for review in spam_reviews))
+
+        scanned += len(reviews)
+        flagged += len(spam_reviews)
+        last_id = reviews[-1].id
+        JobWatermark.objects.filter(pk=watermark.pk).update(last_id=last_id)
+
+    if scanned:
+        logger.info(f"Spam scan: {scanned} reviews checked, {flagged} flagged")
+    return scanned, flagged
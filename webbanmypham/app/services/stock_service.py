@@ -0,0 +1,201 @@
+"""
+Giữ/trả tồn kho khi đặt hàng và hủy đơn
+
+Mọi thao tác khóa dòng theo cùng một thứ tự (Product theo id -> ProductBatch)
+để các đơn chạy song song không bị deadlock. Suất deal không khóa ở đây mà được giữ trước
+bằng UPDATE có điều kiện (xem deal_quota.claimed_deal_units).
+
+Order.stock_state ghi đơn đang giữ hàng ('reserved') hay đã hoàn kho ('released'). Đơn tạo
+trước khi có cơ chế này để trống: chưa từng trừ kho nên hủy / mở lại không được cộng / trừ kho.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Trạng thái đơn không giữ hàng: hủy hoặc trả hàng thì hàng về kho
+RELEASED_STATUSES = ('cancelled', 'returned')
+
+
+class StockError(Exception):
+    """Không giữ được hàng cho đơn, message hiển thị thẳng cho khách"""
+
+
+class OutOfStockError(StockError):
+    def __init__(self, product_name, requested, available):
+        self.product_name = product_name
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f'"{product_name}" chỉ còn {max(available, 0)} sản phẩm, không đủ {requested} sản phẩm bạn đặt'
+        )
+
+
+class DealSoldOutError(StockError):
+    def __init__(self, deal, deal_id=None):
+        self.deal = deal
+        self.deal_id = deal.id if deal else deal_id
+        title = deal.title if deal else "khuyến mãi"
+        super().__init__(f'Deal "{title}" đã hết suất, vui lòng đặt lại với giá thường')
+
+
+def reserve_stock(order, lines):
+    """
+    Trừ tồn kho cho đơn hàng và tạo OrderItem (bulk_create).
+    lines: list dict {'product_id', 'quantity', 'price', 'deal_id' (tùy chọn)}
+    Lấy hàng theo FEFO (lô hết hạn trước xuất trước). Lô không đủ thì phần còn lại ghi batch=None.
+    Suất deal phải được giữ trước bằng deal_quota.claimed_deal_units, ở đây chỉ ghi deal vào OrderItem.
+    Raise StockError nếu không đủ hàng, ValueError nếu có dòng số lượng <= 0; cả đơn được rollback.
+    """
+    from app.models import Order, OrderItem, Product, ProductBatch
+
+    needed = {}
+    for line in lines:
+        if line['quantity'] <= 0:
+            raise ValueError(f"Số lượng không hợp lệ: {line['quantity']}")
+        needed[line['product_id']] = needed.get(line['product_id'], 0) + line['quantity']
+    product_ids = sorted(needed)
+
+    with transaction.atomic():
+        products = {
+            p.id: p for p in Product.objects.select_for_update().filter(id__in=product_ids).order_by('id')
+        }
+        for product_id in product_ids:
+            product = products.get(product_id)
+            if product is None or not product.status:
+                raise StockError("Có sản phẩm trong đơn không còn kinh doanh")
+            if product.stock_quantity < needed[product_id]:
+                raise OutOfStockError(product.name, needed[product_id], product.stock_quantity)
+
+        batches = {}
+        for batch in ProductBatch.objects.select_for_update().filter(
+            product_id__in=product_ids,
+            quantity__gt=0,
+            expiry_date__gte=timezone.localdate(),
+        ).order_by('product_id', 'expiry_date', 'id'):
+            batches.setdefault(batch.product_id, []).append(batch)
+
+        items = []
+        touched_batches = []
+        for line in lines:
+            product = products[line['product_id']]
+            quantity = line['quantity']
+            deal_id = line.get('deal_id')
+
+            remaining = quantity
+            for batch in batches.get(product.id, []):
+                if remaining == 0:
+                    break
+                take = min(batch.quantity, remaining)
+                if take <= 0:
+                    continue
+                batch.quantity -= take
+                remaining -= take
+                touched_batches.append(batch)
+                items.append(OrderItem(
+                    order=order, product=product, batch=batch, deal_id=deal_id,
+                    product_name=product.name, price=line['price'], quantity=take,
+                ))
+            if remaining:
+                items.append(OrderItem(
+                    order=order, product=product, batch=None, deal_id=deal_id,
+                    product_name=product.name, price=line['price'], quantity=remaining,
+                ))
+
+            product.stock_quantity -= quantity
+            product.sold_quantity += quantity
+
+        ProductBatch.objects.bulk_update(set(touched_batches), ['quantity'])
+        Product.objects.bulk_update(products.values(), ['stock_quantity', 'sold_quantity'])
+        OrderItem.objects.bulk_create(items)
+        order.stock_state = 'reserved'
+        Order.objects.filter(pk=order.pk).update(stock_state='reserved')
+    return items
+
+
+def release_stock(order):
+    """
+    Trả lại hàng (lô, tồn kho, suất deal) của một đơn bị hủy / trả hàng.
+    Chỉ đơn đang giữ hàng (stock_state = 'reserved'); trả về True nếu đã hoàn kho
+    """
+    from app.models import Order, Product, ProductBatch
+    from .deal_quota import release_deal_units
+
+    if order.stock_state != 'reserved':
+        return False
+
+    with transaction.atomic():
+        items = list(order.items.all())
+        product_ids = sorted({item.product_id for item in items if item.product_id})
+        # Khóa sản phẩm trước, cùng thứ tự với reserve_stock
+        list(Product.objects.select_for_update().filter(id__in=product_ids).order_by('id'))
+
+        for item in items:
+            if item.batch_id:
+                ProductBatch.objects.filter(id=item.batch_id).update(quantity=F('quantity') + item.quantity)
+            if item.product_id:
+                Product.objects.filter(id=item.product_id).update(
+                    stock_quantity=F('stock_quantity') + item.quantity,
+                    sold_quantity=F('sold_quantity') - item.quantity,
+                )
+            if item.deal_id:
+                release_deal_units(item.deal_id, item.quantity)
+
+        order.stock_state = 'released'
+        Order.objects.filter(pk=order.pk).update(stock_state='released')
+    return True
+
+
+def restore_reservation(order):
+    """
+    Đơn đã hoàn kho được mở lại (hủy nhầm, khách nhận lại hàng...): trừ kho lại cho các dòng đã có.
+    Lô cũ không còn đủ hàng thì dòng đó ghi batch=None. Suất deal được tính lại mà không kiểm tra
+    giới hạn (giá đã chốt lúc đặt). Raise OutOfStockError nếu tồn kho không đủ; trả về True nếu đã giữ hàng
+    """
+    from app.models import Order, OrderItem, Product, ProductBatch, WeekendDeal
+    from .deal_index import invalidate_deal_index
+
+    if order.stock_state != 'released':
+        return False
+
+    with transaction.atomic():
+        items = list(order.items.all())
+        needed = {}
+        for item in items:
+            if item.product_id:
+                needed[item.product_id] = needed.get(item.product_id, 0) + item.quantity
+
+        products = list(Product.objects.select_for_update().filter(id__in=sorted(needed)).order_by('id'))
+        for product in products:
+            if product.stock_quantity < needed[product.id]:
+                raise OutOfStockError(product.name, needed[product.id], product.stock_quantity)
+            product.stock_quantity -= needed[product.id]
+            product.sold_quantity += needed[product.id]
+        Product.objects.bulk_update(products, ['stock_quantity', 'sold_quantity'])
+
+        moved = []
+        for item in items:
+            if item.batch_id and not ProductBatch.objects.filter(
+                id=item.batch_id, quantity__gte=item.quantity
+            ).update(quantity=F('quantity') - item.quantity):
+                item.batch = None
+                moved.append(item)
+            if item.deal_id:
+                WeekendDeal.objects.filter(id=item.deal_id).update(sold_quantity=F('sold_quantity') + item.quantity)
+        OrderItem.objects.bulk_update(moved, ['batch'])
+
+        order.stock_state = 'reserved'
+        Order.objects.filter(pk=order.pk).update(stock_state='reserved')
+
+    if any(item.deal_id for item in items):
+        invalidate_deal_index()
+    return True
+
+
+def sync_order_stock(order):
+    """
+    Gọi ngay sau khi đổi order_status (trong transaction, order đã select_for_update):
+    hủy / trả hàng thì hoàn kho, mở lại đơn đã hoàn kho thì giữ hàng lại
+    """
+    if order.order_status in RELEASED_STATUSES:
+        return release_stock(order)
+    return restore_reservation(order)
@@ -0,0 +1,317 @@
+"""
+Xếp hạng sản phẩm xu hướng theo tốc độ bán / yêu thích / xem, giảm dần theo thời gian
+
+Điểm của sản phẩm = Σ trọng_số * exp(-λ * (bây_giờ - thời_điểm_sự_kiện)), λ = ln2 / HALF_LIFE_HOURS
+(sự kiện cũ HALF_LIFE_HOURS giờ chỉ còn một nửa giá trị).
+
+Dùng forward decay: thay vì giảm điểm mọi sản phẩm theo thời gian, mỗi sự kiện được cộng
+trọng_số * exp(λ * (thời_điểm - L)) với L là mốc cố định. Mọi điểm cùng bị nhân một hệ số
+exp(-λ * (bây_giờ - L)) nên thứ tự không đổi: cập nhật chỉ là cộng thêm (một câu UPDATE ... CASE),
+không phải tính lại từ lịch sử, và top-K là một lần quét index theo score giảm dần.
+Khi exp(λ * (bây_giờ - L)) quá lớn thì dời mốc L tới hiện tại và nhân mọi điểm với hệ số tương ứng.
+
+Nguồn sự kiện:
+- OrderItem (đơn không bị hủy / trả), Wishlist: job update_trending đọc phần mới theo mốc id
+  (JobWatermark), ghi điểm và mốc trong cùng transaction nên mỗi dòng chỉ được cộng một lần.
+  Đơn đã được cộng mà bị hủy / trả hàng thì order_status_changed trừ lại (mở lại đơn thì cộng lại).
+- Lượt xem: view_counter cộng vào khi flush.
+
+Mọi lần cộng điểm đọc mốc L từ JobWatermark (select_for_update) trong cùng transaction với câu UPDATE,
+nên không chen được vào giữa lúc dời mốc. Cache của L chỉ dùng cho current_score (đọc).
+
+Top-K (TOP_K sản phẩm đang bán có điểm cao nhất) lưu trong cache, job tính lại sau mỗi lần chạy;
+job dừng thì cache hết hạn sau TOP_CACHE_TIMEOUT và trang chủ tự tính lại.
+"""
+import logging
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'HALF_LIFE_HOURS': 72,
+    'TOP_K': 50,
+    'ORDER_WEIGHT': 1.0,       # Mỗi sản phẩm bán ra
+    'WISHLIST_WEIGHT': 0.5,    # Mỗi lượt thêm vào yêu thích
+    'VIEW_WEIGHT': 0.02,       # Mỗi lượt xem
+}
+
+LANDMARK_JOB = 'trending_landmark'
+ORDER_JOB = 'trending_orders'
+WISHLIST_JOB = 'trending_wishlist'
+EXCLUDED_ORDER_STATUSES = ('cancelled', 'returned')
+
+TOP_CACHE_KEY = 'trending_top'
+TOP_CACHE_TIMEOUT = 10 * 60
+LANDMARK_CACHE_KEY = 'trending_landmark'
+LANDMARK_CACHE_TIMEOUT = 5 * 60
+
+# Dời mốc khi exp(λ * (t - L)) vượt e^200 (float tối đa ~e^709)
+MAX_EXPONENT = 200
+
+
+def get_config():
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'TRENDING', {}))
+    return config
+
+
+def decay_rate(config=None):
+    """λ theo giây"""
+    config = config or get_config()
+    return math.log(2) / (config['HALF_LIFE_HOURS'] * 3600)
+
+
+def get_landmark():
+    """Mốc L (giây epoch) từ cache, dùng khi đọc điểm. Lần đầu lấy thời điểm hiện tại"""
+    landmark = cache.get(LANDMARK_CACHE_KEY)
+    if landmark is None:
+        from app.models import JobWatermark
+
+        watermark, _ = JobWatermark.objects.get_or_create(
+            name=LANDMARK_JOB, defaults={'last_id': int(timezone.now().timestamp())}
+        )
+        landmark = watermark.last_id
+        cache.set(LANDMARK_CACHE_KEY, landmark, LANDMARK_CACHE_TIMEOUT)
+    return landmark
+
+
+def _locked_landmark():
+    """
+    Mốc L đọc từ DB và khóa tới hết transaction (gọi trong transaction.atomic), dùng khi cộng điểm:
+    rescale_if_needed không dời mốc được giữa lúc đọc L và lúc UPDATE điểm
+    """
+    from app.models import JobWatermark
+
+    watermark, _ = JobWatermark.objects.select_for_update().get_or_create(
+        name=LANDMARK_JOB, defaults={'last_id': int(timezone.now().timestamp())}
+    )
+    return watermark.last_id
+
+
+def event_weight(weight, when, landmark, rate):
+    """Giá trị forward-decay của một sự kiện xảy ra lúc when (datetime)"""
+    return weight * math.exp(rate * (when.timestamp() - landmark))
+
+
+def current_score(stored_score, now=None, landmark=None, rate=None):
+    """Đổi điểm lưu trữ về điểm tại thời điểm now (đơn vị: số sản phẩm bán tương đương)"""
+    now = now or timezone.now()
+    landmark = get_landmark() if landmark is None else landmark
+    rate = decay_rate() if rate is None else rate
+    return stored_score * math.exp(-rate * (now.timestamp() - landmark))
+
+
+def _update_scores(deltas):
+    from app.models import ProductTrendScore
+
+    return ProductTrendScore.objects.filter(product_id__in=deltas.keys()).update(
+        score=F('score') + Case(
+            *[When(product_id=product_id, then=Value(value)) for product_id, value in deltas.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
+
+
+def add_scores(deltas):
+    """
+    Cộng {product_id: giá trị forward-decay} vào bảng điểm bằng một câu UPDATE ... CASE.
+    Sản phẩm chưa có dòng điểm thì tạo dòng 0 (bỏ qua sản phẩm đã bị xóa) rồi cộng tiếp.
+    """
+    from app.models import Product, ProductTrendScore
+
+    deltas = {product_id: value for product_id, value in deltas.items() if value}
+    if not deltas:
+        return 0
+    updated = _update_scores(deltas)
+    if updated == len(deltas):
+        return updated
+
+    existing = set(ProductTrendScore.objects.filter(product_id__in=deltas.keys()).values_list('product_id', flat=True))
+    missing = set(Product.objects.filter(id__in=set(deltas) - existing).values_list('id', flat=True))
+    if missing:
+        # ignore_conflicts: tiến trình khác vừa tạo dòng thì UPDATE bên dưới vẫn cộng đúng
+        ProductTrendScore.objects.bulk_create(
+            [ProductTrendScore(product_id=product_id) for product_id in missing], ignore_conflicts=True
+        )
+        updated += _update_scores({product_id: deltas[product_id] for product_id in missing})
+    return updated
+
+
+def record_views(view_counts, when=None):
+    """Cộng lượt xem (view_counter gọi sau khi ghi Product.views)"""
+    config = get_config()
+    rate = decay_rate(config)
+    with transaction.atomic():
+        factor = event_weight(config['VIEW_WEIGHT'], when or timezone.now(), _locked_landmark(), rate)
+        return add_scores({product_id: count * factor for product_id, count in view_counts.items()})
+
+
+def _order_rows(last_id, limit):
+    from app.models import OrderItem
+
+    rows = (
+        OrderItem.objects.filter(id__gt=last_id)
+        .order_by('id')
+        .values_list('id', 'product_id', 'quantity', 'order__created_at', 'order__order_status')[:limit]
+    )
+    return [
+        (row_id, product_id if status not in EXCLUDED_ORDER_STATUSES else None, quantity, created_at)
+        for row_id, product_id, quantity, created_at, status in rows
+    ]
+
+
+def _wishlist_rows(last_id, limit):
+    from app.models import Wishlist
+
+    rows = (
+        Wishlist.objects.filter(id__gt=last_id)
+        .order_by('id')
+        .values_list('id', 'product_id', 'created_at')[:limit]
+    )
+    return [(row_id, product_id, 1, created_at) for row_id, product_id, created_at in rows]
+
+
+# (tên mốc job, khóa trọng số trong config, hàm đọc dòng mới)
+SOURCES = (
+    (ORDER_JOB, 'ORDER_WEIGHT', _order_rows),
+    (WISHLIST_JOB, 'WISHLIST_WEIGHT', _wishlist_rows),
+)
+
+
+def _consume(job_name, weight, rows_for, chunk_size):
+    """
+    Đọc các dòng mới sau mốc job_name, cộng điểm và dời mốc trong cùng transaction.
+    Mốc được khóa (select_for_update) nên hai job chạy trùng cũng không cộng một dòng hai lần.
+    """
+    from app.models import JobWatermark
+
+    rate = decay_rate()
+    JobWatermark.objects.get_or_create(name=job_name)
+    consumed = 0
+    while True:
+        with transaction.atomic():
+            watermark = JobWatermark.objects.select_for_update().get(name=job_name)
+            rows = rows_for(watermark.last_id, chunk_size)
+            if not rows:
+                break
+            landmark = _locked_landmark()
+            deltas = defaultdict(float)
+            for _, product_id, amount, when in rows:
+                if product_id is not None:
+                    deltas[product_id] += event_weight(weight * amount, when, landmark, rate)
+            add_scores(deltas)
+            JobWatermark.objects.filter(pk=watermark.pk).update(last_id=rows[-1][0])
+        consumed += len(rows)
+    return consumed
+
+
+def order_status_changed(order, previous_status):
+    """
+    Gọi trong transaction đổi order_status, trước khi hoàn kho / giữ hàng lại (khóa mốc job trước
+    khóa sản phẩm, cùng thứ tự với job). Đơn chuyển sang hủy / trả hàng thì trừ phần điểm job đã cộng
+    cho các dòng của đơn, mở lại thì cộng lại. Dòng job chưa đọc thì bỏ qua: mốc job đang bị khóa
+    nên job chỉ đọc dòng đó sau khi transaction này commit, với trạng thái mới.
+    Trả về số dòng đã điều chỉnh
+    """
+    from app.models import JobWatermark
+
+    was_counted = previous_status not in EXCLUDED_ORDER_STATUSES
+    counted = order.order_status not in EXCLUDED_ORDER_STATUSES
+    if was_counted == counted:
+        return 0
+
+    weight = get_config()['ORDER_WEIGHT'] * (1 if counted else -1)
+    rate = decay_rate()
+    with transaction.atomic():
+        watermark = JobWatermark.objects.select_for_update().filter(name=ORDER_JOB).first()
+        if watermark is None:
+            return 0
+        rows = list(
+            order.items.filter(id__lte=watermark.last_id, product__isnull=False)
+            .values_list('product_id', 'quantity')
+        )
+        if not rows:
+            return 0
+        landmark = _locked_landmark()
+        deltas = defaultdict(float)
+        for product_id, quantity in rows:
+            deltas[product_id] += event_weight(weight * quantity, order.created_at, landmark, rate)
+        add_scores(deltas)
+    return len(rows)
+
+
+def rescale_if_needed(now=None):
+    """Dời mốc L tới now khi hệ số forward-decay quá lớn. Trả về True nếu đã dời"""
+    from app.models import JobWatermark, ProductTrendScore
+
+    now = now or timezone.now()
+    rate = decay_rate()
+    with transaction.atomic():
+        watermark, _ = JobWatermark.objects.select_for_update().get_or_create(
+            name=LANDMARK_JOB, defaults={'last_id': int(now.timestamp())}
+        )
+        shift = int(now.timestamp()) - watermark.last_id
+        if rate * shift < MAX_EXPONENT:
+            return False
+        ProductTrendScore.objects.update(score=F('score') * math.exp(-rate * shift))
+        watermark.last_id += shift
+        watermark.save(update_fields=['last_id', 'updated_at'])
+    cache.set(LANDMARK_CACHE_KEY, watermark.last_id, LANDMARK_CACHE_TIMEOUT)
+    logger.info(f"Trending landmark moved forward {shift}s")
+    return True
+
+
+def refresh_top():
+    """Tính lại danh sách TOP_K product_id đang bán có điểm cao nhất (quét index score)"""
+    from app.models import ProductTrendScore
+
+    ids = list(
+        ProductTrendScore.objects.filter(product__status=True, score__gt=0)
+        .order_by('-score', 'product_id')
+        .values_list('product_id', flat=True)[:get_config()['TOP_K']]
+    )
+    cache.set(TOP_CACHE_KEY, ids, TOP_CACHE_TIMEOUT)
+    return ids
+
+
+def top_product_ids(limit=None):
+    """Product_id xu hướng theo thứ tự, đọc từ danh sách tính sẵn"""
+    ids = cache.get(TOP_CACHE_KEY)
+    if ids is None:
+        ids = refresh_top()
+    return ids[:limit] if limit else ids
+
+
+def update(chunk_size=5000):
+    """Cộng điểm cho đơn hàng / yêu thích mới kể từ lần chạy trước rồi tính lại top-K"""
+    rescale_if_needed()
+    config = get_config()
+    consumed = {
+        job_name: _consume(job_name, config[weight_key], rows_for, chunk_size)
+        for job_name, weight_key, rows_for in SOURCES
+    }
+    refresh_top()
+    return consumed
+
+
+def rebuild(chunk_size=5000):
+    """
+    Tính lại toàn bộ điểm từ lịch sử đơn hàng / yêu thích (lần đầu triển khai hoặc khi đổi
+    trọng số / chu kỳ bán rã). Lượt xem không có lịch sử theo thời gian nên bị bỏ.
+    """
+    from app.models import JobWatermark, ProductTrendScore
+
+    with transaction.atomic():
+        ProductTrendScore.objects.all().delete()
+        JobWatermark.objects.filter(name__in=[job_name for job_name, _, _ in SOURCES]).delete()
+        JobWatermark.objects.filter(name=LANDMARK_JOB).update(last_id=int(timezone.now().timestamp()))
+    cache.delete_many([LANDMARK_CACHE_KEY, TOP_CACHE_KEY])
+    return update(chunk_size=chunk_size)
@@ -0,0 +1,122 @@
+"""
+Đếm lượt xem sản phẩm (Product.views) qua bộ đệm trong tiến trình
+
+Mỗi lượt xem chỉ cộng vào dict trong bộ nhớ, không UPDATE dòng sản phẩm ngay (sản phẩm hot
+sẽ bị khóa dòng liên tục). Sau mỗi FLUSH_INTERVAL giây, request đầu tiên vượt mốc sẽ ghi toàn
+bộ phần cộng dồn bằng một câu:
+
+    UPDATE app_product SET views = views + CASE id WHEN 1 THEN 12 WHEN 7 THEN 3 ... END
+    WHERE id IN (1, 7, ...)
+
+- Phần lượt xem vừa ghi cũng được cộng vào điểm xu hướng (services/trending).
+- Tiến trình web tắt bình thường thì flush nốt phần còn lại (atexit, đăng ký trong apps.py).
+- Tiến trình con sinh ra bằng fork (gunicorn --preload...) bỏ bộ đệm thừa hưởng từ tiến trình
+  cha, nên cùng một lượt xem không bị hai tiến trình cùng ghi.
+- Phần đang ghi được tách khỏi bộ đệm trước khi UPDATE; câu UPDATE lỗi (không được áp dụng)
+  thì cộng trả lại để lần sau ghi tiếp. Tiến trình chết đột ngột chỉ làm mất vài giây lượt xem,
+  không bao giờ đếm trùng.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import trending
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'FLUSH_INTERVAL': 10,    # Giây giữa hai lần ghi
+    'MAX_PRODUCTS': 500,     # Số sản phẩm khác nhau trong bộ đệm tối đa trước khi ghi sớm
+}
+
+_pending = Counter()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_next_flush = 0.0
+
+
+def get_config():
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'VIEW_COUNTER', {}))
+    return config
+
+
+def record_view(product_id):
+    """Ghi nhận một lượt xem, ghi xuống DB nếu đã tới hạn flush"""
+    global _next_flush
+
+    config = get_config()
+    if not config['ENABLED']:
+        return
+    now = time.monotonic()
+    with _lock:
+        _pending[product_id] += 1
+        due = now >= _next_flush or len(_pending) >= config['MAX_PRODUCTS']
+        if due:
+            _next_flush = now + config['FLUSH_INTERVAL']
+    if due:
+        flush()
+
+
+def pending_views():
+    with _lock:
+        return dict(_pending)
+
+
+def flush():
+    """Ghi phần lượt xem đang đệm bằng một câu UPDATE. Trả về số sản phẩm đã cập nhật"""
+    from app.models import Product
+
+    # Một luồng ghi tại một thời điểm, các request khác không phải chờ
+    if not _flush_lock.acquire(blocking=False):
+        return 0
+    try:
+        with _lock:
+            batch = dict(_pending)
+            _pending.clear()
+        if not batch:
+            return 0
+
+        try:
+            Product.objects.filter(id__in=batch.keys()).update(
+                views=F('views') + Case(
+                    *[When(id=product_id, then=Value(count)) for product_id, count in batch.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+        except DatabaseError as e:
+            # Câu UPDATE không được áp dụng -> trả lại bộ đệm để lần sau ghi
+            logger.warning(f"View counter flush failed, keeping {len(batch)} products for retry: {e}")
+            with _lock:
+                _pending.update(batch)
+            return 0
+
+        try:
+            trending.record_views(batch)
+        except DatabaseError as e:
+            logger.warning(f"Trending score update from views failed: {e}")
+        return len(batch)
+    finally:
+        _flush_lock.release()
+
+
+def _reset_after_fork():
+    global _lock, _flush_lock, _next_flush
+
+    # Bộ đệm thuộc về tiến trình cha, tiến trình con không được ghi lại lần nữa
+    _pending.clear()
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _next_flush = 0.0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
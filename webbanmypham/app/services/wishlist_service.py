@@ -0,0 +1,36 @@
+"""
+Tập product_id yêu thích của từng user, cache lại để header/trang danh sách sản phẩm
+không phải query Wishlist mỗi lần render. Các view thêm/xóa yêu thích cập nhật tập này.
+"""
+from django.core.cache import cache
+
+WISHLIST_IDS_TIMEOUT = 60 * 60 * 24
+
+
+def _cache_key(user_id):
+    return f'wishlist_ids:{user_id}'
+
+
+def get_wishlist_ids(user):
+    """frozenset product_id user đã thích (rỗng nếu chưa đăng nhập)"""
+    if not user.is_authenticated:
+        return frozenset()
+
+    ids = cache.get(_cache_key(user.id))
+    if ids is None:
+        from app.models import Wishlist
+        ids = frozenset(Wishlist.objects.filter(user=user).values_list('product_id', flat=True))
+        cache.set(_cache_key(user.id), ids, WISHLIST_IDS_TIMEOUT)
+    return ids
+
+
+def add_wishlist_id(user, product_id):
+    ids = get_wishlist_ids(user) | {product_id}
+    cache.set(_cache_key(user.id), ids, WISHLIST_IDS_TIMEOUT)
+    return ids
+
+
+def remove_wishlist_id(user, product_id):
+    ids = get_wishlist_ids(user) - {product_id}
+    cache.set(_cache_key(user.id), ids, WISHLIST_IDS_TIMEOUT)
+    return ids
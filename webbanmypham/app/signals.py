@@ -0,0 +1,76 @@
+"""
+- Đổi thế hệ cache danh mục (services/catalog_cache) khi dữ liệu hiển thị trên thẻ sản phẩm đổi
+- Trừ phần đóng góp của review bị xóa khỏi điểm đánh giá lưu sẵn trên Product (services/product_rating)
+- Đánh chỉ mục tìm kiếm lại sản phẩm được lưu, sản phẩm của danh mục / thương hiệu bị đổi tên hoặc xóa
+  (services/search_index), sau khi transaction commit
+- Ghi sản phẩm được lưu / xóa vào delta log gợi ý tìm kiếm (services/autocomplete)
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Brand, Category, Product, Review, WeekendDeal
+from .services import autocomplete, product_rating, search_index
+from .services.catalog_cache import bump_generation
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=WeekendDeal)
+def catalog_changed(sender, **kwargs):
+    bump_generation()
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    product_rating.review_deleted(instance)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    # Lưu chỉ tồn kho / lượt xem... (update_fields) thì chỉ mục không đổi
+    if update_fields is None or not search_index.INDEXED_FIELDS.isdisjoint(update_fields):
+        transaction.on_commit(lambda: search_index.index_product(instance), robust=True)
+    if update_fields is None or not autocomplete.INDEXED_FIELDS.isdisjoint(update_fields):
+        transaction.on_commit(lambda: autocomplete.update_product(instance), robust=True)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.remove_product(product_id), robust=True)
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Brand)
+def remember_name(sender, instance, **kwargs):
+    instance._indexed_name = (
+        sender.objects.filter(pk=instance.pk).values_list('name', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def group_renamed(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_indexed_name', instance.name) == instance.name:
+        return
+    field = 'brand' if sender is Brand else 'category'
+    product_ids = list(Product.objects.filter(**{field: instance.pk}).values_list('id', flat=True))
+    transaction.on_commit(lambda: search_index.index_products(product_ids), robust=True)
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Brand)
+def group_deleting(sender, instance, **kwargs):
+    # Sau khi xóa, sản phẩm bị SET_NULL nên phải lấy danh sách trước
+    field = 'brand' if sender is Brand else 'category'
+    instance._indexed_product_ids = list(Product.objects.filter(**{field: instance.pk}).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+def group_deleted(sender, instance, **kwargs):
+    product_ids = getattr(instance, '_indexed_product_ids', [])
+    if product_ids:
+        transaction.on_commit(lambda: search_index.index_products(product_ids), robust=True)
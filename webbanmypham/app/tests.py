@@ -1,3 +1,1892 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncDay
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Brand, Category, CustomerProfile, DailySalesRollup, JobWatermark, Order, OrderItem, Product, ProductBatch,
+    ProductRecommendation, ProductTrendScore, Review, SearchDocument, SpamKeyword, UserRecommendation, WeekendDeal,
+    Wishlist,
+)
+from .services import (
+    autocomplete, cart_store, cursor_pagination, deal_index, product_rating, recommender, review_feed,
+    review_service, sales_rollup, search_index, sentiment_worker, shop_facets, spam_scanner, trending, view_counter,
+)
+from .services.deal_quota import claim_deal_units, claimed_deal_units, has_quota_left, release_deal_units
+from .services.inventory_service import LOW_STOCK_THRESHOLD
+from .services.spam_matcher import KeywordAutomaton
+from .services.stock_service import DealSoldOutError, StockError, release_stock, reserve_stock, sync_order_stock
+
+
+class HomeQueryCountTests(TestCase):
+    """Trang chủ khi đã đăng nhập: context processor giỏ hàng / yêu thích không được tốn thêm query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='khach', password='matkhau123')
+        CustomerProfile.objects.create(user=cls.user, fullname='Khách hàng')
+        category = Category.objects.create(name='Chăm sóc da', slug='cham-soc-da')
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f'Sản phẩm {i}',
+                sku=f'SP-{i}',
+                price=100000,
+                sale_price=80000 if i % 2 else 0,
+                image='products/default_product.jpg',
+                stock_quantity=10,
+            )
+            for i in range(6)
+        ]
+        Wishlist.objects.create(user=cls.user, product=cls.products[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_home_query_count(self):
+        # Lần đầu dựng cache (chỉ mục deal, tập yêu thích), các lần sau là trạng thái ổn định
+        self.client.get(reverse('home'))
+
+        # session, user, profile, gợi ý "Dành cho bạn" (khối sản phẩm lấy từ cache)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('home'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.products[0].id, response.context['wishlist_product_ids'])
+        self.assertEqual(response.context['wishlist_count'], 1)
+
+    def test_wishlist_toggle_updates_cached_ids(self):
+        self.client.get(reverse('home'))
+
+        response = self.client.get(reverse('toggle_wishlist_ajax', args=[self.products[1].id]))
+        self.assertEqual(response.json()['wishlist_count'], 2)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('home'))
+        self.assertIn(self.products[1].id, response.context['wishlist_product_ids'])
+        self.assertEqual(response.context['wishlist_count'], 2)
+
+
+class CatalogFragmentCacheTests(TestCase):
+    """Khối sản phẩm trang chủ / shop cache dùng chung, nút yêu thích điền theo từng user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Trang điểm', slug='trang-diem')
+        cls.product = Product.objects.create(
+            category=category,
+            name='Son kem lì',
+            sku='SON-1',
+            price=250000,
+            image='products/default_product.jpg',
+            stock_quantity=10,
+        )
+        cls.fan = User.objects.create_user(username='fan', password='matkhau123')
+        cls.other = User.objects.create_user(username='other', password='matkhau123')
+        Wishlist.objects.create(user=cls.fan, product=cls.product)
+
+    def setUp(self):
+        cache.clear()
+
+    def heart(self, response):
+        html = response.content.decode()
+        start = html.index(f'toggleWishlist(event, {self.product.id})')
+        return html[start:html.index('fa-heart', start)]
+
+    def test_wishlist_hearts_stitched_per_user(self):
+        for url in (reverse('home'), reverse('shop')):
+            with self.subTest(url=url):
+                self.client.force_login(self.fan)
+                self.assertIn('fas', self.heart(self.client.get(url)))
+
+                # Người dùng khác đọc cùng khối cache nhưng không thấy trái tim của fan
+                self.client.force_login(self.other)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                # Ngoài khối cache chỉ còn query gợi ý "Dành cho bạn" của riêng người dùng
+                self.assertFalse([
+                    q['sql'] for q in queries if 'app_product' in q['sql'] and 'app_userrecommendation' not in q['sql']
+                ])
+                self.assertIn('far', self.heart(response))
+                self.assertNotIn('<!--wishlist:', response.content.decode())
+
+    def test_product_save_refreshes_fragment(self):
+        self.client.get(reverse('shop'))
+
+        self.product.name = 'Son kem lì bản mới'
+        self.product.save()
+
+        self.assertContains(self.client.get(reverse('shop')), 'Son kem lì bản mới')
+
+
+class SalesRollupTests(TestCase):
+    """Bảng tổng hợp theo ngày: đơn mới chỉ ghi lại dòng tổng shop và sản phẩm trong đơn"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Sữa rửa mặt', slug='sua-rua-mat')
+        cls.foam, cls.gel = [
+            Product.objects.create(
+                category=category,
+                name=f'Sữa rửa mặt {i}',
+                sku=f'SRM-{i}',
+                price=100000,
+                image='products/default_product.jpg',
+                stock_quantity=50,
+            )
+            for i in range(2)
+        ]
+
+    def order(self, lines, paid=True):
+        order = Order.objects.create(
+            order_code=f'SR{Order.objects.count()}',
+            fullname='Khách',
+            phone='0900000000',
+            address='Hà Nội',
+            total_money=0,
+            final_money=sum(price * quantity for _, quantity, price in lines),
+            payment_status=paid,
+            order_status='confirmed' if paid else 'pending',
+        )
+        for product, quantity, price in lines:
+            OrderItem.objects.create(order=order, product=product, product_name=product.name, quantity=quantity, price=price)
+        return order
+
+    def rows(self):
+        return {row.product_id: row for row in DailySalesRollup.objects.all()}
+
+    def test_order_refresh_touches_only_its_products(self):
+        self.order([(self.foam, 1, 90000), (self.gel, 1, 80000)])
+        today = timezone.localdate()
+        sales_rollup.refresh_day(today)
+        gel_row = self.rows()[self.gel.id]
+
+        order = self.order([(self.foam, 3, 90000)])
+        with self.captureOnCommitCallbacks(execute=True):
+            sales_rollup.refresh_order_rollup(order)
+
+        rows = self.rows()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[None].order_count, 2)
+        self.assertEqual(rows[None].units_sold, 5)
+        self.assertEqual(rows[self.foam.id].units_sold, 4)
+        # Doanh thu sản phẩm = Σ price * quantity
+        self.assertEqual(rows[self.foam.id].revenue, 4 * 90000)
+        self.assertEqual(rows[self.gel.id].pk, gel_row.pk)
+
+        # Kết quả cộng dồn khớp với tính lại cả ngày
+        sales_rollup.refresh_day(today)
+        rebuilt = self.rows()
+        for product_id, row in rows.items():
+            self.assertEqual((row.revenue, row.units_sold, row.order_count),
+                             (rebuilt[product_id].revenue, rebuilt[product_id].units_sold, rebuilt[product_id].order_count))
+
+        top = list(sales_rollup.top_products(today, today + timedelta(days=1)))
+        self.assertEqual(top[0]['total_revenue'], 4 * 90000)
+
+    def test_refresh_failure_does_not_break_request(self):
+        order = self.order([(self.gel, 1, 80000)])
+        with patch('app.services.sales_rollup.refresh_day', side_effect=DatabaseError('deadlock')):
+            with self.captureOnCommitCallbacks(execute=True):
+                sales_rollup.refresh_order_rollup(order)
+        self.assertFalse(DailySalesRollup.objects.exists())
+
+    def test_dashboard_month_matches_quarter_and_year_rollup(self):
+        # Tháng: GROUP BY theo ngày trên Order; quý/năm: đọc bảng tổng hợp. Hai đường phải ra cùng số
+        year = timezone.localdate().year - 1
+        placed = [
+            (self.order([(self.foam, 2, 90000)]), datetime(year, 3, 5, 9)),
+            (self.order([(self.gel, 1, 80000)]), datetime(year, 3, 5, 23, 30)),
+            (self.order([(self.foam, 1, 90000)], paid=False), datetime(year, 3, 20, 10)),
+            (self.order([(self.gel, 3, 80000)]), datetime(year, 3, 31, 23, 59)),
+            (self.order([(self.foam, 1, 70000)]), datetime(year, 4, 1, 0, 1)),
+        ]
+        for order, created_at in placed:
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(created_at))
+        sales_rollup.rebuild_range(date(year, 1, 1), date(year, 12, 31))
+
+        admin = User.objects.create_superuser(username='quantridoanhso', password='matkhau123')
+        self.client.force_login(admin)
+        url = reverse('admin_dashboard')
+
+        def dashboard(**params):
+            context = self.client.get(url, {'year': year, **params}).context
+            return context['total_revenue'], context['period_order_count'], json.loads(context['chart_revenue'])
+
+        month_revenue, month_orders, month_chart = dashboard(filter='month', month=3)
+        self.assertEqual((month_revenue, month_orders), (180000 + 80000 + 240000, 4))
+        self.assertEqual(len(month_chart), 31)
+        # Doanh thu rơi đúng ngày theo giờ địa phương, đơn chưa thanh toán không vào biểu đồ
+        self.assertEqual((month_chart[4], month_chart[19], month_chart[30]), (260000, 0, 240000))
+        self.assertEqual(sum(month_chart), month_revenue)
+
+        quarter_revenue, quarter_orders, quarter_chart = dashboard(filter='quarter', quarter=1)
+        self.assertEqual((quarter_revenue, quarter_orders), (month_revenue, month_orders))
+        self.assertEqual(quarter_chart, [0, 0, sum(month_chart)])
+
+        year_revenue, year_orders, year_chart = dashboard(filter='year')
+        self.assertEqual((year_revenue, year_orders), (month_revenue + 70000, month_orders + 1))
+        self.assertEqual(year_chart[2:4], [sum(month_chart), 70000])
+        self.assertEqual(sum(year_chart), year_revenue)
+
+
+class CartTests(TestCase):
+    """Thêm vào giỏ, gộp giỏ khách khi đăng nhập và mua lại đơn cũ"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Kem chống nắng', slug='kem-chong-nang')
+        cls.sunscreen, cls.toner, cls.retired = [
+            Product.objects.create(
+                category=category,
+                name=name,
+                sku=f'KCN-{i}',
+                price=100000,
+                image='products/default_product.jpg',
+                stock_quantity=5,
+            )
+            for i, name in enumerate(('Kem chống nắng', 'Nước hoa hồng', 'Sữa dưỡng cũ'))
+        ]
+        cls.user = User.objects.create_user(username='nguoimua', password='matkhau123')
+        CustomerProfile.objects.create(user=cls.user, fullname='Người mua')
+
+    def setUp(self):
+        cache.clear()
+
+    def lines(self):
+        return {
+            int(product_id): line['quantity']
+            for product_id, line in self.client.session.get(settings.CART_SESSION_ID, {}).items()
+        }
+
+    def add(self, product, quantity):
+        return self.client.get(reverse('add_to_cart', args=[product.id]), {'quantity': quantity})
+
+    def test_add_accumulates_and_rejects_over_stock(self):
+        self.add(self.sunscreen, 2)
+        self.add(self.sunscreen, 2)
+        self.assertEqual(self.lines(), {self.sunscreen.id: 4})
+
+        # Vượt tồn kho thì báo lỗi, giỏ giữ nguyên
+        response = self.add(self.sunscreen, 2)
+        self.assertEqual(self.lines(), {self.sunscreen.id: 4})
+        self.assertEqual([m.level_tag for m in response.wsgi_request._messages], ['error'])
+
+        Product.objects.filter(id=self.toner.id).update(status=False)
+        self.add(self.toner, 1)
+        self.assertEqual(self.lines(), {self.sunscreen.id: 4})
+
+        response = self.client.get(reverse('add_to_cart_ajax', args=[self.sunscreen.id]), {'quantity': 1})
+        self.assertEqual(response.json()['cart_count'], 5)
+        self.assertEqual(Decimal(response.json()['cart_total']), 500000)
+
+    def test_login_merges_guest_cart_clamped_to_stock(self):
+        self.add(self.sunscreen, 4)
+        self.add(self.toner, 2)
+        # Tồn kho giảm trong lúc khách chưa đăng nhập
+        Product.objects.filter(id=self.sunscreen.id).update(stock_quantity=3)
+        Product.objects.filter(id=self.toner.id).update(stock_quantity=0)
+
+        self.client.post(reverse('login'), {'username': 'nguoimua', 'password': 'matkhau123'})
+
+        self.assertEqual(self.lines(), {self.sunscreen.id: 3})
+
+    def test_reorder_skips_unavailable_products(self):
+        self.client.force_login(self.user)
+        order = Order.objects.create(
+            user=self.user, order_code='MUALAI1', fullname='Người mua', phone='0900000000', address='Hà Nội',
+            total_money=0, final_money=0, order_status='delivered',
+        )
+        for product, quantity in ((self.sunscreen, 2), (self.toner, 9), (self.retired, 1), (None, 1)):
+            OrderItem.objects.create(
+                order=order, product=product, product_name=product.name if product else 'Đã xóa',
+                quantity=quantity, price=100000,
+            )
+        Product.objects.filter(id=self.retired.id).update(status=False)
+        self.add(self.sunscreen, 1)
+
+        response = self.client.post(reverse('reorder', args=[order.id]))
+
+        self.assertRedirects(response, reverse('cart_detail'), fetch_redirect_response=False)
+        # Cộng thêm vào dòng sẵn có; thiếu hàng / ngừng bán thì bỏ qua, dòng đã xóa sản phẩm không tính
+        self.assertEqual(self.lines(), {self.sunscreen.id: 3})
+        warnings = [str(m) for m in response.wsgi_request._messages if m.level_tag == 'warning']
+        self.assertEqual(len(warnings), 2)
+
+
+    def test_cart_page_builds_lines_once_per_request(self):
+        self.client.force_login(self.user)
+        for product in (self.sunscreen, self.toner, self.retired):
+            self.add(product, 1)
+        self.retired.delete()
+
+        # Header, bảng giỏ hàng và context processor wishlist dùng chung kết quả: mỗi bảng chỉ query một lần
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart_detail'))
+        tables = [query['sql'].split(' FROM ', 1)[1].split()[0] for query in queries.captured_queries]
+        self.assertEqual(tables.count('"app_product"'), 1)
+        self.assertEqual(tables.count('"app_wishlist"'), 1)
+
+        cart = response.context['cart']
+        items = cart.get_items()
+        self.assertIs(cart.get_items(), items)
+        # Dòng của sản phẩm đã xóa bị bỏ qua, không hiển thị thiếu product
+        self.assertEqual([item.product.id for item in items], [self.sunscreen.id, self.toner.id])
+        self.assertEqual(items[0].total_price, items[0].price * items[0].quantity)
+
+        # Sửa giỏ thì bỏ kết quả cũ
+        cart.add(self.toner, 1)
+        self.assertIsNot(cart.get_items(), items)
+        self.assertEqual({item.product.id: item.quantity for item in cart}, {self.sunscreen.id: 1, self.toner.id: 2})
+
+
+class CartStoreTestsMixin:
+    """Cùng một kịch bản cho mọi nơi lưu giỏ hàng (settings.CART_STORAGE)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Tẩy trang', slug='tay-trang')
+        cls.water, cls.oil = [
+            Product.objects.create(
+                category=category,
+                name=name,
+                sku=f'TT-{i}',
+                price=price,
+                image='products/default_product.jpg',
+                stock_quantity=10,
+            )
+            for i, (name, price) in enumerate((('Nước tẩy trang', 120000), ('Dầu tẩy trang', 300000)))
+        ]
+        cls.user = User.objects.create_user(username='chugio', password='matkhau123')
+        CustomerProfile.objects.create(user=cls.user, fullname='Chủ giỏ')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add(self, product, quantity):
+        return self.client.get(reverse('add_to_cart_ajax', args=[product.id]), {'quantity': quantity}).json()
+
+    def checkout(self):
+        return self.client.post(reverse('checkout'), {
+            'selected_address': 'new',
+            'fullname': 'Chủ giỏ',
+            'phone': '0900000000',
+            'address': '2 Trần Phú',
+            'city': 'Hà Nội',
+            'payment_method': 'COD',
+            'note': '',
+        })
+
+    def test_lines_persist_between_requests(self):
+        self.add(self.water, 2)
+        data = self.add(self.oil, 1)
+        self.assertEqual(data['cart_count'], 3)
+        self.assertEqual(Decimal(data['cart_total']), 2 * 120000 + 300000)
+
+        self.client.get(reverse('update_cart', args=[self.water.id]))
+        self.client.get(reverse('remove_from_cart', args=[self.oil.id]))
+        response = self.client.get(reverse('cart_detail'))
+        self.assertEqual([(item.product, item.quantity) for item in response.context['cart']], [(self.water, 1)])
+        self.assertEqual(response.context['cart'].get_total_price(), 120000)
+
+    def test_checkout_total_comes_from_lines(self):
+        self.add(self.water, 2)
+        self.add(self.oil, 1)
+        # Tóm tắt cache đã cũ (worker khác ghi, dòng bị xóa theo sản phẩm...)
+        with patch('app.services.cart_store.BaseCartStore.get_summary', return_value={'count': 1, 'total': '1000'}):
+            self.checkout()
+
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.total_money, 2 * 120000 + 300000)
+        self.assertEqual(order.final_money, order.total_money)
+        self.assertEqual(
+            sum(item.price * item.quantity for item in order.items.all()), order.final_money
+        )
+        self.assertEqual(self.client.get(reverse('add_to_cart_ajax', args=[self.oil.id])).json()['cart_count'], 1)
+
+
+@override_settings(CART_STORAGE='app.services.cart_store.SessionCartStore')
+class SessionCartStoreTests(CartStoreTestsMixin, TestCase):
+    pass
+
+
+@override_settings(CART_STORAGE='app.services.cart_store.DatabaseCartStore')
+class DatabaseCartStoreTests(CartStoreTestsMixin, TestCase):
+
+    def test_deleted_product_drops_out_of_checkout_total(self):
+        self.add(self.water, 1)
+        self.add(self.oil, 2)
+        # CartLine bị xóa theo Product (CASCADE), tóm tắt cache vẫn còn dòng đó
+        Product.objects.filter(id=self.oil.id).delete()
+        self.checkout()
+
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.final_money, 120000)
+        self.assertEqual(order.items.get().product, self.water)
+
+
+@override_settings(
+    CART_STORAGE='app.services.cart_store.CacheCartStore',
+    CACHES={**settings.CACHES, 'carts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'carts'}},
+)
+class CacheCartStoreTests(CartStoreTestsMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        caches['carts'].clear()
+
+    def test_lines_live_in_cart_cache_only(self):
+        self.add(self.water, 2)
+        # Dọn cache 'default' (bị cull khi đầy) không làm mất giỏ
+        cache.clear()
+        response = self.client.get(reverse('cart_detail'))
+        self.assertEqual([(item.product, item.quantity) for item in response.context['cart']], [(self.water, 2)])
+
+    def test_requires_dedicated_cache_alias(self):
+        with override_settings(CACHES={'default': settings.CACHES['default']}):
+            with self.assertRaises(ImproperlyConfigured):
+                cart_store.get_cart_store(RequestFactory().get('/'))
+
+
+class StockReservationTests(TestCase):
+    """Giữ / trả tồn kho khi đặt và hủy đơn"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Serum', slug='serum')
+        cls.product = Product.objects.create(
+            category=category,
+            name='Serum vitamin C',
+            sku='VC-1',
+            price=50000,
+            image='products/default_product.jpg',
+            stock_quantity=10,
+        )
+        cls.user = User.objects.create_user(username='nguoidat', password='matkhau123')
+        CustomerProfile.objects.create(user=cls.user, fullname='Người đặt')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def checkout(self):
+        return self.client.post(reverse('checkout'), {
+            'selected_address': 'new',
+            'fullname': 'Người đặt',
+            'phone': '0900000000',
+            'address': '1 Lê Lợi',
+            'city': 'Hà Nội',
+            'payment_method': 'COD',
+            'note': '',
+        })
+
+    def test_buy_now_rejects_non_positive_quantity(self):
+        self.client.get(reverse('buy_now', args=[self.product.id]), {'quantity': -5})
+        self.assertEqual(self.client.session['buy_now_item']['quantity'], 1)
+        self.checkout()
+
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.final_money, 50000)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock_quantity, self.product.sold_quantity), (9, 1))
+
+        # Session cũ còn số lượng âm: checkout không tạo đơn, không đụng tồn kho
+        session = self.client.session
+        session['buy_now_item'] = {
+            'product_id': self.product.id, 'product_name': self.product.name, 'product_image': '',
+            'quantity': -5, 'price': '50000', 'total': '-250000', 'deal_id': None,
+        }
+        session.save()
+        self.checkout()
+
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock_quantity, self.product.sold_quantity), (9, 1))
+        with self.assertRaises(ValueError):
+            reserve_stock(order, [{'product_id': self.product.id, 'quantity': 0, 'price': 50000}])
+
+    def new_order(self, code='KHO-1', **fields):
+        return Order.objects.create(
+            order_code=code, user=self.user, fullname='Người đặt', phone='0900000000', address='Hà Nội',
+            total_money=0, final_money=0, **fields,
+        )
+
+    def batch(self, code, quantity, days_left):
+        today = timezone.localdate()
+        return ProductBatch.objects.create(
+            product=self.product, batch_code=code, quantity=quantity,
+            manufacturing_date=today - timedelta(days=30), expiry_date=today + timedelta(days=days_left),
+        )
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity, self.product.sold_quantity
+
+    def test_fefo_allocation_and_release(self):
+        late = self.batch('LATE', 5, 300)
+        soon = self.batch('SOON', 2, 10)
+        self.batch('EXPIRED', 5, -1)
+        order = self.new_order()
+
+        items = reserve_stock(order, [{'product_id': self.product.id, 'quantity': 8, 'price': 50000}])
+
+        # Lô hết hạn sớm xuất trước, lô đã hết hạn bỏ qua, phần thiếu lô ghi batch=None
+        self.assertEqual([(item.batch_id, item.quantity) for item in items], [(soon.id, 2), (late.id, 5), (None, 1)])
+        self.assertEqual(self.stock(), (2, 8))
+        self.assertEqual(order.stock_state, 'reserved')
+
+        self.assertTrue(release_stock(order))
+        self.assertEqual(self.stock(), (10, 0))
+        soon.refresh_from_db()
+        late.refresh_from_db()
+        self.assertEqual((soon.quantity, late.quantity), (2, 5))
+        # Hủy lần hai không cộng kho thêm
+        self.assertFalse(release_stock(order))
+        self.assertEqual(self.stock(), (10, 0))
+
+    def test_legacy_order_is_not_released(self):
+        # Đơn tạo trước khi có giữ hàng: chưa từng trừ kho
+        order = self.new_order()
+        OrderItem.objects.create(order=order, product=self.product, product_name='Serum', quantity=3, price=50000)
+
+        order.order_status = 'cancelled'
+        self.assertFalse(sync_order_stock(order))
+        self.assertEqual(self.stock(), (10, 0))
+
+    def test_status_changes_release_and_restore(self):
+        admin = User.objects.create_superuser(username='quantri', password='matkhau123')
+        order = self.new_order()
+        reserve_stock(order, [{'product_id': self.product.id, 'quantity': 4, 'price': 50000}])
+        self.client.force_login(admin)
+
+        def set_status(status):
+            self.client.post(reverse('update_order_status', args=[order.id]), {'status': status})
+            order.refresh_from_db()
+            return order.stock_state, self.stock()
+
+        self.assertEqual(set_status('returned'), ('released', (10, 0)))
+        self.assertEqual(set_status('cancelled'), ('released', (10, 0)))
+        self.assertEqual(set_status('confirmed'), ('reserved', (6, 4)))
+        self.assertEqual(set_status('shipping'), ('reserved', (6, 4)))
+        self.assertEqual(set_status('cancelled'), ('released', (10, 0)))
+
+        # Hết hàng thì không mở lại được đơn
+        Product.objects.filter(id=self.product.id).update(stock_quantity=1)
+        self.assertEqual(set_status('pending'), ('released', (1, 0)))
+        self.assertEqual(order.order_status, 'cancelled')
+
+
+class InventoryAlertTests(TestCase):
+    """Cảnh báo tồn kho: ngưỡng sắp hết hàng và snapshot dùng chung với dashboard"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Toner', slug='toner')
+        stocks = {
+            'at_threshold': LOW_STOCK_THRESHOLD,
+            'above_threshold': LOW_STOCK_THRESHOLD + 1,
+            'hidden_low': 0,
+            'dead': 30,
+            'selling': 30,
+        }
+        cls.products = {
+            key: Product.objects.create(
+                category=category,
+                name=f'Toner {key}',
+                sku=f'TN-{key}',
+                price=120000,
+                image='products/default_product.jpg',
+                stock_quantity=stock,
+                status=key != 'hidden_low',
+            )
+            for key, stock in stocks.items()
+        }
+        order = Order.objects.create(
+            order_code='TN1', fullname='Khách', phone='0900000000', address='Hà Nội', total_money=0, final_money=120000,
+        )
+        OrderItem.objects.create(order=order, product=cls.products['selling'], product_name='Toner', quantity=1,
+                                 price=120000)
+        cls.admin = User.objects.create_superuser(username='quantrikho', password='matkhau123')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def alerts(self, **params):
+        context = self.client.get(reverse('admin_inventory_alerts'), params).context
+        return {alert['product'].id: alert['type'] for alert in context['alerts']}, context['total_low']
+
+    def test_low_stock_threshold_and_dashboard_count(self):
+        products = self.products
+        alerts, total_low = self.alerts()
+        # Tồn đúng ngưỡng là sắp hết, trên ngưỡng thì không; sản phẩm đã ẩn không cảnh báo
+        self.assertEqual(alerts, {products['at_threshold'].id: 'LOW_STOCK', products['dead'].id: 'DEAD_STOCK'})
+        self.assertEqual(total_low, 1)
+
+        # Bán bớt xuống ngưỡng: snapshot cũ vẫn giữ cho tới khi làm mới, dashboard đọc cùng snapshot
+        Product.objects.filter(pk=products['above_threshold'].pk).update(stock_quantity=LOW_STOCK_THRESHOLD)
+        self.assertEqual(self.client.get(reverse('admin_dashboard')).context['low_stock_count'], 1)
+
+        alerts, total_low = self.alerts(refresh='1')
+        self.assertEqual(alerts[products['above_threshold'].id], 'LOW_STOCK')
+        self.assertEqual(total_low, 2)
+        self.assertEqual(self.client.get(reverse('admin_dashboard')).context['low_stock_count'], 2)
+
+
+class DealQuotaTests(TestCase):
+    """Giữ suất WeekendDeal bằng UPDATE có điều kiện"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mặt nạ', slug='mat-na')
+        cls.product = Product.objects.create(
+            category=category,
+            name='Mặt nạ ngủ',
+            sku='MN-1',
+            price=200000,
+            image='products/default_product.jpg',
+            stock_quantity=100,
+        )
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.deal = WeekendDeal.objects.create(
+            product=self.product, deal_price=150000, is_active=True,
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1),
+            max_quantity=10, sold_quantity=8,
+        )
+
+    def sold(self):
+        self.deal.refresh_from_db()
+        return self.deal.sold_quantity
+
+    def test_quota_exhaustion(self):
+        self.assertFalse(claim_deal_units(self.deal.id, 3))
+        self.assertEqual(self.sold(), 8)
+        self.assertTrue(claim_deal_units(self.deal.id, 2))
+        self.assertEqual(self.sold(), 10)
+        self.assertFalse(claim_deal_units(self.deal.id, 1))
+        self.assertFalse(WeekendDeal.objects.filter(id=self.deal.id).filter(has_quota_left()).exists())
+
+        # Khối đặt hàng lỗi thì suất đã giữ được trả lại
+        release_deal_units(self.deal.id, 2)
+        with self.assertRaises(StockError):
+            with claimed_deal_units([{'product_id': self.product.id, 'quantity': 2, 'deal_id': self.deal.id}]):
+                self.assertEqual(self.sold(), 10)
+                raise StockError("thiếu hàng")
+        self.assertEqual(self.sold(), 8)
+
+        with self.assertRaises(DealSoldOutError):
+            with claimed_deal_units([{'product_id': self.product.id, 'quantity': 3, 'deal_id': self.deal.id}]):
+                pass
+        self.assertEqual(self.sold(), 8)
+
+    def test_invalid_quantity_is_rejected(self):
+        for quantity in (0, -5):
+            with self.subTest(quantity=quantity):
+                with self.assertRaises(ValueError):
+                    claim_deal_units(self.deal.id, quantity)
+                with self.assertRaises(ValueError):
+                    release_deal_units(self.deal.id, quantity)
+                with self.assertRaises(ValueError):
+                    with claimed_deal_units([{'product_id': self.product.id, 'quantity': quantity, 'deal_id': self.deal.id}]):
+                        pass
+        self.assertEqual(self.sold(), 8)
+
+    def test_snapshot_expires_without_invalidation(self):
+        self.assertEqual(deal_index.get_active_deal(self.product.id), self.deal)
+
+        # Tắt deal thẳng trong DB (tiến trình khác, cache không dùng chung...): không ai đổi version
+        WeekendDeal.objects.filter(id=self.deal.id).update(is_active=False)
+        self.assertEqual(deal_index.get_active_deal(self.product.id), self.deal)
+
+        later = timezone.now() + timedelta(seconds=deal_index.SNAPSHOT_MAX_AGE + 1)
+        with patch('app.services.deal_index.timezone.now', return_value=later):
+            self.assertIsNone(deal_index.get_active_deal(self.product.id))
+        # Mốc đổi deal thật vẫn là end_time, không phải mốc làm mới snapshot
+        self.assertIsNone(deal_index.next_boundary())
+
+
+class SpamMatcherTests(TestCase):
+    """Sửa keyword không làm hỏng automaton mà các thread khác đang dùng"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_refresh_swaps_instead_of_mutating(self):
+        SpamKeyword.objects.create(keyword='vay tiền', severity=90, category='FINANCE')
+        before = review_service.get_spam_matcher()
+        self.assertEqual(before.find_best('cho vay tiền nhanh')['keyword'], 'vay tiền')
+
+        keyword = SpamKeyword.objects.create(keyword='zalo', severity=80, category='CONTACT')
+        review_service.refresh_spam_keyword(keyword=keyword)
+        review_service.refresh_spam_keyword(old_keyword='vay tiền')
+
+        after = review_service.get_spam_matcher()
+        self.assertIsNot(before, after)
+        # Bản cũ giữ nguyên cho thread đang duyệt, bản mới có thay đổi
+        self.assertIsNone(before.find_best('liên hệ zalo'))
+        self.assertEqual(before.find_best('cho vay tiền nhanh')['keyword'], 'vay tiền')
+        self.assertEqual(after.find_best('liên hệ zalo')['keyword'], 'zalo')
+        self.assertIsNone(after.find_best('cho vay tiền nhanh'))
+
+    def test_copy_patches_only_changed_nodes(self):
+        items = [
+            {'keyword': keyword, 'severity': severity, 'category': 'OTHER'}
+            for keyword, severity in (('vay tiền', 90), ('zalo', 80), ('tiền mặt', 70), ('inbox', 60))
+        ]
+        original = KeywordAutomaton(items).build()
+        patched = original.copy()
+        patched.remove('zalo')
+        patched.add({'keyword': 'chuyển tiền', 'severity': 95, 'category': 'FINANCE'})
+        patched.build()
+
+        # Node gốc có thêm con "c" được chép riêng, các nhánh khác vẫn dùng chung với bản gốc
+        self.assertIsNot(patched._goto[0], original._goto[0])
+        inbox = original._goto[0]['i']
+        self.assertIs(patched._goto[inbox], original._goto[inbox])
+
+        fresh = KeywordAutomaton([item for item in items if item['keyword'] != 'zalo'] + [
+            {'keyword': 'chuyển tiền', 'severity': 95, 'category': 'FINANCE'}
+        ]).build()
+        for text in ('nhắn zalo để vay tiền', 'chuyển tiền mặt', 'inbox shop', 'hàng tốt'):
+            self.assertEqual(patched.find_best(text), fresh.find_best(text))
+        self.assertEqual(original.find_best('nhắn zalo để vay tiền')['keyword'], 'vay tiền')
+        self.assertEqual(original.find_best('liên hệ zalo')['keyword'], 'zalo')
+
+    def test_concurrent_refresh_and_match(self):
+        keywords = [SpamKeyword.objects.create(keyword=f'spam{i}', severity=i) for i in range(40)]
+        review_service.get_spam_matcher()
+        errors = []
+        done = threading.Event()
+
+        def match():
+            while not done.is_set():
+                try:
+                    # Đọc thẳng tham chiếu dùng chung như thread đang xử lý request
+                    review_service._spam_matcher.find_best('đây là spam1 và spam39 và spam7')
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        threads = [threading.Thread(target=match) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for _ in range(20):
+            for keyword in keywords:
+                review_service.refresh_spam_keyword(old_keyword=keyword.keyword, keyword=keyword)
+        done.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class SpamScannerTests(TestCase):
+    """Job quét spam: chạy tiếp từ mốc lần trước, quét lại khi keyword đổi, cập nhật điểm sản phẩm"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Chống nắng', slug='chong-nang')
+        cls.product = Product.objects.create(
+            category=category, name='Kem chống nắng', sku='KCN-1', price=250000,
+            image='products/default_product.jpg', stock_quantity=10,
+        )
+        SpamKeyword.objects.create(keyword='zalo', severity=80, category='CONTACT')
+
+    def setUp(self):
+        cache.clear()
+
+    def review(self, comment, rating=5):
+        user = User.objects.create_user(username=f'quet{User.objects.count()}', password='matkhau123')
+        return Review.objects.create(
+            user=user, product=self.product, comment=comment, rating=rating, sentiment='POS', is_approved=True,
+        )
+
+    def scan(self):
+        out = StringIO()
+        call_command('scan_spam_reviews', chunk_size=2, stdout=out)
+        return out.getvalue().strip()
+
+    def assertRatingsMatch(self):
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.rating_sum, self.product.rating_count,
+             self.product.approved_review_count, self.product.positive_count),
+            product_rating.compute_ratings([self.product.id])[self.product.id],
+        )
+
+    def test_scan_resumes_and_rescans_on_keyword_change(self):
+        for comment in ('Thấm nhanh', 'Inbox zalo lấy giá sỉ', 'Không bết dính', 'Kết bạn zalo nhé', 'Dùng ổn'):
+            self.review(comment)
+        product_rating.reconcile()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.scan(), 'Đã quét 5 review, đánh dấu 2 spam')
+        # Mỗi lô một câu SELECT review (không tải lại từng trường bị defer), thêm một lô rỗng để dừng
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT') and 'FROM "app_review"' in q['sql']]), 4)
+        self.assertEqual(Review.objects.filter(is_spam=True).count(), 2)
+        self.assertRatingsMatch()
+        self.assertEqual(self.product.rating_count, 3)
+
+        # Lần sau chỉ quét review mới từ mốc
+        self.review('Mua thêm qua facebook shop')
+        product_rating.reconcile()
+        self.assertEqual(self.scan(), 'Đã quét 1 review, đánh dấu 0 spam')
+
+        # Thêm keyword: quét lại mọi review chưa bị đánh dấu
+        keyword = SpamKeyword.objects.create(keyword='facebook', severity=70, category='CONTACT')
+        review_service.refresh_spam_keyword(keyword=keyword)
+        self.assertEqual(self.scan(), 'Đã quét 4 review, đánh dấu 1 spam')
+        self.assertEqual(JobWatermark.objects.get(name='spam_scanner').signature, spam_scanner.keywords_signature())
+        self.assertRatingsMatch()
+        self.assertEqual(self.product.approved_review_count, 3)
+
+
+class SentimentWorkerTests(TestCase):
+    """Review còn trong hàng đợi khi tiến trình tắt được chấm bù, không chấm trùng"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Tẩy trang', slug='tay-trang')
+        cls.product = Product.objects.create(
+            category=category,
+            name='Nước tẩy trang',
+            sku='TT-1',
+            price=150000,
+            image='products/default_product.jpg',
+            stock_quantity=10,
+        )
+        cls.user = User.objects.create_user(username='nguoidanhgia', password='matkhau123')
+
+    def setUp(self):
+        cache.clear()
+        self.worker = sentiment_worker.SentimentWorker(
+            max_batch_size=2, max_wait_ms=10, queue_size=10, stats_log_every=0
+        )
+
+    def review(self, confidence_score=0.0, is_spam=False):
+        return Review.objects.create(
+            user=self.user, product=self.product, comment='Sạch, không cay mắt', rating=5,
+            is_approved=True, is_spam=is_spam, confidence_score=confidence_score,
+        )
+
+    @patch('app.ai_utils.analyze_sentiment_batch', side_effect=lambda texts: [('POS', 90.0)] * len(texts))
+    def test_recover_scores_only_unscored_reviews(self, _):
+        pending = [self.review() for _ in range(3)]
+        scored = self.review(confidence_score=70.0)
+        spam = self.review(is_spam=True)
+        product_rating.reconcile([self.product.id])
+
+        self.assertEqual(self.worker.recover_unscored(), 3)
+
+        for review in pending:
+            review.refresh_from_db()
+            self.assertEqual((review.sentiment, review.confidence_score), ('POS', 90.0))
+        scored.refresh_from_db()
+        spam.refresh_from_db()
+        self.assertEqual(scored.confidence_score, 70.0)
+        self.assertEqual(spam.confidence_score, 0.0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.positive_count, 3)
+
+        # Lần chấm thứ hai (tiến trình khác / review đã được chấm đồng bộ) không cộng trùng
+        self.assertEqual(self.worker._process([(pending[0].id, 'x', 0)]), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.positive_count, 3)
+
+    def test_worker_and_rescore_truncate_alike(self):
+        # Chấm lại (rescore_reviews) phải cắt text giống worker, không thì cùng review đổi nhãn
+        import torch
+        from app import ai_utils
+
+        long_text = 'Dùng rất thích ' * 100
+        texts = [long_text, 'ok', 'Hơi khô da']
+
+        pipeline = MagicMock(side_effect=lambda batch, **kwargs: [{'label': 'LABEL_1', 'score': 0.9}] * len(batch))
+        with patch.object(ai_utils, 'load_model', return_value=pipeline), patch.object(ai_utils, 'sentiment_pipeline', pipeline):
+            worker_results = ai_utils.analyze_sentiment_batch(texts)
+        worker_texts, worker_kwargs = pipeline.call_args.args[0], pipeline.call_args.kwargs
+
+        tokenizer = MagicMock(side_effect=lambda batch, **kwargs: {'input_ids': [[1] * len(text) for text in batch]})
+        tokenizer.pad.side_effect = lambda features, return_tensors: {'input_ids': torch.ones(len(features['input_ids']), 1)}
+        model = MagicMock(side_effect=lambda **batch: MagicMock(logits=torch.tensor([[0.0, 5.0, 0.0]] * len(batch['input_ids']))))
+        model.config.id2label = {0: 'LABEL_0', 1: 'LABEL_1', 2: 'LABEL_2'}
+        rescore_results = ai_utils.predict_sentiments(texts, tokenizer, model)
+        rescore_texts, rescore_kwargs = tokenizer.call_args.args[0], tokenizer.call_args.kwargs
+
+        self.assertEqual(rescore_texts, worker_texts)
+        self.assertEqual(len(worker_texts[0]), ai_utils.MAX_TEXT_CHARS)
+        self.assertEqual({key: rescore_kwargs[key] for key in ai_utils.TOKENIZER_KWARGS}, ai_utils.TOKENIZER_KWARGS)
+        self.assertEqual({key: worker_kwargs[key] for key in ai_utils.TOKENIZER_KWARGS}, ai_utils.TOKENIZER_KWARGS)
+        # Text quá ngắn giữ NEU mặc định ở cả hai đường
+        self.assertEqual([label for label, _ in worker_results], ['POS', 'NEU', 'POS'])
+        self.assertEqual([label for label, _ in rescore_results], ['POS', 'NEU', 'POS'])
+
+    def test_autostart_only_in_web_process(self):
+        with patch('sys.argv', ['manage.py', 'test']), patch.dict('os.environ', {}, clear=False):
+            os.environ.pop(sentiment_worker.WEB_PROCESS_ENV, None)
+            self.assertFalse(sentiment_worker.is_web_process())
+        with patch('sys.argv', ['/usr/bin/pytest']):
+            self.assertFalse(sentiment_worker.is_web_process())
+        with patch('sys.argv', ['/usr/bin/gunicorn']), patch.dict('os.environ', {sentiment_worker.WEB_PROCESS_ENV: '1'}):
+            self.assertTrue(sentiment_worker.is_web_process())
+
+
+class CursorPaginationTests(TestCase):
+    """Con trỏ đã ký: con trỏ hỏng về trang đầu, trùng created_at vẫn đủ dòng, trang trước / sau đúng biên"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='khachdon', password='matkhau123')
+        cls.admin = User.objects.create_superuser(username='quantridon', password='matkhau123')
+        now = timezone.now()
+        for i in range(28):
+            order = Order.objects.create(
+                user=cls.user if i < 25 else None,
+                order_code=f'CP{i:03d}',
+                fullname='Khách',
+                phone='0900000000',
+                address='Hà Nội',
+                total_money=0,
+                final_money=0,
+            )
+            # Từng nhóm 4 đơn cùng created_at: thứ tự trong nhóm do id quyết định
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(hours=i // 4))
+
+    def ordered_ids(self, queryset):
+        return list(queryset.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_invalid_cursor_returns_first_page(self):
+        ordering = ('-created_at', '-id')
+        first = [order.id for order in cursor_pagination.paginate(Order.objects.all(), per_page=5, ordering=ordering)]
+        valid = cursor_pagination.paginate(Order.objects.all(), per_page=5, ordering=ordering).next_cursor
+
+        tampered = valid[:-2] + ('A' if valid[-2] != 'A' else 'B') + valid[-1]
+        other_salt = signing.dumps(['next', [['i', 1], ['i', 1]]], salt='khac', compress=True)
+        wrong_length = cursor_pagination.encode_cursor([1], 'next')
+        wrong_direction = signing.dumps(['sideways', [['i', 1], ['i', 1]]], salt=cursor_pagination.CURSOR_SALT)
+        for token in ('rác', tampered, other_salt, wrong_length, wrong_direction):
+            self.assertIsNone(cursor_pagination.decode_cursor(token, list(ordering)))
+            page = cursor_pagination.paginate(Order.objects.all(), token, per_page=5, ordering=ordering)
+            self.assertEqual([order.id for order in page], first)
+            self.assertFalse(page.has_previous)
+
+    def test_ties_on_created_at_walk_every_row_once(self):
+        ordering = ('-created_at', '-id')
+        expected = self.ordered_ids(Order.objects.all())
+        pages = []
+        page = cursor_pagination.paginate(Order.objects.all(), per_page=3, ordering=ordering)
+        while True:
+            pages.append([order.id for order in page])
+            if not page.next_cursor:
+                break
+            page = cursor_pagination.paginate(Order.objects.all(), page.next_cursor, per_page=3, ordering=ordering)
+        self.assertEqual(sum(pages, []), expected)
+
+        # Lùi lại từ trang cuối cho ra đúng các trang đã đi qua
+        for previous in reversed(pages[:-1]):
+            page = cursor_pagination.paginate(Order.objects.all(), page.previous_cursor, per_page=3, ordering=ordering)
+            self.assertEqual([order.id for order in page], previous)
+        self.assertFalse(page.has_previous)
+        self.assertIsNone(page.previous_cursor)
+
+    def walk(self, url):
+        """[(id trên trang, có trang trước, có trang sau)] đi tới trang cuối rồi lùi về trang đầu"""
+        forward = []
+        response = self.client.get(url)
+        while True:
+            page = response.context['orders']
+            forward.append(([order.id for order in page], page.previous_cursor is not None, page.next_cursor is not None))
+            if not page.next_cursor:
+                break
+            response = self.client.get(url, {'cursor': page.next_cursor})
+        backward = []
+        while page.previous_cursor:
+            page = self.client.get(url, {'cursor': page.previous_cursor}).context['orders']
+            backward.append([order.id for order in page])
+        return forward, backward
+
+    def assertBoundaries(self, forward, backward, expected):
+        self.assertEqual(sum((ids for ids, _, _ in forward), []), expected)
+        self.assertEqual([len(ids) for ids, _, _ in forward], [10, 10, len(expected) - 20])
+        self.assertEqual([(has_prev, has_next) for _, has_prev, has_next in forward], [
+            (False, True), (True, True), (True, False),
+        ])
+        self.assertEqual(backward, [forward[1][0], forward[0][0]])
+
+    def test_my_orders_pages(self):
+        self.client.force_login(self.user)
+        forward, backward = self.walk(reverse('my_orders'))
+        self.assertBoundaries(forward, backward, self.ordered_ids(Order.objects.filter(user=self.user)))
+
+    def test_admin_orders_pages(self):
+        self.client.force_login(self.admin)
+        forward, backward = self.walk(reverse('admin_orders'))
+        self.assertBoundaries(forward, backward, self.ordered_ids(Order.objects.all()))
+        self.assertEqual(self.client.get(reverse('admin_orders')).context['orders'].count_label, '28')
+
+
+class ReviewFeedTests(TestCase):
+    """Đánh giá trên trang chi tiết: số query cố định, tải thêm theo con trỏ, tổng hợp có cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Dưỡng da', slug='duong-da')
+        cls.product = Product.objects.create(
+            category=category,
+            name='Kem dưỡng ẩm',
+            sku='KEM-1',
+            price=300000,
+            image='products/default_product.jpg',
+            stock_quantity=10,
+        )
+        for i in range(25):
+            user = User.objects.create_user(username=f'khach{i}', password='matkhau123')
+            if i % 2:
+                CustomerProfile.objects.create(user=user)
+            Review.objects.create(
+                user=user,
+                product=cls.product,
+                comment=f'Đánh giá số {i}',
+                rating=i % 5 + 1,
+                sentiment=('POS', 'NEU', 'NEG')[i % 3],
+                is_approved=True,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_query_count_does_not_grow_with_reviews(self):
+        url = reverse('product_detail', args=[self.product.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        review_queries = [q['sql'] for q in queries if 'app_review' in q['sql']]
+        self.assertEqual(len(review_queries), 1)
+        self.assertFalse([q['sql'] for q in queries if 'app_customerprofile' in q['sql'] and 'JOIN' not in q['sql']])
+        self.assertEqual(response.context['rating_summary']['count'], 25)
+
+    def test_load_more_walks_all_reviews(self):
+        response = self.client.get(reverse('product_detail', args=[self.product.id]))
+        seen = [review.id for review in response.context['reviews']]
+        cursor = response.context['reviews'].next_cursor
+        while cursor:
+            data = self.client.get(reverse('product_reviews', args=[self.product.id]), {'cursor': cursor}).json()
+            seen += [review['id'] for review in data['reviews']]
+            cursor = data['next_cursor']
+
+        expected = list(Review.objects.filter(product=self.product).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_new_review_refreshes_summary(self):
+        url = reverse('product_detail', args=[self.product.id])
+        self.assertEqual(self.client.get(url).context['rating_summary']['count'], 25)
+
+        self.client.force_login(User.objects.get(username='khach0'))
+        self.client.post(reverse('submit_review', args=[self.product.id]), {'rating': 5, 'comment': 'Dùng rất thích, thấm nhanh'})
+
+        summary = self.client.get(url).context['rating_summary']
+        self.assertEqual(summary['count'], 26)
+        self.assertEqual(summary['histogram'][0]['count'], 6)
+
+    def test_spam_is_left_out_of_feed_and_summary(self):
+        spam = Review.objects.create(
+            user=User.objects.get(username='khach1'), product=self.product, comment='Inbox zalo mua giá sỉ',
+            rating=5, sentiment='POS', is_approved=True, is_spam=True,
+        )
+        product_rating.reconcile()
+        self.product.refresh_from_db()
+
+        summary = review_feed.get_rating_summary(self.product.id)
+        self.assertEqual(summary['count'], 25)
+        self.assertEqual(summary['count'], self.product.rating_count)
+        self.assertEqual(summary['average'], round(self.product.rating_avg, 1))
+        self.assertEqual(summary['histogram'][0]['count'], 5)
+        self.assertEqual(sum(item['count'] for item in summary['sentiments']), summary['count'])
+        self.assertNotIn(spam.id, [review.id for review in review_feed.get_feed_page(self.product.id)])
+
+
+class ProductRatingTests(TestCase):
+    """Điểm đánh giá lưu sẵn trên Product khớp với bảng Review sau mỗi thay đổi"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Chống nắng', slug='chong-nang')
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f'Kem chống nắng {i}',
+                sku=f'KCN-{i}',
+                price=200000,
+                image='products/default_product.jpg',
+                stock_quantity=10,
+            )
+            for i in range(3)
+        ]
+        cls.user = User.objects.create_user(username='reviewer', password='matkhau123')
+
+    def assertMatchesReviews(self, product):
+        product.refresh_from_db()
+        expected = product_rating.compute_ratings([product.id]).get(product.id, (0, 0, 0, 0))
+        self.assertEqual(
+            (product.rating_sum, product.rating_count, product.approved_review_count, product.positive_count),
+            expected,
+        )
+        self.assertEqual(product_rating.reconcile([product.id]), 0)
+
+    def test_counters_follow_review_changes(self):
+        product = self.products[0]
+        self.client.force_login(self.user)
+        for rating, comment in ((5, 'Thấm nhanh, không bết dính'), (2, 'Hơi nhờn khi dùng buổi trưa')):
+            self.client.post(reverse('submit_review', args=[product.id]), {'rating': rating, 'comment': comment})
+        self.assertMatchesReviews(product)
+        self.assertAlmostEqual(product.rating_avg, 3.5)
+
+        # Worker AI gắn nhãn tích cực, job spam đánh dấu một review
+        review = Review.objects.filter(product=product).order_by('id').first()
+        deltas = product_rating.RatingDeltas()
+        deltas.remove(review)
+        review.sentiment = 'POS'
+        deltas.add(review)
+        review.save(update_fields=['sentiment'])
+        deltas.apply()
+        self.assertMatchesReviews(product)
+        self.assertAlmostEqual(product.positive_ratio, 0.5)
+
+        spam = Review.objects.filter(product=product).order_by('id').last()
+        deltas.remove(spam)
+        spam.is_spam = True
+        deltas.add(spam)
+        spam.save(update_fields=['is_spam'])
+        deltas.apply()
+        self.assertMatchesReviews(product)
+        # Review spam không được tính vào số đánh giá hiển thị cạnh điểm trung bình
+        self.assertEqual(product.approved_review_count, 1)
+        self.assertEqual(product.approved_review_count, product.rating_count)
+        self.assertAlmostEqual(product.rating_avg, 5.0)
+
+        spam.delete()
+        self.assertMatchesReviews(product)
+
+    def test_reconcile_repairs_drift(self):
+        product = self.products[1]
+        Review.objects.bulk_create([
+            Review(user=self.user, product=product, rating=rating, comment='Nhập tay')
+            for rating in (4, 5)
+        ])
+        self.assertEqual(product_rating.reconcile(), 1)
+        self.assertMatchesReviews(product)
+        self.assertAlmostEqual(product.rating_avg, 4.5)
+
+    def test_shop_sorts_and_filters_by_rating(self):
+        for product, ratings in zip(self.products, ((3,), (5, 4), (2, 1))):
+            Review.objects.bulk_create([
+                Review(user=self.user, product=product, rating=rating, comment='Đánh giá') for rating in ratings
+            ])
+        product_rating.reconcile()
+
+        response = self.client.get(reverse('shop'), {'sort': 'rating'})
+        html = response.content.decode()
+        positions = [html.index(product.name + '<') for product in self.products]
+        self.assertLess(positions[1], positions[0])
+        self.assertLess(positions[0], positions[2])
+
+        response = self.client.get(reverse('shop'), {'rating': 4})
+        self.assertContains(response, self.products[1].name)
+        self.assertNotContains(response, self.products[0].name + '<')
+
+
+
+class ShopFacetTests(TestCase):
+    """Bộ lọc trang /shop/: số lượng mỗi lựa chọn khớp kết quả khi chọn nó, số query không tăng theo danh mục"""
+
+    @classmethod
+    def setUpTestData(cls):
+        skincare = Category.objects.create(name='Chăm sóc da', slug='cham-soc-da-f')
+        cls.serum_category = Category.objects.create(name='Serum', slug='serum-f', parent=skincare)
+        makeup = Category.objects.create(name='Trang điểm', slug='trang-diem-f')
+        cls.brands = [Brand.objects.create(name=name, slug=f'{name.lower()}-f') for name in ('Aurora', 'Lumiere')]
+        rows = (
+            # (danh mục, thương hiệu, giá, giá khuyến mãi, loại da, điểm trung bình)
+            (skincare, 0, 150000, 0, 'Da dầu', 4.5),
+            (cls.serum_category, 0, 450000, 0, 'Da dầu', 3.2),
+            (cls.serum_category, 1, 650000, 350000, 'Da khô', 0),
+            (cls.serum_category, 1, 1200000, 0, 'Da khô', 4.8),
+            (makeup, 0, 300000, 0, '', 2.0),
+            (makeup, 1, 90000, 0, 'Da dầu', 3.9),
+        )
+        cls.products = []
+        for i, (category, brand, price, sale_price, skin, rating) in enumerate(rows):
+            cls.products.append(Product.objects.create(
+                category=category, brand=cls.brands[brand], name=f'Sản phẩm lọc {i}', sku=f'SF-{i}',
+                price=price, sale_price=sale_price, target_skin_type=skin, rating_avg=rating,
+                rating_count=1 if rating else 0, image='products/default_product.jpg', stock_quantity=10,
+            ))
+        now = timezone.now()
+        WeekendDeal.objects.create(
+            product=cls.products[1], deal_price=300000, is_active=True,
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def count(self, url):
+        filters = shop_facets.ShopFilters(QueryDict(url[1:]))
+        return filters.apply(Product.objects.all()).count()
+
+    def test_counts_match_filtered_results(self):
+        for query in ('', 'brand=%d&price=200k-500k' % self.brands[0].id, 'category=%d&skin=Da+kh%%C3%%B4&rating=3' % self.serum_category.id):
+            filters = shop_facets.ShopFilters(QueryDict(query))
+            facets = shop_facets.build_facets(filters, Product.objects.all())
+            options = (
+                [(item['count'], filters.url(category=item['id'])) for item in facets['categories']]
+                + [(item['count'], filters.url(brand=[item['id']])) for item in facets['brands']]
+                + [(item['count'], filters.url(price=[item['key']])) for item in facets['prices']]
+                + [(item['count'], filters.url(skin=[item['value']])) for item in facets['skins']]
+                + [(item['count'], filters.url(rating=item['stars'])) for item in facets['ratings']]
+                + [(facets['deal']['count'], filters.url(deal=1))]
+            )
+            for count, url in options:
+                self.assertEqual(count, self.count(url), f'{query} -> {url}')
+
+        # Danh mục cha đếm cả sản phẩm của danh mục con; giá theo giá khuyến mãi
+        facets = shop_facets.build_facets(shop_facets.ShopFilters(QueryDict('')), Product.objects.all())
+        self.assertEqual({item['name']: item['count'] for item in facets['categories']}['Chăm sóc da'], 4)
+        self.assertEqual({item['key']: item['count'] for item in facets['prices']}['200k-500k'], 3)
+
+    def shop_queries(self, query):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shop') + query)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_shop_query_count_does_not_grow_with_categories(self):
+        query = '?brand=%d&price=200k-500k&skin=Da+d%%E1%%BA%%A7u&deal=1' % self.brands[0].id
+        # Request đầu tạo session giỏ hàng, không tính
+        self.shop_queries('')
+        before = self.shop_queries(query)
+        # session, chỉ mục deal (2), cây danh mục, 6 nhóm bộ lọc, trang sản phẩm, đếm tổng
+        self.assertEqual(before, 12)
+        for i in range(10):
+            category = Category.objects.create(name=f'Danh mục thêm {i}', slug=f'them-{i}', parent=self.serum_category)
+            Product.objects.create(
+                category=category, brand=self.brands[i % 2], name=f'Sản phẩm thêm {i}', sku=f'SF-X{i}',
+                price=250000, target_skin_type='Da dầu', image='products/default_product.jpg', stock_quantity=10,
+            )
+        self.assertEqual(self.shop_queries(query), before)
+
+
+@override_settings(VIEW_COUNTER={'ENABLED': True, 'FLUSH_INTERVAL': 3600, 'MAX_PRODUCTS': 500})
+class ViewCounterTests(TestCase):
+    """Lượt xem sản phẩm được cộng dồn trong bộ nhớ và ghi bằng một câu UPDATE"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Tẩy trang', slug='tay-trang')
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f'Nước tẩy trang {i}',
+                sku=f'NTT-{i}',
+                price=150000,
+                image='products/default_product.jpg',
+                stock_quantity=10,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        # Ghi hết lượt xem còn đệm từ các test khác, đồng thời đặt mốc flush tiếp theo sau 1 giờ
+        view_counter.record_view(0)
+        view_counter.flush()
+        self.baseline = self.views()
+
+    def views(self):
+        return dict(Product.objects.filter(id__in=[p.id for p in self.products]).values_list('id', 'views'))
+
+    def added_views(self):
+        return {product_id: views - self.baseline[product_id] for product_id, views in self.views().items()}
+
+    def test_views_are_buffered_and_flushed_in_one_update(self):
+        for i in range(7):
+            self.client.get(reverse('product_detail', args=[self.products[i % 3].id]))
+        self.assertEqual(self.views(), self.baseline)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(view_counter.flush(), 3)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "app_product" ')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('CASE', updates[0])
+        self.assertEqual(
+            self.added_views(),
+            {self.products[0].id: 3, self.products[1].id: 2, self.products[2].id: 2},
+        )
+        self.assertEqual(view_counter.flush(), 0)
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Xem nhiều nhất')
+
+    def test_failed_flush_keeps_views_for_retry(self):
+        view_counter.record_view(self.products[0].id)
+        with patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError('mất kết nối')):
+            self.assertEqual(view_counter.flush(), 0)
+        self.assertEqual(view_counter.pending_views(), {self.products[0].id: 1})
+
+        view_counter.flush()
+        self.assertEqual(self.added_views()[self.products[0].id], 1)
+
+    def test_forked_child_drops_parent_buffer(self):
+        view_counter.record_view(self.products[1].id)
+        view_counter._reset_after_fork()
+        self.assertEqual(view_counter.pending_views(), {})
+
+
+
+@override_settings(TRENDING={'HALF_LIFE_HOURS': 72, 'TOP_K': 10, 'ORDER_WEIGHT': 1.0, 'WISHLIST_WEIGHT': 0.5, 'VIEW_WEIGHT': 0.02})
+class TrendingTests(TestCase):
+    """Điểm xu hướng cộng dồn từ đơn hàng mới, giảm dần theo thời gian"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Nước hoa', slug='nuoc-hoa')
+        cls.old_hit, cls.new_hit, cls.cancelled = [
+            Product.objects.create(
+                category=category,
+                name=f'Nước hoa {i}',
+                sku=f'NH-{i}',
+                price=900000,
+                image='products/default_product.jpg',
+                stock_quantity=50,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def order(self, product, quantity, days_ago=0, status='completed'):
+        order = Order.objects.create(
+            order_code=f'TR{Order.objects.count()}',
+            fullname='Khách',
+            phone='0900000000',
+            address='Hà Nội',
+            total_money=0,
+            final_money=0,
+            order_status=status,
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        OrderItem.objects.create(order=order, product=product, product_name=product.name, quantity=quantity, price=product.price)
+        order.refresh_from_db()
+        return order
+
+    def stored_score(self, product):
+        return ProductTrendScore.objects.get(product=product).score
+
+    def score(self, product):
+        return trending.current_score(self.stored_score(product))
+
+    def test_recent_sales_outrank_older_bigger_sales(self):
+        self.order(self.old_hit, 5, days_ago=9)        # 5 * 2^-3 ≈ 0.63
+        self.order(self.new_hit, 2)
+        self.order(self.cancelled, 10, status='cancelled')
+
+        trending.update()
+
+        self.assertEqual(trending.top_product_ids(), [self.new_hit.id, self.old_hit.id])
+        self.assertAlmostEqual(self.score(self.old_hit), 5 / 8, places=2)
+        self.assertAlmostEqual(self.score(self.new_hit), 2, places=2)
+
+    def test_update_only_adds_new_rows(self):
+        self.order(self.new_hit, 2)
+        trending.update()
+        trending.update()
+        self.assertAlmostEqual(self.score(self.new_hit), 2, places=2)
+
+        self.order(self.new_hit, 1)
+        self.assertEqual(trending.update()[trending.ORDER_JOB], 1)
+        self.assertAlmostEqual(self.score(self.new_hit), 3, places=2)
+
+    def test_landmark_rescale_keeps_scores(self):
+        self.order(self.new_hit, 2)
+        trending.update()
+
+        later = timezone.now() + timedelta(days=3 * 365)
+        before = trending.current_score(self.stored_score(self.new_hit), now=later)
+        landmark = trending.get_landmark()
+
+        self.assertTrue(trending.rescale_if_needed(now=later))
+        self.assertGreater(trending.get_landmark(), landmark)
+        self.assertAlmostEqual(trending.current_score(self.stored_score(self.new_hit), now=later) / before, 1, places=9)
+        self.assertFalse(trending.rescale_if_needed(now=later))
+
+    def test_cancelled_order_is_subtracted(self):
+        self.order(self.old_hit, 1)
+        order = self.order(self.new_hit, 2)
+        trending.update()
+
+        order.order_status = 'cancelled'
+        self.assertEqual(trending.order_status_changed(order, 'completed'), 1)
+        self.assertAlmostEqual(self.score(self.new_hit), 0, places=6)
+        self.assertEqual(trending.refresh_top(), [self.old_hit.id])
+
+        order.order_status = 'confirmed'
+        self.assertEqual(trending.order_status_changed(order, 'cancelled'), 1)
+        self.assertAlmostEqual(self.score(self.new_hit), 2, places=2)
+
+        # Đơn job chưa đọc: không trừ, job đọc trạng thái mới và bỏ qua
+        pending = self.order(self.new_hit, 5, status='cancelled')
+        self.assertEqual(trending.order_status_changed(pending, 'pending'), 0)
+        trending.update()
+        self.assertAlmostEqual(self.score(self.new_hit), 2, places=2)
+
+    def test_views_use_landmark_from_db(self):
+        cached = trending.get_landmark()
+        # Tiến trình khác vừa dời mốc, cache ở tiến trình này chưa đổi
+        JobWatermark.objects.filter(name=trending.LANDMARK_JOB).update(last_id=cached - 30 * 86400)
+        trending.record_views({self.new_hit.id: 10})
+        self.assertEqual(trending.get_landmark(), cached)
+        self.assertAlmostEqual(
+            trending.current_score(self.stored_score(self.new_hit), landmark=cached - 30 * 86400), 0.2, places=6
+        )
+
+
+class SearchIndexTests(TestCase):
+    """Chỉ mục tìm kiếm: signals giữ chỉ mục đúng, chỉ đọc các posting điểm cao nhất của mỗi từ"""
+
+    def setUp(self):
+        cache.clear()
+        # Signals lưu sản phẩm còn ghi delta log gợi ý tìm kiếm: ghi vào thư mục tạm, không vào file thật
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(AUTOCOMPLETE_SNAPSHOT=os.path.join(directory.name, 'autocomplete.snapshot'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def product(self, name, **fields):
+        fields.setdefault('category', self.category)
+        return Product.objects.create(
+            name=name, sku=f'TK-{Product.objects.count()}', price=100000,
+            image='products/default_product.jpg', stock_quantity=10, **fields,
+        )
+
+    def test_signals_reindex_products(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Trang điểm', slug='trang-diem-tk')
+            brand = Brand.objects.create(name='Lumiere', slug='lumiere')
+            lipstick = self.product('Son Kem Lì', brand=brand)
+        self.assertEqual(search_index.search_product_ids('son kem li'), [lipstick.id])
+        self.assertEqual(search_index.search_product_ids('lumiere'), [lipstick.id])
+
+        # Đổi tên thương hiệu / danh mục: sản phẩm được đánh lại theo tên mới
+        with self.captureOnCommitCallbacks(execute=True):
+            brand.name = 'Aurora'
+            brand.save()
+            self.category.name = 'Môi'
+            self.category.save()
+        self.assertEqual(search_index.search_product_ids('lumiere'), [])
+        self.assertEqual(search_index.search_product_ids('aurora moi'), [lipstick.id])
+
+        # Xóa thương hiệu (SET_NULL) thì tên cũ không còn trong chỉ mục
+        with self.captureOnCommitCallbacks(execute=True):
+            brand.delete()
+        self.assertEqual(search_index.search_product_ids('aurora'), [])
+
+        # Lưu chỉ tồn kho không đánh lại; ngừng kinh doanh thì gỡ khỏi chỉ mục
+        lipstick.refresh_from_db()
+        with self.captureOnCommitCallbacks() as callbacks:
+            lipstick.stock_quantity = 3
+            lipstick.save(update_fields=['stock_quantity'])
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            lipstick.status = False
+            lipstick.save()
+        self.assertFalse(lipstick.search_postings.exists())
+
+    def test_search_reads_only_top_postings(self):
+        self.category = Category.objects.create(name='Dưỡng da', slug='duong-da-tk')
+        creams = [self.product('Kem ' + ' '.join(['dưỡng'] * i)) for i in range(6)]
+        # "kem" có điểm thấp ở sản phẩm này (mô tả dài) nhưng chỉ nó có từ "hiếm"
+        rare = self.product('Kem hiếm', description=' '.join(['dưỡng ẩm mềm mịn'] * 20))
+        search_index.rebuild_index()
+
+        full = search_index.search_product_ids('kem')
+        self.assertEqual(len(full), 7)
+        self.assertEqual(full[-1], rare.id)
+        with patch.object(search_index, 'MAX_POSTINGS_PER_TERM', 3):
+            self.assertEqual(search_index.search_product_ids('kem'), full[:3])
+            # Tìm nhiều từ: ứng viên lấy từ từ hiếm nhất, "kem" bị cắt vẫn được tra cho ứng viên đó
+            self.assertEqual(search_index.search_product_ids('kem hiem'), [rare.id])
+        self.assertIn(creams[0].id, full[:3])
+
+        # weight lưu sẵn khớp công thức BM25
+        stats = search_index.get_index_stats()
+        for posting in rare.search_postings.all():
+            self.assertAlmostEqual(
+                posting.weight, search_index.term_weight(posting.tf, posting.doc_len, stats['avgdl'])
+            )
+
+    def test_saves_adjust_cached_stats_without_recounting(self):
+        self.category = Category.objects.create(name='Dưỡng da', slug='duong-da-st')
+        toner = self.product('Nước hoa hồng')
+        search_index.rebuild_index()
+        generation = search_index.get_index_stats()['generation']
+
+        def actual():
+            row = SearchDocument.objects.aggregate(n=Count('pk'), total=Sum('length'))
+            return row['n'], row['total'] or 0
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                serum = self.product('Serum Vitamin C', description='Làm sáng da')
+            with self.captureOnCommitCallbacks(execute=True):
+                toner.description = 'Cân bằng độ ẩm cho da khô'
+                toner.save()
+        self.assertFalse([q['sql'] for q in queries if 'app_searchdocument' in q['sql'] and 'COUNT(' in q['sql']])
+        stats = search_index.get_index_stats()
+        self.assertEqual((stats['n'], stats['total']), actual())
+        self.assertEqual(stats['generation'], generation)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            serum.status = False
+            serum.save()
+        stats = search_index.get_index_stats()
+        self.assertEqual((stats['n'], stats['total']), actual())
+        self.assertAlmostEqual(stats['avgdl'], SearchDocument.objects.aggregate(avg=Avg('length'))['avg'])
+
+
+class AutocompleteTests(TestCase):
+    """Gợi ý tìm kiếm: tiền tố ngắn dùng top tính sẵn, sản phẩm lưu / xóa ghi vào delta log"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'autocomplete.snapshot')
+        settings_override = override_settings(AUTOCOMPLETE_SNAPSHOT=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        autocomplete._snapshot = autocomplete._delta = None
+        self.addCleanup(setattr, autocomplete, '_snapshot', None)
+        self.addCleanup(setattr, autocomplete, '_delta', None)
+        self.category = Category.objects.create(name='Trang điểm', slug='trang-diem-ac')
+
+    def product(self, name, **fields):
+        return Product.objects.create(
+            name=name, sku=f'AC-{name}', price=100000, category=self.category,
+            image='products/default_product.jpg', stock_quantity=10, **fields,
+        )
+
+    def labels(self, query):
+        return [item['label'] for item in autocomplete.suggest(query)]
+
+    def test_short_prefix_returns_best_sellers(self):
+        for letter in 'abcdef':
+            self.product(f'Son {letter}', sold_quantity=1)
+        # Khóa xếp cuối cùng trong các khóa bắt đầu bằng "s"
+        self.product('Son zz', sold_quantity=500)
+        with patch.object(autocomplete, 'MAX_SCAN', 3), patch.object(autocomplete, 'TOP_K', 4):
+            autocomplete.rebuild_snapshot()
+            self.assertEqual(self.labels('s')[0], 'Son zz')
+            self.assertEqual(self.labels('so')[0], 'Son zz')
+            # Tiền tố khớp ít khóa vẫn duyệt thẳng
+            self.assertEqual(self.labels('son c'), ['Son c'])
+
+    def test_saved_products_go_to_delta_log(self):
+        lipstick = self.product('Son Kem Lì')
+        cushion = self.product('Phấn nước')
+        autocomplete.rebuild_snapshot()
+        mtime = os.stat(self.path).st_mtime_ns
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lipstick.name = 'Son Bóng'
+            lipstick.save()
+            cushion.status = False
+            cushion.save()
+        self.assertEqual(self.labels('son'), ['Son Bóng'])
+        self.assertEqual(self.labels('phan'), [])
+        # Snapshot không bị ghi lại khi lưu sản phẩm
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+
+        # Lưu chỉ tồn kho không ghi delta
+        with self.captureOnCommitCallbacks() as callbacks:
+            lipstick.stock_quantity = 3
+            lipstick.save(update_fields=['stock_quantity'])
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lipstick.delete()
+        self.assertEqual(self.labels('son'), [])
+
+        # Lệnh dựng lại gộp delta vào snapshot và xóa delta log
+        self.product('Son Tint')
+        autocomplete.rebuild_snapshot()
+        self.assertFalse(os.path.exists(autocomplete.delta_path(self.path)))
+        self.assertEqual(self.labels('son'), ['Son Tint'])
+
+
+class RecommendationTests(TestCase):
+    """Gợi ý tính sẵn theo loại da, thành phần và mua chung"""
+
+    @classmethod
+    def setUpTestData(cls):
+        skincare = Category.objects.create(name='Dưỡng da', slug='duong-da')
+        makeup = Category.objects.create(name='Trang điểm', slug='trang-diem')
+
+        def product(sku, category, skin, ingredients, sold=0):
+            return Product.objects.create(
+                category=category,
+                name=f'Sản phẩm {sku}',
+                sku=sku,
+                price=200000,
+                image='products/default_product.jpg',
+                stock_quantity=20,
+                target_skin_type=skin,
+                main_ingredients=ingredients,
+                sold_quantity=sold,
+            )
+
+        cls.serum = product('RC-1', skincare, 'Da dầu', 'Niacinamide, Kẽm')
+        cls.toner = product('RC-2', skincare, 'Da dầu', 'Niacinamide; BHA')
+        cls.cream = product('RC-3', skincare, 'Da khô', 'Ceramide')
+        cls.lipstick = product('RC-4', makeup, 'Mọi loại da', 'Sáp ong', sold=50)
+        cls.acne_gel = product('RC-5', skincare, 'Da dầu', 'BHA, tràm trà trị mụn', sold=5)
+
+        cls.buyer = User.objects.create_user(username='nguoimua', password='matkhau123')
+        CustomerProfile.objects.create(user=cls.buyer, fullname='Người mua', skin_type='oily', skin_concerns=['Mụn'])
+        cls.other = User.objects.create_user(username='khachkhac', password='matkhau123')
+
+        # Son môi hay được mua cùng serum (khác danh mục, không chung thành phần)
+        for i in range(3):
+            cls.order(cls.other, [cls.serum, cls.lipstick], f'RC{i}')
+        cls.order(cls.buyer, [cls.serum], 'RC-B')
+        cls.order(cls.other, [cls.cream, cls.toner], 'RC-X', status='cancelled')
+
+    @staticmethod
+    def order(user, products, code, status='completed'):
+        order = Order.objects.create(
+            user=user,
+            order_code=code,
+            fullname='Khách',
+            phone='0900000000',
+            address='Hà Nội',
+            total_money=0,
+            final_money=0,
+            order_status=status,
+        )
+        for item in products:
+            OrderItem.objects.create(order=order, product=item, product_name=item.name, quantity=1, price=item.price)
+
+    def setUp(self):
+        cache.clear()
+
+    def related_ids(self, product):
+        return list(
+            ProductRecommendation.objects.filter(source=product).order_by('rank').values_list('product_id', flat=True)
+        )
+
+    def test_related_ranks_copurchase_and_ingredients(self):
+        recommender.build()
+
+        related = self.related_ids(self.serum)
+        # Mua chung nhiều nhất, rồi tới cùng thành phần + loại da
+        self.assertEqual(related[:2], [self.lipstick.id, self.toner.id])
+        self.assertLess(related.index(self.acne_gel.id), related.index(self.cream.id))
+        # Đơn đã hủy không tính là mua chung
+        self.assertEqual(recommender.Catalog().copurchase(self.cream.id, self.toner.id), 0)
+
+    def test_user_list_matches_skin_and_skips_bought(self):
+        recommender.build()
+
+        ids = list(
+            UserRecommendation.objects.filter(user=self.buyer).order_by('rank').values_list('product_id', flat=True)
+        )
+        self.assertNotIn(self.serum.id, ids)
+        self.assertEqual(ids[0], self.lipstick.id)
+        # Hợp da dầu và nhắc tới vấn đề "mụn" xếp trên sản phẩm cho da khô
+        self.assertLess(ids.index(self.acne_gel.id), ids.index(self.toner.id))
+        self.assertNotIn(self.cream.id, ids)
+
+    def test_serving_is_single_lookup(self):
+        recommender.build()
+        self.lipstick.status = False
+        self.lipstick.save()
+
+        with self.assertNumQueries(1):
+            related = recommender.related_products(self.serum)
+        self.assertEqual(related[0], self.toner)
+
+        with self.assertNumQueries(1):
+            products = recommender.for_user(self.buyer)
+        self.assertNotIn(self.lipstick, products)
+
+        # Sản phẩm chưa có danh sách tính sẵn thì lấy cùng danh mục
+        ProductRecommendation.objects.filter(source=self.cream).delete()
+        self.assertTrue(all(item.category_id == self.cream.category_id for item in recommender.related_products(self.cream)))
+
+    def test_home_shows_for_you_shelf(self):
+        recommender.build()
+        self.client.force_login(self.buyer)
+
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'id="for-you"')
+        self.assertContains(response, reverse('product_detail', args=[self.acne_gel.id]))
+
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse('home')), 'id="for-you"')
+
+def explain_full_scans(queryset):
+    """Các bảng bị quét toàn bộ (type = ALL) trong EXPLAIN của queryset trên MySQL"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return [row['table'] for row in rows if row['type'] == 'ALL']
+
+
+@skipUnless(connection.vendor == 'mysql', "Kế hoạch thực thi chỉ kiểm tra trên MySQL")
+class HotQueryPlanTests(TransactionTestCase):
+    """
+    Các query nóng của view phải dùng index, không được quét toàn bảng.
+    Dữ liệu được sinh sao cho điều kiện lọc có độ chọn lọc giống thật (ít đơn mỗi user,
+    ít deal đang chạy...) rồi ANALYZE để optimizer có thống kê đúng.
+    """
+
+    def seed(self):
+        rng = random.Random(19)
+        now = timezone.now()
+        category = Category.objects.create(name='Chăm sóc da', slug='cham-soc-da')
+
+        Product.objects.bulk_create([
+            Product(
+                category=category,
+                name=f'Sản phẩm {i}',
+                sku=f'PLAN-{i}',
+                price=200000,
+                sale_price=150000 if i % 20 == 0 else 0,
+                image='products/default_product.jpg',
+                stock_quantity=rng.randint(0, 500),
+                status=i % 10 != 0,
+            )
+            for i in range(1000)
+        ])
+        products = list(Product.objects.all())
+
+        users = User.objects.bulk_create([User(username=f'khach{i}') for i in range(200)])
+        users = list(User.objects.filter(username__startswith='khach'))
+        self.user = users[0]
+
+        statuses = [code for code, _ in Order.STATUS_CHOICES]
+        orders = []
+        for i in range(4000):
+            orders.append(Order(
+                order_code=f'PLAN{i:06d}',
+                user=rng.choice(users),
+                fullname='Khách',
+                phone='0900000000',
+                address='Hà Nội',
+                total_money=100000,
+                final_money=100000,
+                order_status=rng.choice(statuses),
+                payment_status=rng.random() < 0.3,
+            ))
+        Order.objects.bulk_create(orders)
+        for offset in range(0, 4000, 100):
+            Order.objects.filter(order_code__gte=f'PLAN{offset:06d}', order_code__lt=f'PLAN{offset + 100:06d}').update(
+                created_at=now - timedelta(days=offset // 4)
+            )
+
+        Review.objects.bulk_create([
+            Review(
+                user=rng.choice(users),
+                product=rng.choice(products),
+                rating=rng.randint(1, 5),
+                comment='Sản phẩm tốt',
+                is_spam=rng.random() < 0.02,
+                is_approved=rng.random() < 0.9,
+            )
+            for _ in range(5000)
+        ])
+
+        deals = []
+        for i in range(600):
+            start = now - timedelta(days=rng.randint(-30, 365))
+            deals.append(WeekendDeal(
+                product=rng.choice(products),
+                deal_price=100000,
+                start_time=start,
+                end_time=start + timedelta(days=2),
+                is_active=i % 4 != 0,
+            ))
+        WeekendDeal.objects.bulk_create(deals)
+
+        tables = ', '.join(model._meta.db_table for model in (Product, Order, Review, WeekendDeal))
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE TABLE {tables}')
+            cursor.fetchall()
+
+    def hot_queries(self):
+        now = timezone.now()
+        product = Product.objects.order_by('id').first()
+        month_start = now - timedelta(days=30)
+        return {
+            # my_orders: tab trạng thái, trang theo con trỏ
+            'my_orders': Order.objects.filter(user=self.user, order_status='pending')
+                .order_by('-created_at', '-id')[:11],
+            # admin_orders: trang đầu theo con trỏ
+            'admin_orders': Order.objects.order_by('-created_at', '-id')[:11],
+            # Thống kê doanh thu theo ngày trong tháng
+            'revenue_by_day': Order.objects.filter(
+                created_at__gte=month_start, created_at__lt=now, payment_status=True
+            ).annotate(bucket=TruncDay('created_at')).values('bucket').annotate(
+                revenue=Sum('final_money'), count=Count('id')
+            ).order_by(),
+            # product_detail: đánh giá đã duyệt, mới nhất trước
+            'product_reviews': Review.objects.filter(product=product, is_approved=True).order_by('-created_at'),
+            # Danh sách review bị đánh dấu spam
+            'spam_reviews': Review.objects.filter(is_spam=True),
+            # Chỉ mục deal: deal đang chạy còn suất
+            'active_deals': WeekendDeal.objects.filter(
+                is_active=True, start_time__lte=now, end_time__gte=now
+            ).filter(has_quota_left()).order_by('-priority', '-created_at'),
+            # Chỉ mục deal: mốc deal sắp bắt đầu
+            'next_deal_start': WeekendDeal.objects.filter(is_active=True, end_time__gt=now, start_time__gt=now),
+            # Cảnh báo kho: sản phẩm đang bán sắp hết hàng
+            'low_stock': Product.objects.filter(status=True, stock_quantity__lte=LOW_STOCK_THRESHOLD),
+            # Trang chủ: sản phẩm đang giảm giá
+            'on_sale': Product.objects.filter(sale_price__gt=0)[:8],
+        }
+
+    def test_hot_queries_use_indexes(self):
+        self.seed()
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(query=name):
+                scans = explain_full_scans(queryset)
+                self.assertEqual(scans, [], f"{name} quét toàn bảng: {scans}\n{queryset.query}")
@@ -8,6 +8,7 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('product/<int:id>/', views.product_detail, name='product_detail'),
+    path('product/<int:id>/reviews/', views.product_reviews, name='product_reviews'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('add-to-cart-ajax/<int:product_id>/', views.add_to_cart_ajax, name='add_to_cart_ajax'),
     path('buy-now/<int:product_id>/', views.buy_now, name='buy_now'),
@@ -20,6 +21,7 @@ urlpatterns = [
 
     path('shop/', views.shop, name='shop'),
     path('search/', views.search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('cart/', views.cart_detail, name='cart_detail'),
 
     path('my-admin/', views.admin_dashboard, name='admin_dashboard'),
@@ -29,6 +31,7 @@ urlpatterns = [
     path('my-admin/product/edit/<int:id>/', views.admin_product_edit, name='admin_product_edit'),
     path('my-admin/customer/<int:id>/', views.admin_customer_detail, name='admin_customer_detail'),
     path('my-admin/reviews/', views.admin_reviews, name='admin_reviews'),
+    path('my-admin/reviews/ai-worker-stats/', views.admin_sentiment_worker_stats, name='admin_sentiment_worker_stats'),
     path('submit-review/<int:product_id>/', views.submit_review, name='submit_review'),
     path('my-admin/inventory/', views.admin_inventory_alerts, name='admin_inventory_alerts'),
     
@@ -53,6 +56,7 @@ urlpatterns = [
   
     path('my-orders/', views.my_orders, name='my_orders'),
     path('order/<int:order_id>/', views.order_detail, name='order_detail'),
+    path('order/<int:order_id>/reorder/', views.reorder, name='reorder'),
     
 
     path('profile/', views.profile, name='profile'),
@@ -3,11 +3,15 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.http import JsonResponse
+from django.urls import reverse
+from django.db import transaction
 from django.db.models import Avg, Q, Sum, Count
+from django.db.models.functions import TruncDay
 from django.utils import timezone
 
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from decimal import Decimal
 import random
 import logging
@@ -20,9 +24,18 @@ from .models import (
 )
 from .forms import RegisterForm, LoginForm, ProductForm
 from .cart import Cart
-from .ai_utils import analyze_sentiment
 from .vnpay import VNPay, get_client_ip
-from .services.review_service import is_review_spam
+from .services import (
+    autocomplete, catalog_cache, cursor_pagination, deal_index, product_rating, recommender, review_feed,
+    sales_rollup, shop_facets, trending, view_counter,
+)
+from .services.inventory_service import get_inventory_snapshot
+from .services.deal_quota import claimed_deal_units
+from .services.stock_service import DealSoldOutError, StockError, reserve_stock, release_stock, sync_order_stock
+from .services.review_service import is_review_spam, refresh_spam_keyword
+from .services.search_index import search_product_ids
+from .services.wishlist_service import add_wishlist_id, get_wishlist_ids, remove_wishlist_id
+from .services.sentiment_worker import enqueue_review, get_stats as get_sentiment_worker_stats
 
 logger = logging.getLogger(__name__)
 
@@ -34,118 +47,182 @@ def is_admin(user):
         return False
 
 
-def get_active_deals():
-    now = timezone.now()
-    return WeekendDeal.objects.filter(
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now
-    ).select_related('product')
-
+def home(request):
+    # Top xu hướng tính sẵn (job update_trending), đổi thứ hạng thì khối trang chủ dựng lại
+    trending_ids = trending.top_product_ids(8)
 
-def attach_deals_to_products(products):
-    deal_prices = {deal.product_id: deal for deal in get_active_deals()}
-    for product in products:
-        product.active_deal = deal_prices.get(product.id)
-    return products
+    def render_catalog():
+        offer_products = list(Product.objects.select_related('category').order_by('-id')[:8])
+        
+        products_by_id = Product.objects.select_related('category').in_bulk(trending_ids)
+        trending_products = [products_by_id[product_id] for product_id in trending_ids if product_id in products_by_id]
+        if not trending_products:
+            # Chưa có dữ liệu bán hàng: tạm dùng sản phẩm đang giảm giá
+            trending_products = list(Product.objects.select_related('category').filter(sale_price__gt=0)[:8])
+        if not trending_products:
+            trending_products = list(Product.objects.select_related('category')[:8])
+        
+        # Điểm trung bình lưu sẵn trên Product, sắp xếp theo index product_rating_idx
+        top_rated_products = list(
+            Product.objects.select_related('category').filter(rating_count__gt=0)
+            .order_by(*SHOP_SORTS['rating'])[:8]
+        )
+        
+        # Lượt xem do view_counter ghi dồn, xếp hạng theo index product_views_idx
+        most_viewed_products = list(
+            Product.objects.select_related('category').filter(views__gt=0).order_by('-views', '-id')[:8]
+        )
+        
+        weekend_deals = deal_index.get_active_deals()[:5]
+        
+        offer_products = deal_index.attach_deals(offer_products)
+        trending_products = deal_index.attach_deals(trending_products)
+        top_rated_products = deal_index.attach_deals(top_rated_products)
+        most_viewed_products = deal_index.attach_deals(most_viewed_products)
+
+        return render_to_string('app/includes/home_catalog.html', {
+            'offer_products': offer_products,
+            'trending_products': trending_products,
+            'top_rated_products': top_rated_products,
+            'most_viewed_products': most_viewed_products,
+            'weekend_deals': weekend_deals,
+        })
 
+    # Khối sản phẩm dùng chung cho mọi người dùng, nút yêu thích điền sau theo từng user
+    catalog_html = catalog_cache.cached_fragment('home', tuple(trending_ids), render_catalog)
+    wishlist_ids = get_wishlist_ids(request.user)
 
-def home(request):
-    offer_products = list(Product.objects.all().order_by('-id')[:8])
-    
-    trending_products = list(Product.objects.filter(sale_price__gt=0)[:8])
-    if not trending_products:
-        trending_products = list(Product.objects.all()[:8])
-    
-    now = timezone.now()
-    weekend_deals = WeekendDeal.objects.filter(
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now
-    ).select_related('product').order_by('-priority', '-created_at')[:5]
-    
-    offer_products = attach_deals_to_products(offer_products)
-    trending_products = attach_deals_to_products(trending_products)
+    # Gợi ý riêng theo loại da / lịch sử mua (tính sẵn bởi build_recommendations), không cache chung
+    for_you_products = recommender.for_user(request.user)
+    for_you_html = ''
+    if for_you_products:
+        for_you_html = render_to_string('app/includes/for_you.html', {
+            'for_you_products': deal_index.attach_deals(for_you_products),
+        })
 
     context = {
-        'offer_products': offer_products,
-        'trending_products': trending_products,
-        'weekend_deals': weekend_deals,
+        'catalog_html': catalog_cache.stitch_wishlist(catalog_html, wishlist_ids),
+        'for_you_html': catalog_cache.stitch_wishlist(for_you_html, wishlist_ids),
     }
     return render(request, 'app/home.html', context)
 
 
+SHOP_SORTS = {
+    'newest': ('-id',),
+    'bestseller': ('-sold_quantity', '-id'),
+    'price_asc': ('effective_price', 'id'),
+    'price_desc': ('-effective_price', '-id'),
+    'rating': ('-rating_avg', '-rating_count', '-id'),
+}
+
+
 def shop(request):
-    product_list = Product.objects.all().order_by('-id')
-    categories = Category.objects.all()
-    
-    active_category = request.GET.get('category')
-    if active_category:
-        product_list = product_list.filter(category_id=active_category)
-    
-    active_brand = request.GET.get('brand')
-    if active_brand:
-        product_list = product_list.filter(brand_id=active_brand)
-    
-    sidebar_data = []
-    for category in categories:
-        brands = Brand.objects.filter(product__category=category).distinct()
-        sidebar_data.append({
-            'category': category,
-            'brands': brands
+    def render_catalog():
+        filters = shop_facets.ShopFilters(request.GET)
+        base_products = Product.objects.select_related('category')
+        product_list = filters.apply(base_products)
+        facets = shop_facets.build_facets(filters, base_products)
+        
+        ordering = SHOP_SORTS.get(request.GET.get('sort'), SHOP_SORTS['newest'])
+        page_obj = cursor_pagination.paginate(
+            product_list, request.GET.get('cursor'), per_page=12, ordering=ordering, with_count=True
+        )
+        
+        page_obj = deal_index.attach_deals(page_obj)
+
+        # Query string giữ bộ lọc cho link sắp xếp / phân trang
+        base_query = filters.url(sort=None, cursor=None)[1:]
+        page_query = filters.url(cursor=None)[1:]
+
+        return render_to_string('app/includes/shop_catalog.html', {
+            'page_obj': page_obj,
+            'facets': facets,
+            'filters': filters,
+            'sort': request.GET.get('sort', ''),
+            'base_query': base_query + '&' if base_query else '',
+            'page_query': page_query + '&' if page_query else '',
+            'clear_url': filters.url(category=None, brand=None, price=None, skin=None, rating=None, deal=None, cursor=None),
         })
-    
-    paginator = Paginator(product_list, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    page_obj = attach_deals_to_products(page_obj)
 
+    # Mỗi tổ hợp bộ lọc / sắp xếp / trang là một khối cache riêng
+    params = tuple(sorted((key, tuple(values)) for key, values in request.GET.lists()))
+    catalog_html = catalog_cache.cached_fragment('shop', params, render_catalog)
     context = {
-        'page_obj': page_obj,
-        'categories': categories,
-        'sidebar_data': sidebar_data,
-        'active_category': active_category,
-        'active_brand': active_brand
+        'catalog_html': catalog_cache.stitch_wishlist(catalog_html, get_wishlist_ids(request.user)),
     }
     return render(request, 'app/shop.html', context)
 
 
 def product_detail(request, id):
     product = get_object_or_404(Product, id=id)
+    view_counter.record_view(product.id)
     
-    related_products = Product.objects.filter(category=product.category).exclude(id=id)[:4]
-    related_products = attach_deals_to_products(related_products)
+    # Danh sách tính sẵn (loại da, thành phần, mua chung), sản phẩm mới thì lấy cùng danh mục
+    related_products = recommender.related_products(product)
+    related_products = deal_index.attach_deals(related_products)
     
-    reviews = Review.objects.filter(product=product, is_approved=True).order_by('-created_at')
+    reviews = review_feed.get_feed_page(product.id)
     
-    now = timezone.now()
-    active_deal = WeekendDeal.objects.filter(
-        product=product,
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now
-    ).first()
+    active_deal = deal_index.get_active_deal(product.id)
     
     context = {
         'product': product,
         'related_products': related_products,
         'reviews': reviews,
+        'rating_summary': review_feed.get_rating_summary(product.id),
         'active_deal': active_deal,
     }
     return render(request, 'app/product_detail.html', context)
 
 
+def product_reviews(request, id):
+    """Trang đánh giá tiếp theo cho nút "Xem thêm" (JSON)"""
+    page = review_feed.get_feed_page(id, request.GET.get('cursor'))
+    return JsonResponse({
+        'reviews': [review_feed.serialize_review(review) for review in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
 def search(request):
-    searched = request.GET.get('searched', '')
-    products = Product.objects.filter(name__icontains=searched) if searched else []
+    searched = request.GET.get('searched', '').strip()
+    page_obj = None
+    
+    if searched:
+        product_ids = search_product_ids(searched)
+        if product_ids is None:
+            # Chỉ mục chưa được dựng: tìm theo tên như cũ
+            product_ids = list(
+                Product.objects.filter(name__icontains=searched, status=True)
+                .order_by('-id').values_list('id', flat=True)
+            )
+        paginator = Paginator(product_ids, 20)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        # status=True: sản phẩm ngừng bán bằng update() hàng loạt có thể còn trong chỉ mục
+        products_by_id = Product.objects.select_related('category').filter(status=True).in_bulk(list(page_obj.object_list))
+        page_obj.object_list = [products_by_id[pid] for pid in page_obj.object_list if pid in products_by_id]
+        deal_index.attach_deals(page_obj.object_list)
     
     return render(request, 'app/search.html', {
         'searched': searched,
-        'products': products
+        'products': page_obj.object_list if page_obj else [],
+        'page_obj': page_obj,
     })
 
 
+def search_suggest(request):
+    """Gợi ý khi gõ ở ô tìm kiếm trên header (JSON)"""
+    query = request.GET.get('q', '').strip()
+    suggestions = []
+    for item in autocomplete.suggest(query[:100]) if query else []:
+        if item['type'] == 'product':
+            url = reverse('product_detail', args=[item['id']])
+        else:
+            url = f"{reverse('shop')}?{item['type']}={item['id']}"
+        suggestions.append({'type': item['type'], 'label': item['label'], 'url': url})
+    return JsonResponse({'query': query, 'suggestions': suggestions})
+
+
 def register(request):
     if request.method == 'POST':
         form = RegisterForm(request.POST)
@@ -178,7 +255,16 @@ def login_view(request):
             user = authenticate(request, username=username, password=password)
             
             if user is not None:
+                # Giỏ hàng lúc chưa đăng nhập được gộp vào giỏ của tài khoản
+                guest_cart = Cart(request)
+                guest_lines = dict(guest_cart.cart)
+                if guest_lines:
+                    guest_cart.clear()
+
                 login(request, user)
+
+                if guest_lines:
+                    Cart(request).merge(guest_lines)
                 
                 next_url = request.GET.get('next')
                 if next_url:
@@ -210,10 +296,12 @@ def logout_view(request):
 def add_to_cart(request, product_id):
     cart = Cart(request)
     product = get_object_or_404(Product, id=product_id)
-    quantity = int(request.GET.get('quantity', 1))
+    quantity = max(1, int(request.GET.get('quantity', 1)))
     
-    for _ in range(quantity):
-        cart.add(product=product)
+    try:
+        cart.add(product=product, quantity=quantity)
+    except StockError as e:
+        messages.error(request, f"✗ {e}")
     
     return redirect('cart_detail')
 
@@ -221,10 +309,16 @@ def add_to_cart(request, product_id):
 def add_to_cart_ajax(request, product_id):
     cart = Cart(request)
     product = get_object_or_404(Product, id=product_id)
-    quantity = int(request.GET.get('quantity', 1))
+    quantity = max(1, int(request.GET.get('quantity', 1)))
     
-    for _ in range(quantity):
-        cart.add(product=product)
+    try:
+        cart.add(product=product, quantity=quantity)
+    except StockError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e),
+            'cart_count': len(cart),
+        })
     
     return JsonResponse({
         'success': True,
@@ -236,15 +330,12 @@ def add_to_cart_ajax(request, product_id):
 
 def buy_now(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    quantity = int(request.GET.get('quantity', 1))
+    quantity = max(1, int(request.GET.get('quantity', 1)))
     
-    now = timezone.now()
-    deal = WeekendDeal.objects.filter(
-        product=product,
-        is_active=True,
-        start_time__lte=now,
-        end_time__gte=now
-    ).first()
+    # Deal hết suất thì mua với giá thường
+    deal = deal_index.get_active_deal(product.id)
+    if deal and deal.max_quantity and deal.sold_quantity + quantity > deal.max_quantity:
+        deal = None
     
     if deal:
         price = deal.deal_price
@@ -259,7 +350,8 @@ def buy_now(request, product_id):
         'product_image': product.image.url if product.image else '',
         'quantity': quantity,
         'price': str(price),
-        'total': str(price * quantity)
+        'total': str(price * quantity),
+        'deal_id': deal.id if deal else None,
     }
     
     return redirect('checkout')
@@ -288,9 +380,7 @@ def remove_from_cart(request, product_id):
 def wishlist(request):
     wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product', 'product__category')
     
-    deal_prices = {deal.product_id: deal for deal in get_active_deals()}
-    for item in wishlist_items:
-        item.product.active_deal = deal_prices.get(item.product.id)
+    deal_index.attach_deals([item.product for item in wishlist_items])
     
     return render(request, 'app/wishlist.html', {'wishlist_items': wishlist_items})
 
@@ -308,19 +398,21 @@ def toggle_wishlist_ajax(request, product_id):
     
     if wishlist_item:
         wishlist_item.delete()
+        wishlist_ids = remove_wishlist_id(request.user, product.id)
         return JsonResponse({
             'success': True,
             'action': 'removed',
             'message': f'Đã xóa "{product.name}" khỏi danh sách yêu thích!',
-            'wishlist_count': Wishlist.objects.filter(user=request.user).count()
+            'wishlist_count': len(wishlist_ids)
         })
     else:
         Wishlist.objects.create(user=request.user, product=product)
+        wishlist_ids = add_wishlist_id(request.user, product.id)
         return JsonResponse({
             'success': True,
             'action': 'added',
             'message': f'Đã thêm "{product.name}" vào danh sách yêu thích!',
-            'wishlist_count': Wishlist.objects.filter(user=request.user).count()
+            'wishlist_count': len(wishlist_ids)
         })
 
 
@@ -328,6 +420,7 @@ def toggle_wishlist_ajax(request, product_id):
 def remove_from_wishlist(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     Wishlist.objects.filter(user=request.user, product=product).delete()
+    remove_wishlist_id(request.user, product.id)
     messages.success(request, f'Đã xóa "{product.name}" khỏi danh sách yêu thích!')
     return redirect('wishlist')
 
@@ -362,44 +455,65 @@ def checkout(request):
         order_code = f"ORD-{random.randint(100000, 999999)}"
         
         if is_buy_now:
-            total_price = Decimal(buy_now_item['total'])
+            order_lines = [{
+                'product_id': buy_now_item['product_id'],
+                'quantity': buy_now_item['quantity'],
+                'price': Decimal(buy_now_item['price']),
+                'deal_id': buy_now_item.get('deal_id'),
+            }]
         else:
-            total_price = cart.get_total_price()
-
-        new_order = Order.objects.create(
-            order_code=order_code,
-            user=request.user,
-            fullname=fullname,
-            phone=phone,
-            address=address_text,
-            total_money=total_price,
-            shipping_fee=0,
-            final_money=total_price,
-            payment_method=request.POST.get('payment_method'),
-            note=request.POST.get('note')
-        )
+            order_lines = cart.get_order_lines()
+            if not order_lines:
+                # Tóm tắt trên header đã cũ, giỏ thật đang trống
+                cart.save()
+                messages.warning(request, "Giỏ hàng của bạn đang trống!")
+                return redirect('shop')
+        # Số tiền đơn (VNPay thu đúng số này) tính từ chính các dòng hàng được giữ tồn kho
+        total_price = sum((line['price'] * line['quantity'] for line in order_lines), Decimal('0'))
+
+        # Giữ suất deal trước (UPDATE có điều kiện, không khóa lâu), sau đó tạo đơn + giữ hàng
+        # trong cùng một transaction; thiếu hàng thì rollback cả đơn và trả lại suất deal
+        try:
+            with claimed_deal_units(order_lines), transaction.atomic():
+                new_order = Order.objects.create(
+                    order_code=order_code,
+                    user=request.user,
+                    fullname=fullname,
+                    phone=phone,
+                    address=address_text,
+                    total_money=total_price,
+                    shipping_fee=0,
+                    final_money=total_price,
+                    payment_method=request.POST.get('payment_method'),
+                    note=request.POST.get('note')
+                )
+                reserve_stock(new_order, order_lines)
+        except DealSoldOutError as e:
+            messages.error(request, f"✗ {e}")
+            # Deal hết suất: tính lại giá thường cho dòng hàng đang áp deal
+            if is_buy_now:
+                del request.session['buy_now_item']
+                return redirect('product_detail', id=buy_now_item['product_id'])
+            cart.reprice_deal(e.deal_id)
+            return redirect('cart_detail')
+        except StockError as e:
+            messages.error(request, f"✗ {e}")
+            return redirect('checkout' if is_buy_now else 'cart_detail')
+        except ValueError:
+            # Số lượng <= 0 (session cũ / request sửa tay): không tạo đơn
+            messages.error(request, "✗ Số lượng sản phẩm không hợp lệ")
+            if is_buy_now:
+                del request.session['buy_now_item']
+                return redirect('product_detail', id=buy_now_item['product_id'])
+            return redirect('cart_detail')
         
         if is_buy_now:
-            product = get_object_or_404(Product, id=buy_now_item['product_id'])
-            OrderItem.objects.create(
-                order=new_order,
-                product=product,
-                product_name=buy_now_item['product_name'],
-                price=Decimal(buy_now_item['price']),
-                quantity=buy_now_item['quantity']
-            )
             del request.session['buy_now_item']
         else:
-            for item in cart:
-                OrderItem.objects.create(
-                    order=new_order,
-                    product=item['product'],
-                    product_name=item['product'].name,
-                    price=item['price'],
-                    quantity=item['quantity']
-                )
             cart.clear()
         
+        sales_rollup.refresh_order_rollup(new_order)
+        
         if request.POST.get('payment_method') == 'VNPAY':
             request.session['pending_order_id'] = new_order.id
             return redirect('vnpay_payment', order_id=new_order.id)
@@ -473,6 +587,7 @@ def vnpay_return(request):
                 order.payment_status = True
                 order.order_status = 'confirmed'
                 order.save()
+                sales_rollup.refresh_order_rollup(order)
                 
                 messages.success(
                     request,
@@ -507,16 +622,27 @@ def my_orders(request):
     if filter_status != 'all':
         orders = orders.filter(order_status=filter_status)
     
+    orders_page = cursor_pagination.paginate(
+        orders, request.GET.get('cursor'), per_page=10, ordering=('-created_at', '-id')
+    )
+    
     if request.method == 'POST':
         action = request.POST.get('action')
         order_id = request.POST.get('order_id')
         
         if action == 'cancel':
             try:
-                order = Order.objects.get(id=order_id, user=request.user)
-                if order.order_status in ['pending', 'confirmed']:
-                    order.order_status = 'cancelled'
-                    order.save()
+                with transaction.atomic():
+                    order = Order.objects.select_for_update().get(id=order_id, user=request.user)
+                    can_cancel = order.order_status in ['pending', 'confirmed']
+                    if can_cancel:
+                        previous_status = order.order_status
+                        order.order_status = 'cancelled'
+                        order.save()
+                        trending.order_status_changed(order, previous_status)
+                        release_stock(order)
+                if can_cancel:
+                    sales_rollup.refresh_order_rollup(order)
                     messages.success(request, f"✓ Đã hủy đơn hàng #{order.order_code}")
                 else:
                     messages.error(request, "✗ Không thể hủy đơn hàng ở trạng thái này!")
@@ -526,7 +652,7 @@ def my_orders(request):
         return redirect('my_orders')
     
     context = {
-        'orders': orders,
+        'orders': orders_page,
         'filter_status': filter_status,
         'pending_count': pending_count,
         'confirmed_count': confirmed_count,
@@ -549,6 +675,34 @@ def order_detail(request, order_id):
     })
 
 
+@login_required(login_url='login')
+def reorder(request, order_id):
+    """Mua lại: đưa các sản phẩm của đơn cũ vào giỏ với giá hiện tại"""
+    order = get_object_or_404(Order, id=order_id, user=request.user)
+    if request.method != 'POST':
+        return redirect('order_detail', order_id=order.id)
+
+    cart = Cart(request)
+    ordered = {}
+    for item in order.items.all():
+        if item.product_id:
+            ordered[item.product_id] = ordered.get(item.product_id, 0) + item.quantity
+
+    products = Product.objects.in_bulk(list(ordered))
+    errors = cart.set_many([
+        (product, cart.cart.get(str(product.id), {}).get('quantity', 0) + ordered[product.id])
+        for product in products.values()
+    ])
+
+    for e in errors:
+        messages.warning(request, f"✗ {e}")
+    if len(errors) < len(products):
+        messages.success(request, f"Đã thêm sản phẩm của đơn {order.order_code} vào giỏ hàng")
+    elif not products:
+        messages.warning(request, "Các sản phẩm của đơn này không còn bán")
+    return redirect('cart_detail')
+
+
 @login_required(login_url='login')
 def profile(request):
     profile, created = CustomerProfile.objects.get_or_create(user=request.user)
@@ -605,32 +759,30 @@ def submit_review(request, product_id):
             logger.warning(f"Empty comment from user {request.user.username}")
             return redirect('product_detail', id=product_id)
 
-        try:
-            ai_label, ai_score = analyze_sentiment(text_comment)
-            logger.info(f"✓ AI Result - Label: {ai_label}, Score: {ai_score}")
-        except Exception as e:
-            logger.error(f"✗ AI Error: {e}", exc_info=True)
-            ai_label, ai_score = 'NEU', 50.0
-        
         spam_result = is_review_spam(text_comment, int(rating) if rating else 5)
         logger.info(f"Spam check: {spam_result}")
 
+        # Sentiment/confidence_score được worker AI ghi lại sau, request trả về ngay
         review = Review.objects.create(
             user=request.user,
             product=product,
             comment=text_comment,
             rating=rating,
-            sentiment=ai_label,
-            confidence_score=ai_score,
+            sentiment='SPAM' if spam_result['is_spam'] else 'NEU',
+            confidence_score=0.0,
             is_approved=True,
             is_spam=spam_result['is_spam'],
             spam_reason=spam_result['reason'] if spam_result['is_spam'] else ''
         )
         
+        product_rating.review_created(review)
+        review_feed.invalidate_rating_summary(product.id)
+        
         if spam_result['is_spam']:
-            review.sentiment = 'SPAM'
-            review.save()
-            logger.info(f"✓ Updated to SPAM - ID: {review.id}")
+            logger.info(f"✓ Saved as SPAM - ID: {review.id}")
+        else:
+            transaction.on_commit(lambda: enqueue_review(review))
+            logger.info(f"✓ Queued for AI sentiment - ID: {review.id}")
         
         logger.info(f"========== END SUBMIT REVIEW ==========")
         
@@ -641,11 +793,14 @@ def submit_review(request, product_id):
 @user_passes_test(is_admin, login_url='home')
 def admin_dashboard(request):
     customer_count = CustomerProfile.objects.count()
-    product_count = Product.objects.count()
     order_count = Order.objects.count()
     
-    low_stock_count = Product.objects.filter(stock_quantity__lte=5, status=True).count()
-    dead_stock_count = Product.objects.filter(stock_quantity__gt=20, status=True).count()
+    product_count = Product.objects.count()
+    
+    # Dùng chung snapshot với trang cảnh báo tồn kho để số liệu khớp nhau
+    inventory_snapshot = get_inventory_snapshot()
+    low_stock_count = inventory_snapshot['total_low']
+    dead_stock_count = inventory_snapshot['total_dead']
 
     filter_type = request.GET.get('filter', 'month')
     selected_year = int(request.GET.get('year', timezone.now().year))
@@ -681,76 +836,72 @@ def admin_dashboard(request):
 
     period_orders = Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
     
-    total_revenue = period_orders.filter(payment_status=True).aggregate(
-        total=Sum('final_money')
-    )['total'] or 0
-    
-    period_order_count = period_orders.count()
-    completed_orders = period_orders.filter(order_status='completed').count()
-    pending_orders = period_orders.filter(order_status='pending').count()
-    cancelled_orders = period_orders.filter(order_status='cancelled').count()
+    if filter_type == 'month':
+        # Gộp doanh thu + các bộ đếm trạng thái vào một câu aggregate
+        period_stats = period_orders.aggregate(
+            total_revenue=Sum('final_money', filter=Q(payment_status=True)),
+            period_order_count=Count('id'),
+            completed_orders=Count('id', filter=Q(order_status='completed')),
+            pending_orders=Count('id', filter=Q(order_status='pending')),
+            cancelled_orders=Count('id', filter=Q(order_status='cancelled')),
+        )
+
+        # Biểu đồ: một câu GROUP BY theo ngày
+        buckets = {}
+        for row in period_orders.filter(payment_status=True).annotate(
+            bucket=TruncDay('created_at')
+        ).values('bucket').annotate(
+            revenue=Sum('final_money'), count=Count('id')
+        ).order_by():
+            buckets[timezone.localtime(row['bucket']).date()] = row
+
+        top_products = OrderItem.objects.filter(
+            order__created_at__gte=start_date,
+            order__created_at__lt=end_date,
+            order__payment_status=True
+        ).values('product__name').annotate(
+            total_sold=Sum('quantity'),
+            total_revenue=sales_rollup.item_revenue()
+        ).order_by('-total_sold')[:5]
+    else:
+        # Quý/năm: đọc bảng tổng hợp theo ngày thay vì quét toàn bộ đơn
+        start_day = timezone.localtime(start_date).date()
+        end_day = timezone.localtime(end_date).date()
+        period_stats = sales_rollup.period_summary(start_day, end_day)
+        buckets = sales_rollup.monthly_series(start_day, end_day)
+        top_products = sales_rollup.top_products(start_day, end_day)
+
+    total_revenue = period_stats['total_revenue'] or 0
+    period_order_count = period_stats['period_order_count']
+    completed_orders = period_stats['completed_orders']
+    pending_orders = period_stats['pending_orders']
+    cancelled_orders = period_stats['cancelled_orders']
     
     new_customers = CustomerProfile.objects.filter(
         user__date_joined__gte=start_date,
         user__date_joined__lt=end_date
     ).count()
 
-    paid_orders = period_orders.filter(payment_status=True)
-    chart_labels = []
-    chart_revenue = []
-    chart_orders = []
-    
     if filter_type == 'month':
         from calendar import monthrange
         days_in_month = monthrange(selected_year, selected_month)[1]
-        for day in range(1, days_in_month + 1):
-            day_start = timezone.make_aware(datetime(selected_year, selected_month, day, 0, 0, 0))
-            day_end = timezone.make_aware(datetime(selected_year, selected_month, day, 23, 59, 59))
-            day_orders = paid_orders.filter(created_at__gte=day_start, created_at__lte=day_end)
-            revenue = day_orders.aggregate(total=Sum('final_money'))['total'] or 0
-            count = day_orders.count()
-            chart_labels.append(f"{day}/{selected_month}")
-            chart_revenue.append(float(revenue))
-            chart_orders.append(count)
-            
+        keys = [date(selected_year, selected_month, day) for day in range(1, days_in_month + 1)]
+        chart_labels = [f"{day.day}/{selected_month}" for day in keys]
     elif filter_type == 'quarter':
         quarter_start_month = (selected_quarter - 1) * 3 + 1
-        for month_offset in range(3):
-            m = quarter_start_month + month_offset
-            month_start = timezone.make_aware(datetime(selected_year, m, 1, 0, 0, 0))
-            if m == 12:
-                month_end = timezone.make_aware(datetime(selected_year + 1, 1, 1, 0, 0, 0))
-            else:
-                month_end = timezone.make_aware(datetime(selected_year, m + 1, 1, 0, 0, 0))
-            month_orders = paid_orders.filter(created_at__gte=month_start, created_at__lt=month_end)
-            revenue = month_orders.aggregate(total=Sum('final_money'))['total'] or 0
-            count = month_orders.count()
-            chart_labels.append(f"Tháng {m}")
-            chart_revenue.append(float(revenue))
-            chart_orders.append(count)
-            
+        keys = [(selected_year, m) for m in range(quarter_start_month, quarter_start_month + 3)]
+        chart_labels = [f"Tháng {m}" for _, m in keys]
     else:
-        for m in range(1, 13):
-            month_start = timezone.make_aware(datetime(selected_year, m, 1, 0, 0, 0))
-            if m == 12:
-                month_end = timezone.make_aware(datetime(selected_year + 1, 1, 1, 0, 0, 0))
-            else:
-                month_end = timezone.make_aware(datetime(selected_year, m + 1, 1, 0, 0, 0))
-            month_orders = paid_orders.filter(created_at__gte=month_start, created_at__lt=month_end)
-            revenue = month_orders.aggregate(total=Sum('final_money'))['total'] or 0
-            count = month_orders.count()
-            chart_labels.append(f"T{m}")
-            chart_revenue.append(float(revenue))
-            chart_orders.append(count)
-
-    top_products = OrderItem.objects.filter(
-        order__created_at__gte=start_date,
-        order__created_at__lt=end_date,
-        order__payment_status=True
-    ).values('product__name').annotate(
-        total_sold=Sum('quantity'),
-        total_revenue=Sum('price')
-    ).order_by('-total_sold')[:5]
+        keys = [(selected_year, m) for m in range(1, 13)]
+        chart_labels = [f"T{m}" for _, m in keys]
+
+    # Ngày/tháng không có đơn thì điền 0
+    chart_revenue = []
+    chart_orders = []
+    for key in keys:
+        row = buckets.get(key)
+        chart_revenue.append(float(row['revenue'] or 0) if row else 0.0)
+        chart_orders.append(row['count'] if row else 0)
 
     years = list(range(2020, now.year + 1))
     months = list(range(1, 13))
@@ -806,13 +957,13 @@ def admin_customer_detail(request, id):
 @login_required(login_url='login')
 @user_passes_test(is_admin, login_url='home')
 def admin_products(request):
-    products_list = Product.objects.all().order_by('-id')
     categories = Category.objects.all()
     brands = Brand.objects.all()
     
-    paginator = Paginator(products_list, 10)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    products = cursor_pagination.paginate(
+        Product.objects.select_related('category', 'brand'), request.GET.get('cursor'),
+        per_page=10, ordering=('-id',), with_count=True
+    )
     
     return render(request, 'app/my_admin/products.html', {
         'products': products,
@@ -987,7 +1138,7 @@ def admin_orders(request):
     status_filter = request.GET.get('status', '')
     search_query = request.GET.get('search', '')
 
-    orders_list = Order.objects.all().order_by('-created_at')
+    orders_list = Order.objects.all()
 
     if status_filter and status_filter != 'all':
         orders_list = orders_list.filter(order_status=status_filter)
@@ -998,9 +1149,9 @@ def admin_orders(request):
             Q(fullname__icontains=search_query)
         )
 
-    paginator = Paginator(orders_list, 10)
-    page_number = request.GET.get('page')
-    orders = paginator.get_page(page_number)
+    orders = cursor_pagination.paginate(
+        orders_list, request.GET.get('cursor'), per_page=10, ordering=('-created_at', '-id'), with_count=True
+    )
 
     return render(request, 'app/my_admin/orders.html', {
         'orders': orders,
@@ -1031,10 +1182,21 @@ def update_order_status(request, id):
         new_status = request.POST.get('status')
         
         if new_status:
-            order.order_status = new_status
-            if new_status == 'completed':
-                order.payment_status = True
-            order.save()
+            try:
+                with transaction.atomic():
+                    order = Order.objects.select_for_update().get(id=id)
+                    previous_status = order.order_status
+                    order.order_status = new_status
+                    if new_status == 'completed':
+                        order.payment_status = True
+                    order.save()
+                    trending.order_status_changed(order, previous_status)
+                    # Hủy / trả hàng thì hoàn kho, mở lại đơn đã hoàn kho thì giữ hàng lại
+                    sync_order_stock(order)
+            except StockError as e:
+                messages.error(request, f"✗ Không thể mở lại đơn {order.order_code}: {e}")
+                return redirect('admin_order_detail', id=id)
+            sales_rollup.refresh_order_rollup(order)
             messages.success(request, f"Cập nhật trạng thái đơn {order.order_code} thành công!")
         else:
             messages.error(request, "Vui lòng chọn trạng thái hợp lệ.")
@@ -1045,90 +1207,56 @@ def update_order_status(request, id):
 @login_required(login_url='login')
 @user_passes_test(is_admin, login_url='home')
 def admin_reviews(request):
-    reviews = Review.objects.all().order_by('-created_at')
-    
-    for review in reviews:
-        is_spam_flag = getattr(review, 'is_spam', False)
-        if not is_spam_flag and review.comment:
-            spam_result = is_review_spam(review.comment, review.rating)
-            if spam_result['is_spam']:
-                review.is_spam = True
-                review.spam_reason = spam_result['reason']
-                review.sentiment = 'SPAM'
-                review.save()
-    
-    valid_reviews = reviews.exclude(is_spam=True)
-    total_reviews = valid_reviews.count()
-    spam_count = reviews.filter(is_spam=True).count()
+    # Cờ spam do job scan_spam_reviews chạy nền cập nhật, trang này chỉ đọc
+    reviews_list = Review.objects.select_related('product', 'user').order_by('-created_at', '-id')
+    
+    stats = Review.objects.aggregate(
+        total_reviews=Count('id', filter=Q(is_spam=False)),
+        spam_count=Count('id', filter=Q(is_spam=True)),
+        pos_count=Count('id', filter=Q(is_spam=False, sentiment='POS')),
+        neg_count=Count('id', filter=Q(is_spam=False, sentiment='NEG')),
+        avg_rating=Avg('rating', filter=Q(is_spam=False)),
+    )
+    total_reviews = stats['total_reviews']
     
     pos_percent = neg_percent = 0
     avg_rating = 0.0
     
     if total_reviews > 0:
-        pos_count = sum(1 for r in valid_reviews if getattr(r, 'sentiment', 'NEU') == 'POS')
-        neg_count = sum(1 for r in valid_reviews if getattr(r, 'sentiment', 'NEU') == 'NEG')
-        
-        pos_percent = round((pos_count / total_reviews) * 100)
-        neg_percent = round((neg_count / total_reviews) * 100)
-        avg_rating = round(valid_reviews.aggregate(Avg('rating'))['rating__avg'] or 0, 1)
+        pos_percent = round((stats['pos_count'] / total_reviews) * 100)
+        neg_percent = round((stats['neg_count'] / total_reviews) * 100)
+        avg_rating = round(stats['avg_rating'] or 0, 1)
+    
+    paginator = Paginator(reviews_list, 20)
+    page_number = request.GET.get('page')
+    reviews = paginator.get_page(page_number)
     
     return render(request, 'app/my_admin/reviews.html', {
         'reviews': reviews,
         'total_reviews': total_reviews,
-        'spam_count': spam_count,
+        'spam_count': stats['spam_count'],
         'pos_percent': pos_percent,
         'neg_percent': neg_percent,
         'avg_rating': avg_rating
     })
 
 
+@login_required(login_url='login')
+@user_passes_test(is_admin, login_url='home')
+def admin_sentiment_worker_stats(request):
+    return JsonResponse(get_sentiment_worker_stats())
+
+
 @login_required(login_url='login')
 @user_passes_test(is_admin, login_url='home')
 def admin_inventory_alerts(request):
-    LOW_STOCK_THRESHOLD = 5
-    DEAD_STOCK_DAYS = 30
-    HIGH_STOCK_THRESHOLD = 20
-
-    alerts = []
-    products = Product.objects.filter(status=True)
-    time_threshold = timezone.now() - timedelta(days=DEAD_STOCK_DAYS)
-
-    for p in products:
-        if p.stock_quantity <= LOW_STOCK_THRESHOLD:
-            alerts.append({
-                'product': p,
-                'type': 'LOW_STOCK',
-                'level': 'critical',
-                'message': 'Sắp hết hàng',
-                'suggestion': 'Nhập thêm hàng ngay',
-                'icon': 'bx-import',
-                'css_class': 'restock'
-            })
-            continue
-
-        recent_sales = OrderItem.objects.filter(
-            product=p,
-            order__created_at__gte=time_threshold
-        ).aggregate(total_sold=Sum('quantity'))['total_sold'] or 0
-
-        if p.stock_quantity > HIGH_STOCK_THRESHOLD and recent_sales == 0:
-            alerts.append({
-                'product': p,
-                'type': 'DEAD_STOCK',
-                'level': 'warning',
-                'message': f'Tồn {p.stock_quantity} nhưng không bán được trong {DEAD_STOCK_DAYS} ngày',
-                'suggestion': 'Giảm giá / Flash Sale',
-                'icon': 'bxs-offer',
-                'css_class': 'discount'
-            })
-
-    total_low = sum(1 for a in alerts if a['type'] == 'LOW_STOCK')
-    total_dead = sum(1 for a in alerts if a['type'] == 'DEAD_STOCK')
+    snapshot = get_inventory_snapshot(refresh=request.GET.get('refresh') == '1')
 
     return render(request, 'app/my_admin/inventory_alerts.html', {
-        'alerts': alerts,
-        'total_low': total_low,
-        'total_dead': total_dead,
+        'alerts': snapshot['alerts'],
+        'total_low': snapshot['total_low'],
+        'total_dead': snapshot['total_dead'],
+        'generated_at': snapshot['generated_at'],
     })
 
 
@@ -1166,7 +1294,7 @@ def admin_spam_keywords_create(request):
         
         if keyword:
             try:
-                SpamKeyword.objects.create(
+                spam_keyword = SpamKeyword.objects.create(
                     keyword=keyword,
                     category=category,
                     severity=severity,
@@ -1175,8 +1303,7 @@ def admin_spam_keywords_create(request):
                 )
                 messages.success(request, f'✓ Đã thêm keyword "{keyword}"')
                 
-                from django.core.cache import cache
-                cache.delete('spam_keywords_active')
+                refresh_spam_keyword(keyword=spam_keyword)
             except Exception as e:
                 messages.error(request, f'✗ Lỗi: {str(e)}')
         else:
@@ -1191,6 +1318,7 @@ def admin_spam_keywords_edit(request, keyword_id):
     keyword = get_object_or_404(SpamKeyword, id=keyword_id)
     
     if request.method == 'POST':
+        old_keyword = keyword.keyword
         keyword.keyword = request.POST.get('keyword', keyword.keyword).strip()
         keyword.category = request.POST.get('category', keyword.category)
         keyword.severity = int(request.POST.get('severity', keyword.severity))
@@ -1201,8 +1329,7 @@ def admin_spam_keywords_edit(request, keyword_id):
             keyword.save()
             messages.success(request, f'✓ Đã cập nhật keyword "{keyword.keyword}"')
             
-            from django.core.cache import cache
-            cache.delete('spam_keywords_active')
+            refresh_spam_keyword(old_keyword=old_keyword, keyword=keyword)
         except Exception as e:
             messages.error(request, f'✗ Lỗi: {str(e)}')
         
@@ -1222,8 +1349,7 @@ def admin_spam_keywords_toggle(request, keyword_id):
         status = "bật" if keyword.is_active else "tắt"
         messages.success(request, f'✓ Đã {status} keyword "{keyword.keyword}"')
         
-        from django.core.cache import cache
-        cache.delete('spam_keywords_active')
+        refresh_spam_keyword(keyword=keyword)
     
     return redirect('admin_spam_keywords')
 
@@ -1239,8 +1365,7 @@ def admin_spam_keywords_delete(request, keyword_id):
             keyword.delete()
             messages.success(request, f'✓ Đã xóa keyword "{name}"')
             
-            from django.core.cache import cache
-            cache.delete('spam_keywords_active')
+            refresh_spam_keyword(old_keyword=name)
         except Exception as e:
             messages.error(request, f'✗ Không thể xóa: {str(e)}')
     
@@ -1285,6 +1410,7 @@ def admin_deal_create(request):
                 deal.deal_image = request.FILES['deal_image']
             
             deal.save()
+            deal_index.invalidate_deal_index()
             messages.success(request, f'✓ Tạo deal "{deal.title}" thành công!')
         except Exception as e:
             messages.error(request, f'✗ Lỗi: {str(e)}')
@@ -1315,6 +1441,7 @@ def admin_deal_edit(request, deal_id):
                 deal.deal_image = request.FILES['deal_image']
             
             deal.save()
+            deal_index.invalidate_deal_index()
             messages.success(request, f'✓ Cập nhật deal "{deal.title}" thành công!')
         except Exception as e:
             messages.error(request, f'✗ Lỗi: {str(e)}')
@@ -1328,6 +1455,7 @@ def admin_deal_toggle(request, deal_id):
     deal = get_object_or_404(WeekendDeal, id=deal_id)
     deal.is_active = not deal.is_active
     deal.save()
+    deal_index.invalidate_deal_index()
     
     status = "kích hoạt" if deal.is_active else "tạm dừng"
     messages.success(request, f'✓ Đã {status} deal "{deal.title}"')
@@ -1340,5 +1468,6 @@ def admin_deal_delete(request, deal_id):
     deal = get_object_or_404(WeekendDeal, id=deal_id)
     title = deal.title
     deal.delete()
+    deal_index.invalidate_deal_index()
     messages.success(request, f'✓ Đã xóa deal "{title}"')
     return redirect('admin_deals')
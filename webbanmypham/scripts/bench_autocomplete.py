@@ -0,0 +1,89 @@
+"""
+Benchmark gợi ý tìm kiếm: độ trễ p50/p99 của autocomplete.suggest trên snapshot lớn
+
+Sinh N tên sản phẩm giả, ghi snapshot vào file tạm (không đụng DB / snapshot thật)
+rồi đo với các tiền tố có độ dài khác nhau, sau đó so kết quả của các tiền tố ngắn với việc
+duyệt hết mọi khóa.
+
+Chạy:
+    python scripts/bench_autocomplete.py --products 100000 --queries 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import django
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+django.setup()
+
+from django.test.utils import override_settings
+
+from app.services import autocomplete
+
+TYPES = ['Son Kem Lì', 'Son Thỏi', 'Sữa Rửa Mặt', 'Kem Chống Nắng', 'Nước Tẩy Trang', 'Serum Vitamin C',
+         'Mặt Nạ Giấy', 'Toner Hoa Hồng', 'Kem Dưỡng Ẩm', 'Dầu Gội Thảo Dược', 'Phấn Phủ Kiềm Dầu']
+TRAITS = ['Mềm Mịn', 'Lâu Trôi', 'Dịu Nhẹ', 'Cấp Ẩm', 'Trắng Da', 'Cho Da Dầu', 'Cho Da Nhạy Cảm',
+          'Không Cồn', 'Chiết Xuất Trà Xanh', 'Rau Má', 'Nha Đam']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--check', type=int, default=50, help="Số tiền tố ngắn đem so với duyệt hết")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    records = []
+    for i in range(args.products):
+        name = f"{rng.choice(TYPES)} {rng.choice(TRAITS)} {i}"
+        weight = autocomplete.product_weight(rng.randint(0, 500), rng.randint(0, 5000))
+        records.extend(
+            (key, autocomplete.KIND_PRODUCT, i + 1, weight, name) for key in autocomplete.item_keys(name)
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'autocomplete.snapshot')
+        started = time.monotonic()
+        autocomplete.write_snapshot(records, path)
+        size = os.path.getsize(path)
+        print(f"📦 {len(records)} khóa, file {size / 1024 / 1024:.1f} MiB, ghi trong {time.monotonic() - started:.2f}s")
+
+        names = [autocomplete.fold(f"{rng.choice(TYPES)} {rng.choice(TRAITS)}") for _ in range(args.queries)]
+        prefixes = [name[:rng.randint(1, len(name))] for name in names]
+
+        with override_settings(AUTOCOMPLETE_SNAPSHOT=path):
+            autocomplete.suggest('son')  # mở mmap
+            latencies = []
+            for prefix in prefixes:
+                t = time.perf_counter()
+                autocomplete.suggest(prefix)
+                latencies.append(time.perf_counter() - t)
+
+            # Tiền tố ngắn khớp nhiều khóa nhất: so với duyệt hết mọi khóa rồi xếp hạng
+            wrong = 0
+            short = [name[:rng.randint(1, 3)] for name in names[:args.check]]
+            for prefix in short:
+                best = {}
+                for key, kind, obj_id, weight, label in records:
+                    if key.startswith(prefix):
+                        best[obj_id] = max(best.get(obj_id, 0), weight)
+                expected = sorted(best, key=lambda obj_id: (-best[obj_id], obj_id))[:8]
+                wrong += [item['id'] for item in autocomplete.suggest(prefix)] != expected
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    print(f"⏱  {len(latencies)} truy vấn: p50 {pick(0.5):.3f}ms  p99 {pick(0.99):.3f}ms  max {latencies[-1] * 1000:.3f}ms")
+    print(f"🎯 {len(short)} tiền tố 1-3 ký tự: {len(short) - wrong} khớp kết quả duyệt hết")
+
+
+if __name__ == '__main__':
+    main()
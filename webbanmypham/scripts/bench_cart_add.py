@@ -0,0 +1,97 @@
+"""
+Benchmark thêm vào giỏ: số query và thời gian cho một lần thêm N sản phẩm
+So sánh cách cũ (gọi cart.add từng đơn vị, mỗi lần query WeekendDeal) với Cart.add theo số lượng
+
+Chạy:
+    python scripts/bench_cart_add.py --quantity 50 --rounds 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import django
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+django.setup()
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from app.cart import Cart
+from app.models import Product, WeekendDeal
+
+
+class FakeRequest:
+    def __init__(self):
+        self.session = SessionStore()
+
+
+def legacy_add_one(cart, product):
+    """Cart.add cũ: mỗi đơn vị query deal một lần rồi cộng 1"""
+    now = timezone.now()
+    deal = WeekendDeal.objects.filter(
+        product=product, is_active=True, start_time__lte=now, end_time__gte=now
+    ).first()
+    if deal:
+        price = deal.deal_price
+    elif product.sale_price > 0:
+        price = product.sale_price
+    else:
+        price = product.price
+    line = cart.cart.setdefault(str(product.id), {'quantity': 0, 'price': str(price)})
+    line['price'] = str(price)
+    line['deal_id'] = deal.id if deal else None
+    line['quantity'] += 1
+    cart.save()
+
+
+def measure(label, product, quantity, rounds, add):
+    queries = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        cart = Cart(FakeRequest())
+        with CaptureQueriesContext(connection) as ctx:
+            add(cart, product, quantity)
+        queries += len(ctx)
+        assert cart.cart[str(product.id)]['quantity'] == quantity
+    elapsed = (time.perf_counter() - started) / rounds * 1000
+    print(f"  {label:<28} {queries / rounds:>6.1f} query/lần   {elapsed:>8.2f} ms/lần")
+    return queries / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quantity', type=int, default=50, help="Số sản phẩm mỗi lần thêm")
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    product = Product.objects.filter(status=True, stock_quantity__gte=args.quantity).first()
+    if product is None:
+        print(f"❌ Không có sản phẩm nào còn ít nhất {args.quantity} trong kho")
+        sys.exit(1)
+
+    print(f"🛒 Thêm {args.quantity} x \"{product.name}\" vào giỏ, {args.rounds} lần "
+          f"(session key: {settings.CART_SESSION_ID})")
+
+    def legacy(cart, product, quantity):
+        for _ in range(quantity):
+            legacy_add_one(cart, product)
+
+    def quantity_aware(cart, product, quantity):
+        cart.add(product, quantity=quantity)
+
+    before = measure("Trước (cộng từng đơn vị)", product, args.quantity, args.rounds, legacy)
+    after = measure("Sau (Cart.add theo số lượng)", product, args.quantity, args.rounds, quantity_aware)
+    print(f"✅ Giảm {before - after:.0f} query mỗi lần thêm vào giỏ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark đặt hàng đồng thời: bắn hàng trăm checkout song song vào MỘT sản phẩm
+và kiểm tra không bán vượt tồn kho (oversell = 0)
+
+Chạy trên DB thật (MySQL, cần hỗ trợ SELECT ... FOR UPDATE):
+    python scripts/bench_checkout_concurrency.py --stock 50 --buyers 300 --threads 32
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+django.setup()
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from app.models import Order, OrderItem, Product, ProductBatch
+from app.services.stock_service import StockError, reserve_stock
+
+
+def setup_product(stock):
+    tag = uuid.uuid4().hex[:8]
+    product = Product.objects.create(
+        name=f"Bench product {tag}",
+        sku=f"BENCH-{tag}",
+        price=100000,
+        image='products/default_product.jpg',
+        stock_quantity=stock,
+    )
+    # Chia tồn kho thành 3 lô có hạn khác nhau để kiểm tra FEFO
+    today = date.today()
+    split = [stock // 3, stock // 3, stock - 2 * (stock // 3)]
+    for i, quantity in enumerate(split):
+        ProductBatch.objects.create(
+            product=product,
+            batch_code=f"BENCH-{tag}-{i}",
+            quantity=quantity,
+            manufacturing_date=today - timedelta(days=30),
+            expiry_date=today + timedelta(days=30 * (3 - i)),
+        )
+    return product
+
+
+def checkout_once(product_id, quantity):
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                order_code=f"B-{uuid.uuid4().hex[:16]}",
+                fullname='Bench', phone='0', address='bench',
+                total_money=0, final_money=0,
+            )
+            reserve_stock(order, [{'product_id': product_id, 'quantity': quantity, 'price': Decimal('100000')}])
+        return True
+    except StockError:
+        return False
+    finally:
+        connection.close()
+
+
+def cleanup(product):
+    Order.objects.filter(items__product=product).delete()
+    product.delete()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stock', type=int, default=50)
+    parser.add_argument('--buyers', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--quantity', type=int, default=1, help="Số lượng mỗi đơn")
+    parser.add_argument('--keep', action='store_true', help="Giữ lại dữ liệu benchmark")
+    args = parser.parse_args()
+
+    product = setup_product(args.stock)
+    print(f"🚀 {args.buyers} checkout song song ({args.threads} thread) vào sản phẩm tồn {args.stock}")
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(lambda _: checkout_once(product.id, args.quantity), range(args.buyers)))
+    elapsed = time.monotonic() - started
+
+    product.refresh_from_db()
+    succeeded = sum(results)
+    sold = OrderItem.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+    batch_left = ProductBatch.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+    oversell = max(0, sold - args.stock)
+
+    print(f"⏱  {elapsed:.2f}s ({args.buyers / elapsed:.0f} checkout/s)")
+    print(f"✅ Thành công: {succeeded} đơn, bán {sold} / tồn ban đầu {args.stock}")
+    print(f"📦 Tồn còn lại: {product.stock_quantity}, trong các lô: {batch_left}")
+    print(f"{'✅' if oversell == 0 else '❌'} Oversell: {oversell}")
+
+    if not args.keep:
+        cleanup(product)
+
+    consistent = (
+        oversell == 0
+        and product.stock_quantity == args.stock - sold
+        and batch_left == args.stock - sold
+        and sold == succeeded * args.quantity
+    )
+    sys.exit(0 if consistent else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Load test suất deal: nhiều thread cùng giữ suất trên MỘT deal nóng
+Đo số lượt giữ suất/giây và kiểm tra không vượt max_quantity
+
+Chạy trên DB thật (MySQL):
+    python scripts/bench_deal_quota.py --max-quantity 1000 --attempts 5000 --threads 32
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import django
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+django.setup()
+
+from django.db import connection
+from django.utils import timezone
+
+from app.models import Product, WeekendDeal
+from app.services.deal_quota import claim_deal_units
+
+
+def setup_deal(max_quantity):
+    tag = uuid.uuid4().hex[:8]
+    product = Product.objects.create(
+        name=f"Bench deal product {tag}",
+        sku=f"BENCH-DEAL-{tag}",
+        price=100000,
+        image='products/default_product.jpg',
+        stock_quantity=max_quantity,
+    )
+    now = timezone.now()
+    return WeekendDeal.objects.create(
+        product=product,
+        title=f"Bench deal {tag}",
+        deal_price=50000,
+        start_time=now - timedelta(minutes=1),
+        end_time=now + timedelta(hours=1),
+        max_quantity=max_quantity,
+    )
+
+
+def worker(deal_id, attempts, quantity):
+    """Mỗi thread dùng một connection riêng, trả về (số lần thành công, danh sách độ trễ)"""
+    succeeded = 0
+    latencies = []
+    try:
+        for _ in range(attempts):
+            started = time.perf_counter()
+            if claim_deal_units(deal_id, quantity):
+                succeeded += 1
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connection.close()
+    return succeeded, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-quantity', type=int, default=1000)
+    parser.add_argument('--attempts', type=int, default=5000, help="Tổng số lượt giữ suất")
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--quantity', type=int, default=1, help="Số suất mỗi lượt")
+    parser.add_argument('--keep', action='store_true', help="Giữ lại dữ liệu benchmark")
+    args = parser.parse_args()
+
+    deal = setup_deal(args.max_quantity)
+    per_thread = max(1, args.attempts // args.threads)
+    total_attempts = per_thread * args.threads
+    print(f"🚀 {total_attempts} lượt giữ suất ({args.threads} thread) vào deal {args.max_quantity} suất")
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(
+            lambda _: worker(deal.id, per_thread, args.quantity), range(args.threads)
+        ))
+    elapsed = time.monotonic() - started
+
+    succeeded = sum(r[0] for r in results)
+    latencies = sorted(l for r in results for l in r[1])
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+
+    deal.refresh_from_db()
+    expected = min(args.max_quantity // args.quantity, total_attempts) * args.quantity
+
+    print(f"⏱  {elapsed:.2f}s ({total_attempts / elapsed:.0f} lượt/s, p50 {p50:.2f}ms, p99 {p99:.2f}ms)")
+    print(f"✅ Giữ được: {succeeded} lượt, sold_quantity = {deal.sold_quantity} / {deal.max_quantity}")
+    ok = deal.sold_quantity == succeeded * args.quantity == expected
+    print(f"{'✅' if ok else '❌'} Vượt suất: {max(0, deal.sold_quantity - deal.max_quantity)}")
+
+    if not args.keep:
+        deal.product.delete()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
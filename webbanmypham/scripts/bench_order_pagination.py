@@ -0,0 +1,130 @@
+"""
+Benchmark phân trang danh sách đơn hàng: Paginator (OFFSET + COUNT(*)) so với con trỏ (keyset)
+
+Sinh N đơn hàng giả (mặc định 1 triệu), đo trang 1 và trang sâu (mặc định 5000, 10 đơn/trang)
+theo đúng cách view admin_orders lấy dữ liệu. Dữ liệu giả bị xóa sau khi chạy (trừ khi --keep).
+
+Chạy:
+    python scripts/bench_order_pagination.py --orders 1000000 --page 5000 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+import django
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+django.setup()
+
+from django.core.paginator import Paginator
+from django.utils import timezone
+
+from app.models import Order
+from app.services import cursor_pagination
+
+CODE_PREFIX = 'BP'
+PER_PAGE = 10
+ORDERING = ('-created_at', '-id')
+
+
+def generate(count):
+    rng = random.Random(42)
+    started = timezone.now() - timedelta(days=365 * 3)
+    statuses = [code for code, _ in Order.STATUS_CHOICES]
+
+    # Tắt auto_now_add tạm thời để rải created_at theo thời gian như dữ liệu thật
+    created_field = Order._meta.get_field('created_at')
+    created_field.auto_now_add = False
+    try:
+        batch = []
+        for i in range(count):
+            money = rng.randint(50, 2000) * 1000
+            batch.append(Order(
+                order_code=f"{CODE_PREFIX}{i:010d}",
+                fullname=f"Khách {i}",
+                phone='0900000000',
+                address='Hà Nội',
+                total_money=money,
+                final_money=money,
+                order_status=rng.choice(statuses),
+                created_at=started + timedelta(seconds=i * 90 + rng.randint(0, 60)),
+            ))
+            if len(batch) == 10000:
+                Order.objects.bulk_create(batch)
+                batch = []
+                print(f"  đã tạo {i + 1} đơn hàng")
+        if batch:
+            Order.objects.bulk_create(batch)
+    finally:
+        created_field.auto_now_add = True
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def offset_page(number):
+    paginator = Paginator(Order.objects.all().order_by(*ORDERING), PER_PAGE)
+    page = paginator.get_page(number)
+    return list(page.object_list), paginator.count
+
+
+def cursor_for_page(number):
+    """Con trỏ mà người dùng có được sau khi bấm "trang sau" number - 1 lần"""
+    if number <= 1:
+        return None
+    last = Order.objects.order_by(*ORDERING)[(number - 1) * PER_PAGE - 1]
+    return cursor_pagination.encode_cursor([last.created_at, last.id], 'next')
+
+
+def cursor_page(cursor):
+    page = cursor_pagination.paginate(
+        Order.objects.all(), cursor, per_page=PER_PAGE, ordering=ORDERING, with_count=True
+    )
+    return list(page), page.count_label
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--page', type=int, default=5000, help="Trang sâu cần đo")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--keep', action='store_true', help="Giữ lại đơn hàng giả")
+    args = parser.parse_args()
+
+    if not Order.objects.filter(order_code__startswith=CODE_PREFIX).exists():
+        print(f"🧪 Sinh {args.orders} đơn hàng giả...")
+        generate(args.orders)
+
+    try:
+        print(f"\n{'':<10} {'OFFSET + COUNT':>18} {'Con trỏ':>18}")
+        for number in (1, args.page):
+            offset_ms, (offset_rows, _) = timed(lambda: offset_page(number), args.repeat)
+            cursor = cursor_for_page(number)
+            cursor_ms, (cursor_rows, count_label) = timed(lambda: cursor_page(cursor), args.repeat)
+            same = [o.id for o in offset_rows] == [o.id for o in cursor_rows]
+            print(f"trang {number:<4} {offset_ms:>16.1f}ms {cursor_ms:>16.1f}ms   "
+                  f"{'✅ cùng kết quả' if same else '❌ khác kết quả'}  (tổng: {count_label})")
+    finally:
+        if not args.keep:
+            print("\n🧹 Xóa đơn hàng giả")
+            fakes = Order.objects.filter(order_code__startswith=CODE_PREFIX)
+            while True:
+                ids = list(fakes.values_list('id', flat=True)[:5000])
+                if not ids:
+                    break
+                Order.objects.filter(id__in=ids).delete()
+
+
+if __name__ == '__main__':
+    main()
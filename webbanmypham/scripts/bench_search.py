@@ -0,0 +1,102 @@
+"""
+Benchmark tìm kiếm: chỉ mục BM25 (SearchPosting) so với name__icontains
+
+Sinh N sản phẩm giả (mặc định 100k), dựng chỉ mục rồi đo thời gian + số kết quả của từng câu tìm kiếm.
+Dữ liệu giả bị xóa sau khi chạy (trừ khi --keep).
+
+Chạy:
+    python scripts/bench_search.py --products 100000 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import django
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+django.setup()
+
+from app.models import Product
+from app.services.search_index import rebuild_index, search_product_ids
+
+SKU_PREFIX = 'BENCH-SEARCH-'
+
+TYPES = ['Son Kem Lì', 'Son Thỏi', 'Sữa Rửa Mặt', 'Kem Chống Nắng', 'Nước Tẩy Trang', 'Serum Vitamin C',
+         'Mặt Nạ Giấy', 'Toner Hoa Hồng', 'Kem Dưỡng Ẩm', 'Dầu Gội Thảo Dược', 'Phấn Phủ Kiềm Dầu']
+TRAITS = ['Mềm Mịn', 'Lâu Trôi', 'Dịu Nhẹ', 'Cấp Ẩm', 'Trắng Da', 'Cho Da Dầu', 'Cho Da Nhạy Cảm',
+          'Không Cồn', 'Chiết Xuất Trà Xanh', 'Rau Má', 'Nha Đam']
+INGREDIENTS = ['Niacinamide', 'Hyaluronic Acid', 'Vitamin E', 'Ceramide', 'Chiết xuất rau má',
+               'Tinh dầu tràm trà', 'Collagen', 'Retinol', 'Axit salicylic']
+
+QUERIES = ['son kem li', 'Son Kem Lì', 'sua rua mat', 'kem chong nang cho da dau',
+           'serum vitamin c', 'rau ma', 'niacinamide', 'nuoc tay trang diu nhe']
+
+
+def generate(count):
+    rng = random.Random(42)
+    batch = []
+    for i in range(count):
+        batch.append(Product(
+            name=f"{rng.choice(TYPES)} {rng.choice(TRAITS)} {rng.choice(TRAITS)} #{i}",
+            sku=f"{SKU_PREFIX}{i}",
+            price=rng.randint(50, 900) * 1000,
+            image='products/default_product.jpg',
+            main_ingredients=', '.join(rng.sample(INGREDIENTS, 3)),
+            description=f"{rng.choice(TYPES)} giúp làn da {rng.choice(TRAITS).lower()} mỗi ngày.",
+            stock_quantity=rng.randint(0, 100),
+        ))
+        if len(batch) == 5000:
+            Product.objects.bulk_create(batch)
+            batch = []
+            print(f"  đã tạo {i + 1} sản phẩm")
+    if batch:
+        Product.objects.bulk_create(batch)
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5, help="Số lần chạy mỗi câu tìm kiếm")
+    parser.add_argument('--keep', action='store_true', help="Giữ lại sản phẩm giả")
+    args = parser.parse_args()
+
+    print(f"🧪 Sinh {args.products} sản phẩm giả...")
+    generate(args.products)
+
+    try:
+        print("📚 Dựng chỉ mục...")
+        started = time.monotonic()
+        indexed = rebuild_index()
+        print(f"  {indexed} sản phẩm trong {time.monotonic() - started:.1f}s")
+
+        print(f"\n{'Câu tìm kiếm':<28} {'icontains':>18} {'BM25 index':>18}")
+        for query in QUERIES:
+            like_ms, like_ids = timed(
+                lambda: list(Product.objects.filter(name__icontains=query).values_list('id', flat=True)),
+                args.repeat,
+            )
+            index_ms, index_ids = timed(lambda: search_product_ids(query), args.repeat)
+            print(f"{query:<28} {like_ms:>8.1f}ms {len(like_ids):>7} kq "
+                  f"{index_ms:>8.1f}ms {len(index_ids or []):>7} kq")
+    finally:
+        if not args.keep:
+            print("\n🧹 Xóa sản phẩm giả, dựng lại chỉ mục cho dữ liệu thật")
+            Product.objects.filter(sku__startswith=SKU_PREFIX).delete()
+            rebuild_index()
+
+
+if __name__ == '__main__':
+    main()
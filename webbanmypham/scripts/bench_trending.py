@@ -0,0 +1,160 @@
+"""
+Benchmark xếp hạng xu hướng: tính lại từ toàn bộ lịch sử so với cộng dồn phần mới
+
+Sinh N dòng đơn hàng giả (mặc định 1 triệu, 10 dòng/đơn, rải trong 90 ngày) trên các sản phẩm giả,
+rồi đo:
+  - rebuild: tính lại điểm từ toàn bộ lịch sử (cách làm nếu không lưu điểm)
+  - update:  cộng dồn một lô đơn hàng mới (--new, mặc định 1000 dòng) vào điểm đã lưu
+  - top-K:   tính lại danh sách top-K (quét index) và đọc danh sách tính sẵn
+và kiểm tra điểm cộng dồn khớp với điểm tính lại từ đầu. Dữ liệu giả bị xóa sau khi chạy (trừ khi --keep).
+
+Chạy:
+    python scripts/bench_trending.py --items 1000000 --products 2000 --new 1000
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+import django
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+django.setup()
+
+from django.utils import timezone
+
+from app.models import Order, OrderItem, Product, ProductTrendScore
+from app.services import trending
+
+CODE_PREFIX = 'BT'
+ITEMS_PER_ORDER = 10
+DAYS = 90
+
+
+def create_products(count):
+    Product.objects.bulk_create([
+        Product(
+            name=f"Sản phẩm benchmark {i}",
+            sku=f"{CODE_PREFIX}-{i}",
+            price=100000,
+            image='products/default_product.jpg',
+            stock_quantity=1000,
+        )
+        for i in range(count)
+    ])
+    return list(Product.objects.filter(sku__startswith=f"{CODE_PREFIX}-").values_list('id', flat=True))
+
+
+def create_orders(product_ids, items, rng, start_index=0, days=DAYS):
+    """Sinh items dòng đơn hàng, sản phẩm chọn theo phân phối lệch (ít sản phẩm bán rất chạy)"""
+    now = timezone.now()
+    weights = [1 / (rank + 1) for rank in range(len(product_ids))]
+
+    # Tắt auto_now_add tạm thời để rải created_at theo thời gian như dữ liệu thật
+    created_field = Order._meta.get_field('created_at')
+    created_field.auto_now_add = False
+    try:
+        orders_total = items // ITEMS_PER_ORDER
+        for batch_start in range(0, orders_total, 2000):
+            codes = [f"{CODE_PREFIX}{start_index + i:010d}" for i in range(batch_start, min(batch_start + 2000, orders_total))]
+            Order.objects.bulk_create([
+                Order(
+                    order_code=code,
+                    fullname='Khách benchmark',
+                    phone='0900000000',
+                    address='Hà Nội',
+                    total_money=0,
+                    final_money=0,
+                    order_status='cancelled' if rng.random() < 0.05 else 'completed',
+                    created_at=now - timedelta(seconds=rng.uniform(0, days * 86400)),
+                )
+                for code in codes
+            ])
+            order_ids = Order.objects.filter(order_code__in=codes).values_list('id', flat=True)
+            OrderItem.objects.bulk_create([
+                OrderItem(order_id=order_id, product_id=product_id, product_name='', quantity=rng.randint(1, 3), price=100000)
+                for order_id in order_ids
+                for product_id in rng.choices(product_ids, weights, k=ITEMS_PER_ORDER)
+            ])
+            done = min(batch_start + 2000, orders_total) * ITEMS_PER_ORDER
+            if done % 100000 == 0:
+                print(f"  đã tạo {done} dòng đơn hàng")
+    finally:
+        created_field.auto_now_add = True
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def scores(product_ids):
+    return dict(ProductTrendScore.objects.filter(product_id__in=product_ids).values_list('product_id', 'score'))
+
+
+def cleanup():
+    print("\n🧹 Xóa dữ liệu giả")
+    fakes = Order.objects.filter(order_code__startswith=CODE_PREFIX)
+    while True:
+        ids = list(fakes.values_list('id', flat=True)[:5000])
+        if not ids:
+            break
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(id__in=ids).delete()
+    Product.objects.filter(sku__startswith=f"{CODE_PREFIX}-").delete()
+    # Điểm xu hướng tính lại từ dữ liệu thật
+    trending.rebuild()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=1000000, help="Số dòng đơn hàng giả")
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--new', type=int, default=1000, help="Số dòng đơn hàng mới cho bước cộng dồn")
+    parser.add_argument('--keep', action='store_true', help="Giữ lại dữ liệu giả")
+    args = parser.parse_args()
+
+    rng = random.Random(24)
+    try:
+        print(f"🧪 Sinh {args.products} sản phẩm, {args.items} dòng đơn hàng giả...")
+        product_ids = create_products(args.products)
+        create_orders(product_ids, args.items, rng)
+
+        rebuild_ms, consumed = timed(trending.rebuild)
+        print(f"\nrebuild từ lịch sử ({consumed[trending.ORDER_JOB]} dòng): {rebuild_ms:>10.1f}ms")
+
+        create_orders(product_ids, args.new, rng, start_index=args.items // ITEMS_PER_ORDER, days=0.01)
+        update_ms, consumed = timed(trending.update)
+        print(f"update cộng dồn ({consumed[trending.ORDER_JOB]} dòng mới):    {update_ms:>10.1f}ms")
+
+        refresh_ms, top_ids = timed(trending.refresh_top)
+        read_ms, _ = timed(lambda: trending.top_product_ids(8))
+        print(f"tính lại top-{len(top_ids)} (quét index):        {refresh_ms:>10.1f}ms")
+        print(f"đọc top-8 tính sẵn:                  {read_ms:>10.3f}ms")
+
+        # Điểm cộng dồn phải khớp điểm tính lại từ đầu (cùng mốc thời gian)
+        incremental = scores(product_ids)
+        landmark, rate = trending.get_landmark(), trending.decay_rate()
+        trending.rebuild()
+        rebuilt = scores(product_ids)
+        shift = trending.get_landmark() - landmark
+        worst = max(
+            abs(incremental[pid] * math.exp(-rate * shift) - rebuilt[pid]) / rebuilt[pid]
+            for pid in rebuilt if rebuilt[pid]
+        )
+        print(f"\n{'✅' if worst < 1e-6 else '❌'} sai số tương đối lớn nhất giữa cộng dồn và tính lại: {worst:.2e}")
+    finally:
+        if not args.keep:
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
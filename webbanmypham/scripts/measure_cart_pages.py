@@ -0,0 +1,115 @@
+"""
+Đo số query và bộ nhớ cấp phát khi render trang giỏ hàng / thanh toán
+
+So sánh cách duyệt giỏ cũ (mỗi lần duyệt query Product, đổi Decimal từng dòng, trả dict copy)
+với Cart.get_items() (Product query một lần mỗi request, dòng hiển thị dựng sẵn).
+
+Chạy:
+    python scripts/measure_cart_pages.py --lines 20 --iterations 3
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+from decimal import Decimal
+
+import django
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from app.cart import Cart
+from app.models import Product
+
+
+class FakeRequest:
+    def __init__(self, user):
+        self.session = SessionStore()
+        self.user = user
+
+
+def legacy_iter(cart):
+    """Cart.__iter__ cũ"""
+    products = Product.objects.filter(id__in=cart.cart.keys())
+    lines = {product_id: dict(line) for product_id, line in cart.cart.items()}
+    for product in products:
+        lines[str(product.id)]['product'] = product
+    for item in lines.values():
+        item['price'] = Decimal(str(item.get('price') or 0))
+        item['total_price'] = item['price'] * item['quantity']
+        yield item
+
+
+def consume(items):
+    for item in items:
+        item['total_price'] if isinstance(item, dict) else item.total_price
+
+
+def measure(label, cart, iterations, iterate):
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as ctx:
+        consume(iterate(cart))
+        first_current, first_peak = tracemalloc.get_traced_memory()
+        # Các lần duyệt sau trong cùng request (header, bảng giỏ, tổng tiền...)
+        tracemalloc.reset_peak()
+        for _ in range(iterations - 1):
+            consume(iterate(cart))
+        _, again_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<24} {len(ctx):>3} query   lần đầu {first_peak / 1024:>7.1f} KiB   "
+          f"các lần sau {(again_peak - first_current) / 1024:>7.1f} KiB")
+
+
+def page_queries(client, url):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url)
+    return response.status_code, len(ctx)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=20, help="Số dòng trong giỏ")
+    parser.add_argument('--iterations', type=int, default=3, help="Số lần template duyệt giỏ mỗi trang")
+    parser.add_argument('--username', help="Tài khoản dùng để mở trang thanh toán")
+    args = parser.parse_args()
+
+    products = list(Product.objects.filter(status=True, stock_quantity__gt=0)[:args.lines])
+    if not products:
+        print("❌ Chưa có sản phẩm nào còn hàng")
+        sys.exit(1)
+
+    user = User.objects.filter(username=args.username).first() if args.username else User.objects.first()
+    cart = Cart(FakeRequest(user))
+    cart.set_many([(product, 1) for product in products])
+    print(f"🛒 Giỏ {len(products)} dòng, duyệt {args.iterations} lần mỗi trang")
+
+    measure("Trước (legacy __iter__)", cart, args.iterations, legacy_iter)
+    cart = Cart(FakeRequest(user))
+    cart.set_many([(product, 1) for product in products])
+    measure("Sau (get_items)", cart, args.iterations, lambda c: iter(c))
+
+    if user is not None:
+        setup_test_environment()
+        client = Client()
+        client.force_login(user)
+        for product in products:
+            client.get(f'/add-to-cart/{product.id}/')
+        for url in ('/cart/', '/checkout/'):
+            status, queries = page_queries(client, url)
+            print(f"  {url:<22} {queries:>3} query (HTTP {status})")
+        for product in products:
+            client.get(f'/remove-from-cart/{product.id}/')
+
+
+if __name__ == '__main__':
+    main()
@@ -134,12 +134,80 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 import os
+import sys
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache dùng chung cho mọi worker trên cùng máy. LocMem (mặc định của Django) là riêng từng
+# tiến trình: version key, danh sách tính sẵn... ghi ở tiến trình này thì tiến trình khác không thấy.
+# Chạy nhiều máy thì đổi sang Redis / Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# manage.py test: cache riêng trong bộ nhớ, test gọi cache.clear() không xóa cache thật trong .cache
+if len(sys.argv) > 1 and sys.argv[1] == 'test':
+    CACHES = {
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+        for alias in CACHES
+    }
+
 CART_SESSION_ID = 'cart'
 
+# Nơi lưu giỏ hàng: SessionCartStore (mặc định), DatabaseCartStore (bảng CartLine)
+# hoặc CacheCartStore. CacheCartStore cần thêm alias CART_CACHE_ALIAS vào CACHES, trỏ tới cache dùng
+# chung không tự xóa key (không dùng cache file 'default': bị cull khi quá MAX_ENTRIES), ví dụ:
+#   'carts': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1',
+#             'TIMEOUT': None}  # Redis chạy với maxmemory-policy noeviction
+CART_STORAGE = 'app.services.cart_store.SessionCartStore'
+CART_CACHE_ALIAS = 'carts'
+
+# File snapshot gợi ý tìm kiếm (mmap), các worker trên cùng máy dùng chung
+AUTOCOMPLETE_SNAPSHOT = os.path.join(BASE_DIR, 'autocomplete.snapshot')
+
+# Worker AI phân tích cảm xúc review chạy nền (gom micro-batch)
+SENTIMENT_WORKER = {
+    'ENABLED': True,
+    'AUTOSTART': True,       # Tải model + chạy worker khi khởi động web
+    'MAX_BATCH_SIZE': 16,    # Số review tối đa trong 1 lần gọi model
+    'MAX_WAIT_MS': 50,       # Thời gian chờ tối đa để gom batch
+    'QUEUE_SIZE': 1000,      # Hàng đợi đầy -> chấm đồng bộ
+    'STATS_LOG_EVERY': 100,  # Log histogram batch size / latency sau mỗi N batch
+}
+
+# Đếm lượt xem sản phẩm qua bộ đệm trong tiến trình (app/services/view_counter.py)
+VIEW_COUNTER = {
+    'ENABLED': True,
+    'FLUSH_INTERVAL': 10,    # Giây giữa hai lần ghi Product.views
+    'MAX_PRODUCTS': 500,     # Bộ đệm có nhiều sản phẩm hơn thì ghi sớm
+}
+
+# Xếp hạng sản phẩm xu hướng (app/services/trending.py, job: manage.py update_trending --loop)
+TRENDING = {
+    'HALF_LIFE_HOURS': 72,   # Sau 72 giờ một lượt mua chỉ còn nửa giá trị
+    'TOP_K': 50,             # Số sản phẩm giữ trong danh sách tính sẵn
+    'ORDER_WEIGHT': 1.0,     # Mỗi sản phẩm bán ra
+    'WISHLIST_WEIGHT': 0.5,  # Mỗi lượt thêm vào yêu thích
+    'VIEW_WEIGHT': 0.02,     # Mỗi lượt xem
+}
+
+# Gợi ý sản phẩm tính sẵn (app/services/recommender.py, job: manage.py build_recommendations hằng đêm)
+RECOMMENDER = {
+    'TOP_N': 12,               # Số gợi ý lưu cho mỗi sản phẩm / khách hàng
+    'COPURCHASE_WEIGHT': 1.0,  # Thường được mua cùng nhau
+    'INGREDIENT_WEIGHT': 0.6,  # Trùng thành phần chính
+    'SKIN_WEIGHT': 0.3,        # Hợp loại da
+    'CATEGORY_WEIGHT': 0.2,    # Cùng danh mục
+    'CONCERN_WEIGHT': 0.4,     # Nhắc tới vấn đề da của khách
+    'POPULARITY_WEIGHT': 0.1,  # Bán chạy
+}
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webbanmypham.settings')
+# Đánh dấu tiến trình phục vụ web: chỉ tiến trình này tự chạy worker AI / flush lượt xem khi tắt
+os.environ['WEBBANMYPHAM_WEB_PROCESS'] = '1'
 
 application = get_wsgi_application()